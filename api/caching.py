@@ -0,0 +1,96 @@
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from core.caching import make_cache_key, tagged_key_prefix
+
+
+class CachedResponseMixin:
+    """
+    Cache rendered JSON responses of an API view and answer conditional requests
+
+    Bodies are stored compressed (zlib) with their `ETag`. Authentication,
+    permissions and throttling run before the handler (in `initial`), so they
+    still apply to cached responses. Views must call `cached_response` from
+    their handlers and may define `get_response_cache_key` (`None` disables
+    the cache for a request). If `get_response_etag` can build the ETag from
+    the key, requests with a matching `If-None-Match` (or `If-Modified-Since`,
+    see `get_response_last_modified`) get a 304 without reading the cache or
+    the database; otherwise the ETag is the body's MD5.
+    """
+
+    @property
+    def response_cache_timeout(self):
+        return settings.API_CACHE_TIMEOUT
+
+    def get_response_cache_key(self, request):
+        return self.make_response_cache_key(request)
+
+    def make_response_cache_key(self, request, tags=None, *parts):
+        """Key for the request's URL (and API version), depending on `tags` and `parts`"""
+        if request.accepted_renderer.format != "json":  # Browsable API pages are rendered per user
+            return None
+        prefix = tagged_key_prefix("api-response", tags or [])
+        query = sorted((key, value) for key, values in request.query_params.lists() for value in values)
+        return make_cache_key(prefix, request.version, request.build_absolute_uri(request.path), query, *parts)
+
+    def get_response_etag(self, key):
+        return None
+
+    def get_response_last_modified(self):
+        return None
+
+    def conditional_response(self, request, etag, last_modified=None):
+        """Return a 304 (or 412) response if the request's conditions match the validators, else `None`"""
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+        response = get_conditional_response(request, etag=quote_etag(etag), last_modified=timestamp)
+        if response is not None:
+            self.set_validators(response, etag, last_modified)
+        return response
+
+    @staticmethod
+    def set_validators(response, etag, last_modified=None):
+        response["ETag"] = quote_etag(etag)
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified.timestamp())
+
+    def cached_response(self, request, get_response):
+        key = self.get_response_cache_key(request)
+        if key is None:
+            return get_response()
+        etag, last_modified = self.get_response_etag(key), self.get_response_last_modified()
+        if etag is not None:
+            response = self.conditional_response(request, etag, last_modified)
+            if response is not None:
+                return response
+
+        entry = cache.get(key)
+        if entry is not None:
+            response = self.conditional_response(request, entry["etag"], last_modified)
+            if response is None:
+                response = HttpResponse(zlib.decompress(entry["body"]), content_type=entry["content_type"])
+                self.set_validators(response, entry["etag"], last_modified)
+            return response
+
+        self._response_cache_key = key
+        return get_response()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        key = getattr(self, "_response_cache_key", None)
+        if key is not None and isinstance(response, Response) and response.status_code == 200:
+            response.add_post_render_callback(lambda rendered: self.store_response(key, rendered))
+        return response
+
+    def store_response(self, key, response):
+        body = response.content
+        etag = self.get_response_etag(key) or hashlib.md5(body).hexdigest()
+        self.set_validators(response, etag, self.get_response_last_modified())
+        entry = {"etag": etag, "body": zlib.compress(body), "content_type": response["Content-Type"]}
+        cache.set(key, entry, self.response_cache_timeout)
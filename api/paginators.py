@@ -1,8 +1,281 @@
+import json
+import math
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from functools import reduce
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class LargeTablePageNumberPagination(pagination.PageNumberPagination):
+    """
+    Page number pagination which doesn't depend on the queryset's count
+
+    Counts of dataset table queries may be estimated by the query planner (see
+    `DatasetTableModelQuerySet.count`), so they can't define the page bounds:
+    one extra row is fetched to know if there's a next page and the response
+    says if `count` is approximate.
+    """
 
     max_page_size = 10000
     page_size = 1000
     page_size_query_param = "page_size"
+    empty_page_message = "That page contains no results"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.request = request
+        self.count = queryset.count()
+        self.count_is_approximate = getattr(queryset, "count_is_approximate", False)
+        self.page_number = self.get_page_number_value(request, page_size)
+        offset = (self.page_number - 1) * page_size
+        results = list(queryset[offset : offset + page_size + 1])
+        if not results and self.page_number > 1:
+            self.raise_invalid_page(self.page_number, self.empty_page_message)
+        self.has_next = len(results) > page_size
+        return results[:page_size]
+
+    def get_page_number_value(self, request, page_size):
+        page_number = request.query_params.get(self.page_query_param, 1)
+        if page_number in self.last_page_strings:
+            if self.count_is_approximate:  # The last page is unknown
+                self.raise_invalid_page(page_number, "The last page can't be used with approximate counts")
+            return max(math.ceil(self.count / page_size), 1)
+        try:
+            value = int(page_number)
+        except (TypeError, ValueError):
+            value = None
+        if value is None or value < 1:
+            self.raise_invalid_page(page_number, "That page number is not a valid integer")
+        return value
+
+    def raise_invalid_page(self, page_number, message):
+        raise NotFound(self.invalid_page_message.format(page_number=page_number, message=message))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("count", self.count),
+                    ("count_is_approximate", self.count_is_approximate),
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["count_is_approximate"] = {"type": "boolean"}
+        return response_schema
+
+
+class DatasetKeysetPagination(pagination.BasePagination):
+    """
+    Keyset (a.k.a. "seek") pagination for dataset tables
+
+    Instead of translating a page number into `OFFSET` (which forces the
+    database to scan and discard every row before the requested page), the
+    position of the last row of a page is encoded into an opaque cursor and the
+    next page is fetched with a `WHERE (ordering columns) > (position)`
+    clause, so every page can be served by the compound ordering index created
+    by `Table.get_model`.
+
+    The ordering is always the table's default ordering (`Table.ordering`)
+    plus `id` as tiebreaker - `order-by` and search rank orderings are ignored
+    in this mode.
+    """
+
+    cursor_query_param = "cursor"
+    max_page_size = LargeTablePageNumberPagination.max_page_size
+    page_size = LargeTablePageNumberPagination.page_size
+    page_size_query_param = LargeTablePageNumberPagination.page_size_query_param
+    invalid_cursor_message = "Cursor inválido."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(view)
+        self.nullable = self.get_nullable_fields(queryset.model)
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        columns = list(queryset.query.values_select)
+        if columns:  # `values_list()` queryset: rows are tuples
+            names = [field.lstrip("-") for field in self.ordering]
+            missing = [name for name in names if name not in columns]
+            if missing:  # Select the ordering columns to build the cursors
+                columns.extend(missing)
+                queryset = queryset.values_list(*columns)
+            self.column_index = {name: columns.index(name) for name in names}
+        else:
+            self.column_index = None
+
+        order_by = [self.flip(field) if reverse else field for field in self.ordering]
+        queryset = queryset.order_by(*order_by)
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position, reverse))
+
+        results = list(queryset[: page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.next_position = self.get_position(results[-1]) if results else None
+        self.previous_position = self.get_position(results[0]) if results else None
+        return results
+
+    def get_ordering(self, view):
+        ordering = list(view.get_keyset_ordering())
+        if not any(field.lstrip("-") == "id" for field in ordering):
+            ordering.append("id")
+        return ordering
+
+    def get_nullable_fields(self, Model):
+        return {
+            field.lstrip("-"): Model._meta.get_field(field.lstrip("-")).null
+            for field in self.ordering
+            if field.lstrip("-") != "id"
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    def get_position(self, row):
+        if self.column_index is not None:
+            return [row[self.column_index[field.lstrip("-")]] for field in self.ordering]
+        return [getattr(row, field.lstrip("-")) for field in self.ordering]
+
+    def keyset_filter(self, position, reverse=False):
+        """Build the `WHERE` clause for rows placed after `position`
+
+        PostgreSQL sorts `NULL`s last on ascending and first on descending
+        order, so "after" depends on both the direction and the nullability of
+        each column. The expanded form is used (instead of a row-value
+        comparison) because directions can be mixed.
+        """
+
+        conditions, equals = [], []
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip("-")
+            ascending = field.startswith("-") == reverse
+            nullable = self.nullable.get(name, False)
+            after = self.after(name, value, ascending, nullable)
+            if after is not None:
+                conditions.append(reduce(lambda a, b: a & b, equals + [after]))
+            equals.append(Q(**{f"{name}__isnull": True}) if value is None else Q(**{name: value}))
+
+        if not conditions:
+            return Q(pk__in=[])
+        return reduce(lambda a, b: a | b, conditions)
+
+    @staticmethod
+    def after(name, value, ascending, nullable):
+        if ascending:  # NULLS LAST
+            if value is None:
+                return None
+            condition = Q(**{f"{name}__gt": value})
+            if nullable:
+                condition |= Q(**{f"{name}__isnull": True})
+            return condition
+        else:  # NULLS FIRST
+            if value is None:
+                return Q(**{f"{name}__isnull": False})
+            return Q(**{f"{name}__lt": value})
+
+    def decode_cursor(self, request, Model):
+        """Return the position (converted to the ordering fields' types) and direction of the request's cursor"""
+        encoded = request.query_params.get(self.cursor_query_param, "").strip()
+        if not encoded:
+            return None, False
+
+        try:
+            padding = "=" * (-len(encoded) % 4)
+            data = json.loads(urlsafe_b64decode((encoded + padding).encode("ascii")))
+            position, reverse = data["p"], bool(data.get("r", False))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:  # A tampered cursor must not reach the query with values of the wrong type
+            position = [
+                Model._meta.get_field(field.lstrip("-")).to_python(value) if value is not None else None
+                for field, value in zip(self.ordering, position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse=False):
+        data = {"p": position}
+        if reverse:
+            data["r"] = True
+        encoded = urlsafe_b64encode(json.dumps(data, cls=DjangoJSONEncoder).encode("utf-8"))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode("ascii").rstrip("="))
+
+    def get_next_link(self):
+        if not self.has_next or self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        elif self.previous_position is None:  # Empty page: go back to the first one
+            return replace_query_param(self.base_url, self.cursor_query_param, "")
+        return self.encode_cursor(self.previous_position, reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [("next", self.get_next_link()), ("previous", self.get_previous_link()), ("results", data)]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "previous": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
@@ -1,7 +1,11 @@
+import datetime
+
 from rest_framework import serializers
 from rest_framework.reverse import reverse
+from rest_framework.settings import ISO_8601, api_settings
 
 from core.models import Dataset, Field, Link, Table
+from core.templatetags.utils import obfuscate
 
 
 class LinkSerializer(serializers.ModelSerializer):
@@ -90,7 +94,85 @@ class DatasetDetailSerializer(serializers.ModelSerializer):
         )
 
 
-class GenericSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = None
-        fields = "__all__"
+# Serializer fields whose `to_representation` doesn't change values coming
+# from the database (str, int, float, bool, dict/list)
+NATIVE_SERIALIZER_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.FloatField,
+    serializers.IntegerField,
+    serializers.JSONField,
+)
+
+
+def dataset_table_serializer_class(Model, field_names):
+    """Create a `ModelSerializer` class for the dynamic model `Model`"""
+    Meta = type("Meta", (object,), {"model": Model, "fields": list(field_names)})
+    return type(f"{Model.__name__}Serializer", (serializers.ModelSerializer,), {"Meta": Meta})
+
+
+class DatasetRowEncoder:
+    """
+    Convert rows from dataset tables' `values_list()` querysets to dicts
+
+    Produces the same output as a `ModelSerializer` for the same fields, but
+    the conversion function for each column is resolved only once (and
+    skipped for values which are already JSON-native), so no model instances
+    or serializer field machinery are needed for each row.
+    """
+
+    def __init__(self, Model, field_names, obfuscate_fields=()):
+        self.serializer_class = dataset_table_serializer_class(Model, field_names)
+        serializer_fields = self.serializer_class().fields
+        self.field_names = tuple(field_names)
+        self.columns = tuple(
+            (name, self.column_encoder(serializer_fields[name], name in obfuscate_fields))
+            for name in self.field_names
+        )
+
+    @staticmethod
+    def column_encoder(serializer_field, obfuscated=False):
+        if obfuscated:
+            return lambda value: serializer_field.to_representation(obfuscate(value))
+        elif isinstance(serializer_field, NATIVE_SERIALIZER_FIELDS) and not getattr(serializer_field, "binary", False):
+            return None
+        elif type(serializer_field) is serializers.DateField:
+            output_format = getattr(serializer_field, "format", api_settings.DATE_FORMAT)
+            if output_format and output_format.lower() == ISO_8601:
+                return datetime.date.isoformat
+        return serializer_field.to_representation
+
+    def encode(self, row):
+        # `row` may have more items than `self.columns` (like the ones added
+        # by the keyset paginator), which are ignored by `zip`
+        return {
+            name: value if encoder is None or value is None else encoder(value)
+            for (name, encoder), value in zip(self.columns, row)
+        }
+
+
+def get_dataset_row_encoder(Model):
+    """Return the row encoder for the visible fields of dynamic model `Model`"""
+    encoder = Model.extra.get("row_encoder")
+    if encoder is None:
+        fields = [field for field in Model.extra["schema"].fields if field.name != "search_data" and field.show]
+        encoder = DatasetRowEncoder(
+            Model,
+            field_names=sorted(field.name for field in fields),
+            obfuscate_fields={field.name for field in fields if field.obfuscate},
+        )
+        Model.extra["row_encoder"] = encoder
+    return encoder
+
+
+class DatasetRowSerializer:
+    """Minimal serializer interface (`.data`) for a page of encoded rows"""
+
+    def __init__(self, instance, encoder):
+        self.instance = instance
+        self.encoder = encoder
+
+    @property
+    def data(self):
+        encode = self.encoder.encode
+        return [encode(row) for row in self.instance]
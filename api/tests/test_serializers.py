@@ -0,0 +1,46 @@
+import datetime
+from decimal import Decimal
+
+from api.serializers import dataset_table_serializer_class, get_dataset_row_encoder
+from core.tests.utils import BaseTestCaseWithSampleDataset
+
+
+class DatasetRowEncoderTests(BaseTestCaseWithSampleDataset):
+    DATASET_SLUG = "sample"
+    TABLE_NAME = "sample_table"
+    FIELDS_KWARGS = [
+        {"name": "name", "options": {"max_length": 50}, "type": "text", "null": False},
+        {"name": "document", "options": {"max_length": 14}, "type": "text", "null": True, "obfuscate": True},
+        {"name": "date", "type": "date", "null": True},
+        {"name": "value", "options": {"max_digits": 10, "decimal_places": 2}, "type": "decimal", "null": True},
+        {"name": "total", "type": "integer", "null": True},
+        {"name": "hidden", "options": {"max_length": 10}, "type": "text", "null": True, "show": False},
+    ]
+
+    def setUp(self):
+        self.TableModel.objects.create(
+            name="Álvaro",
+            document="12345678901",
+            date=datetime.date(2020, 3, 15),
+            value=Decimal("1.5"),
+            total=42,
+            hidden="x",
+        )
+        self.TableModel.objects.create(name="Maria", document=None, date=None, value=None, total=None)
+
+    def test_encode_rows_as_model_serializer_does(self):
+        encoder = get_dataset_row_encoder(self.TableModel)
+        ModelSerializer = dataset_table_serializer_class(self.TableModel, encoder.field_names)
+        queryset = self.TableModel.objects.order_by("name")
+
+        expected = ModelSerializer(queryset, many=True).data
+        expected[0]["document"] = "***456789**"
+        result = [encoder.encode(row) for row in queryset.values_list(*encoder.field_names)]
+
+        assert ("date", "document", "name", "total", "value") == encoder.field_names
+        assert [dict(row) for row in expected] == result
+        assert "2020-03-15" == result[0]["date"]
+        assert "1.50" == result[0]["value"]
+
+    def test_encoder_is_cached_per_model(self):
+        assert get_dataset_row_encoder(self.TableModel) is get_dataset_row_encoder(self.TableModel)
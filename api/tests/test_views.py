@@ -1,9 +1,16 @@
+import json
+from base64 import urlsafe_b64encode
+from unittest.mock import Mock, patch
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase, override_settings
 from django.urls import reverse, reverse_lazy
 from model_bakery import baker
 
+from core.models import DatasetTableModelQuerySet, Field
+from core.templatetags.utils import obfuscate
 from core.tests.utils import BaseTestCaseWithSampleDataset
 from traffic_control.tests.util import TrafficControlClient
 
@@ -124,6 +131,117 @@ class DatasetTableDataTests(BaseTestCaseWithSampleDataset):
         response = self.client.get(self.url, **self.auth_header)
         assert 404 == response.status_code
 
+    def test_keyset_pagination_walks_through_all_rows(self):
+        values = [f"row-{i}" for i in range(5)]
+        for value in values:
+            baker.make(self.TableModel, sample_field=value)
+
+        url, pages = f"{self.url}?cursor=&page_size=2", []
+        while url:
+            response = self.client.get(url, **self.auth_header)
+            assert 200 == response.status_code
+            data = response.json()
+            assert "count" not in data
+            pages.append([row["sample_field"] for row in data["results"]])
+            url = data["next"]
+
+        assert [values[:2], values[2:4], values[4:]] == pages
+
+    def test_keyset_pagination_previous_link(self):
+        values = [f"row-{i}" for i in range(3)]
+        for value in values:
+            baker.make(self.TableModel, sample_field=value)
+
+        first_page = self.client.get(f"{self.url}?cursor=&page_size=2", **self.auth_header).json()
+        assert first_page["previous"] is None
+        second_page = self.client.get(first_page["next"], **self.auth_header).json()
+        assert values[2:] == [row["sample_field"] for row in second_page["results"]]
+        assert second_page["next"] is None
+
+        previous_page = self.client.get(second_page["previous"], **self.auth_header).json()
+        assert values[:2] == [row["sample_field"] for row in previous_page["results"]]
+
+    @override_settings(COUNT_ESTIMATE_THRESHOLD=1)
+    @patch.object(DatasetTableModelQuerySet, "estimate_count", Mock(return_value=2))
+    def test_page_number_pagination_does_not_depend_on_estimated_count(self):
+        baker.make(self.TableModel, sample_field="foo", _quantity=5)
+
+        url, rows = f"{self.url}?sample_field=foo&page_size=2", 0
+        while url:
+            response = self.client.get(url, **self.auth_header)
+            assert 200 == response.status_code
+            data = response.json()
+            assert 2 == data["count"]
+            assert data["count_is_approximate"] is True
+            rows += len(data["results"])
+            url = data["next"]
+
+        assert 5 == rows
+
+    def test_page_number_pagination_404_after_last_page(self):
+        baker.make(self.TableModel, sample_field="foo", _quantity=2)
+
+        data = self.client.get(f"{self.url}?sample_field=foo&page_size=2", **self.auth_header).json()
+        assert data["next"] is None
+        assert data["count_is_approximate"] is False
+        response = self.client.get(f"{self.url}?sample_field=foo&page_size=2&page=2", **self.auth_header)
+        assert 404 == response.status_code
+
+    def test_obfuscate_field_after_model_was_created(self):
+        baker.make(self.TableModel, sample_field="1234567890")
+        response = self.client.get(self.url, **self.auth_header)
+        assert "1234567890" == response.json()["results"][0]["sample_field"]
+
+        field = Field.objects.get(table=self.table, name="sample_field")
+        field.obfuscate = True
+        field.save()
+
+        response = self.client.get(self.url, **self.auth_header)
+        assert obfuscate("1234567890") == response.json()["results"][0]["sample_field"]
+
+        field.show = False
+        field.save()
+
+        response = self.client.get(self.url, **self.auth_header)
+        assert "sample_field" not in response.json()["results"][0]
+
+    def test_404_if_invalid_cursor(self):
+        response = self.client.get(f"{self.url}?cursor=invalid", **self.auth_header)
+        assert 404 == response.status_code
+
+    def test_404_if_cursor_value_has_wrong_type(self):
+        for position in (["not-an-id"], [["nested"]], [{"id": 1}]):
+            cursor = urlsafe_b64encode(json.dumps({"p": position}).encode("utf-8")).decode("ascii")
+            response = self.client.get(self.url, data={"cursor": cursor}, **self.auth_header)
+            assert 404 == response.status_code
+
+    def test_304_if_etag_matches(self):
+        response = self.client.get(self.url, data={"sample_field": "foo"}, **self.auth_header)
+        assert 200 == response.status_code
+        etag = response["ETag"]
+        assert etag.startswith(f'"{self.table.data_table.id}-')
+
+        response = self.client.get(self.url, data={"sample_field": "foo"}, HTTP_IF_NONE_MATCH=etag, **self.auth_header)
+        assert 304 == response.status_code
+        response = self.client.get(self.url, data={"sample_field": "bar"}, HTTP_IF_NONE_MATCH=etag, **self.auth_header)
+        assert 200 == response.status_code
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_cached_response_until_table_cache_is_invalidated(self):
+        call_command("clear_cache")
+        baker.make(self.TableModel, sample_field="foo", _quantity=2)
+        response = self.client.get(f"{self.url}?sample_field=foo&page=1", **self.auth_header)
+        assert 2 == len(response.json()["results"])
+        self.TableModel.objects.all().delete()
+
+        response = self.client.get(f"{self.url}?page=1&sample_field=foo", **self.auth_header)
+        assert 200 == response.status_code
+        assert 2 == len(response.json()["results"])
+
+        self.table.invalidate_cache()
+        response = self.client.get(f"{self.url}?page=1&sample_field=foo", **self.auth_header)
+        assert 0 == len(response.json()["results"])
+
 
 class TestAPIRedirectsFromPreviousRoutingToVersioned(TestCase):
     client_class = TrafficControlClient
@@ -1,5 +1,7 @@
-from collections.abc import Sequence
+import time
+from functools import partial
 
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 from rest_framework import viewsets
@@ -7,29 +9,41 @@ from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from api.serializers import DatasetDetailSerializer, DatasetSerializer, GenericSerializer
+from api.caching import CachedResponseMixin
+from api.serializers import DatasetDetailSerializer, DatasetRowSerializer, DatasetSerializer, get_dataset_row_encoder
 from api.versioning import check_api_version_redirect
+from core.caching import dataset_tag, table_tag
+from core.conditional import table_last_modified
 from core.filters import parse_querystring
 from core.forms import get_table_dynamic_form
 from core.models import Dataset, Table
-from core.templatetags.utils import obfuscate
+from core.query_log import log_query_shape, query_shape, should_sample
 
 from . import paginators
 
 
-class DatasetViewSet(viewsets.ModelViewSet):
+class DatasetViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     serializer_class = DatasetSerializer
     queryset = Dataset.objects.api_visible()
+    # Metadata changes don't invalidate the cache, so entries are kept only for a while
+    response_cache_timeout = settings.CACHE_INTERVAL
+
+    def get_response_cache_key(self, request):
+        slug = self.kwargs.get("slug")
+        return self.make_response_cache_key(request, [dataset_tag(slug)] if slug else [])
 
     @check_api_version_redirect
     def retrieve(self, request, slug):
+        return self.cached_response(request, partial(self.get_dataset_detail, slug))
+
+    def get_dataset_detail(self, slug):
         obj = get_object_or_404(self.get_queryset(), slug=slug)
         serializer = DatasetDetailSerializer(obj, context=self.get_serializer_context(),)
         return Response(serializer.data)
 
     @check_api_version_redirect
-    def list(self, *args, **kwargs):
-        return super().list(*args, **kwargs)
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, partial(super().list, request, *args, **kwargs))
 
 
 class InvalidFiltersException(Exception):
@@ -37,20 +51,39 @@ class InvalidFiltersException(Exception):
         self.errors_list = errors_list
 
 
-class DatasetDataListView(ListAPIView):
+class DatasetDataListView(CachedResponseMixin, ListAPIView):
 
     pagination_class = paginators.LargeTablePageNumberPagination
+    keyset_pagination_class = paginators.DatasetKeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            cursor_param = self.keyset_pagination_class.cursor_query_param
+            if cursor_param in self.request.query_params:
+                self._paginator = self.keyset_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_keyset_ordering(self):
+        return self.get_table().ordering or []
 
     def get_table(self):
-        dataset = get_object_or_404(Dataset.objects.api_visible(), slug=self.kwargs["slug"])
-        return get_object_or_404(Table.objects.api_enabled(), dataset=dataset, name=self.kwargs["tablename"])
+        if not hasattr(self, "_table"):
+            dataset = get_object_or_404(Dataset.objects.api_visible(), slug=self.kwargs["slug"])
+            self._table = get_object_or_404(Table.objects.api_enabled(), dataset=dataset, name=self.kwargs["tablename"])
+        return self._table
 
     def get_model_class(self):
         return self.get_table().get_model()
 
+    def get_row_encoder(self):
+        return get_dataset_row_encoder(self.get_model_class())
+
     def get_queryset(self):
         querystring = self.request.query_params.copy()
-        for pagination_key in ("limit", "offset"):
+        for pagination_key in ("limit", "offset", "cursor"):
             if pagination_key in querystring:
                 del querystring[pagination_key]
 
@@ -63,32 +96,18 @@ class DatasetDataListView(ListAPIView):
             query = {k: v for k, v in filter_form.cleaned_data.items() if v != ""}
         else:
             raise InvalidFiltersException(filter_form.errors)
+        self.parsed_querystring = (query, search_query, order_by)
 
-        return Model.objects.composed_query(query, search_query, order_by)
+        # Only the visible columns are selected and rows are encoded directly
+        # from tuples (see `get_serializer`), without model instances
+        queryset = Model.objects.composed_query(query, search_query, order_by)
+        return queryset.select_columns(*self.get_row_encoder().field_names)
 
     def get_serializer_class(self):
-        table = self.get_table()
-        Model = self.get_model_class()
-        fields = sorted([field.name for field in table.fields if field.name != "search_data" and field.show])
-
-        # TODO: move this monkey patch to a metaclass
-        GenericSerializer.Meta.model = Model
-        GenericSerializer.Meta.fields = fields
-        return GenericSerializer
-
-    def get_serializer(self, *args, **kwargs):
-        self.get_model_class()  # TODO: avoid to call it twice
-        obfuscate_fields = [field.name for field in self.get_table().fields if field.obfuscate and field.show]
-        if obfuscate_fields:
-            objects = args[0]
-            if not isinstance(objects, Sequence):
-                objects = [objects]
-            for obj in objects:
-                for field_name in obfuscate_fields:
-                    value = obfuscate(getattr(obj, field_name))
-                    setattr(obj, field_name, value)
-
-        return super().get_serializer(*args, **kwargs)
+        return self.get_row_encoder().serializer_class
+
+    def get_serializer(self, instance=None, *args, **kwargs):
+        return DatasetRowSerializer(instance, encoder=self.get_row_encoder())
 
     def handle_exception(self, exc):
         if isinstance(exc, InvalidFiltersException):
@@ -96,9 +115,65 @@ class DatasetDataListView(ListAPIView):
         else:
             return super().handle_exception(exc)
 
+    def get_response_cache_key(self, request):
+        table = self.get_table()
+        return self.make_response_cache_key(request, [table_tag(table.dataset.slug, table.name)], table.data_table.id)
+
+    def get_response_etag(self, key):
+        # The key depends on the data table and on the table's cache tag (changed by incremental imports)
+        return f"{self.get_table().data_table.id}-{key.rsplit(':', 1)[-1]}"
+
+    def get_response_last_modified(self):
+        return table_last_modified(self.get_table())
+
     @check_api_version_redirect
-    def get(self, *args, **kwargs):
-        return super().get(*args, **kwargs)
+    def get(self, request, *args, **kwargs):
+        sample_start = time.monotonic() if should_sample() else None
+        response = self.cached_response(request, partial(super().get, request, *args, **kwargs))
+        # Only logged when the query ran (not for cached responses)
+        if sample_start is not None and response.status_code == 200 and hasattr(self, "parsed_querystring"):
+            log_query_shape(self.get_query_shape(), time.monotonic() - sample_start)
+        return response
+
+    @classmethod
+    def fill_response_cache(cls, request, **kwargs):
+        """Build the response of `request` (an `HttpRequest`) and store it in the cache, return its status code
+
+        Used to warm the cache up after imports (see `core.warmup`): cached
+        responses are the same for all users, so authentication, permissions
+        and throttling are skipped and the query is not logged.
+        """
+        self = cls()
+        self.args, self.kwargs, self.format_kwarg = (), kwargs, None
+        self.request = request = self.initialize_request(request, **kwargs)
+        self.headers = self.default_response_headers
+        try:
+            request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+            request.version, request.versioning_scheme = self.determine_version(request, **kwargs)
+            response = self.cached_response(request, partial(self.list, request, **kwargs))
+        except Exception as exception:
+            response = self.handle_exception(exception)
+        response = self.finalize_response(request, response, **kwargs)
+        if isinstance(response, Response):  # Not cached yet: rendering stores it
+            response.render()
+        return response.status_code
+
+    def get_query_shape(self):
+        query, search_query, order_by = self.parsed_querystring
+        try:
+            page = int(self.request.query_params.get("page", 1))
+        except ValueError:
+            page = None
+        cursor = self.keyset_pagination_class.cursor_query_param in self.request.query_params
+        return query_shape(
+            self.get_table(),
+            query,
+            search_query,
+            order_by,
+            page=None if cursor else page,
+            cursor=cursor,
+            source="api",
+        )
 
 
 api_description = """
@@ -56,7 +56,8 @@ MIDDLEWARE = [
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
-    "django.middleware.cache.UpdateCacheMiddleware",
+    "django.middleware.http.ConditionalGetMiddleware",  # 304 for cached pages too
+    "core.middlewares.TaggedUpdateCacheMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -276,6 +277,77 @@ sentry_sdk.init(
 
 CSV_EXPORT_MAX_ROWS = env.int("CSV_EXPORT_MAX_ROWS", default=10_000)
 
+# Filtered/searched dataset table counts are cached and, when the query
+# planner expects more than COUNT_ESTIMATE_THRESHOLD rows, estimated instead of
+# running `COUNT(*)` (0 disables the estimation).
+COUNT_ESTIMATE_THRESHOLD = env.int("COUNT_ESTIMATE_THRESHOLD", default=100_000)
+COUNT_CACHE_TIMEOUT = env.int("COUNT_CACHE_TIMEOUT", default=24 * 3600)  # seconds
+# Rows, count and page of dataset table pages (for any user) are cached for
+# TABLE_PAGE_CACHE_TIMEOUT seconds (or until the table is imported again).
+TABLE_PAGE_CACHE_TIMEOUT = env.int("TABLE_PAGE_CACHE_TIMEOUT", default=3600)
+# Compressed API responses of dataset table data are cached for API_CACHE_TIMEOUT
+# seconds (or until the table is imported again).
+API_CACHE_TIMEOUT = env.int("API_CACHE_TIMEOUT", default=24 * 3600)
+# Part of the ETags of pages built from dataset tables (see `core.conditional`):
+# change it when a deploy changes how these pages are rendered.
+CONDITIONAL_RESPONSE_SALT = env("CONDITIONAL_RESPONSE_SALT", default="")
+# Values cached by `core.stale_cache` (like the covid19 aggregations) are
+# recomputed in the background after STALE_CACHE_SOFT_TTL seconds (while the
+# old one is served) and dropped after STALE_CACHE_HARD_TTL seconds.
+STALE_CACHE_SOFT_TTL = env.int("STALE_CACHE_SOFT_TTL", default=CACHE_INTERVAL)
+STALE_CACHE_HARD_TTL = env.int("STALE_CACHE_HARD_TTL", default=7 * 24 * 3600)
+STALE_CACHE_LOCK_TIMEOUT = env.int("STALE_CACHE_LOCK_TIMEOUT", default=10 * 60)
+# Read covid19 historical series from the tables built after imports (see
+# `covid19.models.HistoricalSummary`) instead of aggregating them per request.
+COVID19_STATS_FROM_SUMMARIES = env.bool("COVID19_STATS_FROM_SUMMARIES", default=True)
+# Full-text searches rank at most SEARCH_CANDIDATES_LIMIT matching rows (0
+# ranks all of them).
+SEARCH_CANDIDATES_LIMIT = env.int("SEARCH_CANDIDATES_LIMIT", default=10_000)
+# Max. time (in seconds) a worker takes to notice a table schema change made
+# by another process (see `core.schema.TableSchemaRegistry`).
+TABLE_SCHEMA_CHECK_INTERVAL = env.int("TABLE_SCHEMA_CHECK_INTERVAL", default=1)
+# Max. number of dynamic model classes kept in memory by each worker (least
+# recently used ones are unregistered from Django's app registry).
+DYNAMIC_MODEL_REGISTRY_MAX_SIZE = env.int("DYNAMIC_MODEL_REGISTRY_MAX_SIZE", default=256)
+# A fraction (QUERY_LOG_SAMPLE_RATE, from 0 to 1) of dataset table queries have
+# their shapes logged to QUERY_LOG_FILENAME (used by `index_advisor`).
+QUERY_LOG_FILENAME = env("QUERY_LOG_FILENAME", default=None)
+QUERY_LOG_SAMPLE_RATE = env.float("QUERY_LOG_SAMPLE_RATE", default=0.0)
+# Imports save a JSON report with the time spent in each stage to this
+# directory (if set), to be compared with `compare_import_reports`.
+IMPORT_REPORTS_PATH = env("IMPORT_REPORTS_PATH", default=None)
+# Fields with more than CHOICES_MAX_VALUES distinct values don't get choices
+# (filled by `update_choices` and imports) - 0 means no limit.
+CHOICES_MAX_VALUES = env.int("CHOICES_MAX_VALUES", default=10_000)
+# After an import, the WARMUP_MAX_URLS most requested URLs of the table (from
+# the query log) are run against the new table before it's activated and their
+# rows/API responses are cached in the background, using WARMUP_WORKERS
+# connections at once.
+WARMUP_MAX_URLS = env.int("WARMUP_MAX_URLS", default=50)
+WARMUP_WORKERS = env.int("WARMUP_WORKERS", default=4)
+# Indexes of imported tables are built using INDEX_BUILD_WORKERS connections at
+# once, each one with the `maintenance_work_mem` (in MiB) and
+# `max_parallel_maintenance_workers` below (empty = PostgreSQL's settings).
+INDEX_BUILD_WORKERS = env.int("INDEX_BUILD_WORKERS", default=4)
+INDEX_BUILD_MAINTENANCE_WORK_MEM = env.int("INDEX_BUILD_MAINTENANCE_WORK_MEM", default=None)
+INDEX_BUILD_MAX_PARALLEL_MAINTENANCE_WORKERS = env.int("INDEX_BUILD_MAX_PARALLEL_MAINTENANCE_WORKERS", default=None)
+# When importing with `--defer-search-data`, `search_data` is filled by
+# SEARCH_DATA_WORKERS connections, in chunks of SEARCH_DATA_CHUNK_SIZE ids.
+SEARCH_DATA_WORKERS = env.int("SEARCH_DATA_WORKERS", default=4)
+SEARCH_DATA_CHUNK_SIZE = env.int("SEARCH_DATA_CHUNK_SIZE", default=100_000)
+# Incremental imports (`import_data --incremental`) apply the changed rows in
+# transactions of INCREMENTAL_IMPORT_BATCH_SIZE rows.
+INCREMENTAL_IMPORT_BATCH_SIZE = env.int("INCREMENTAL_IMPORT_BATCH_SIZE", default=10_000)
+# Default number of rows per COPY when resuming chunked imports
+# (`import_data --resume`).
+IMPORT_CHUNK_SIZE = env.int("IMPORT_CHUNK_SIZE", default=100_000)
+# `import_from_url` reads the file in chunks of IMPORT_STREAM_CHUNK_SIZE bytes
+# and each consumer (COPY, MinIO upload) buffers up to IMPORT_STREAM_QUEUE_SIZE
+# chunks. Uploads use parts of IMPORT_STREAM_UPLOAD_PART_SIZE bytes (>= 5 MiB).
+IMPORT_STREAM_CHUNK_SIZE = env.int("IMPORT_STREAM_CHUNK_SIZE", default=1024 * 1024)
+IMPORT_STREAM_QUEUE_SIZE = env.int("IMPORT_STREAM_QUEUE_SIZE", default=16)
+IMPORT_STREAM_UPLOAD_PART_SIZE = env.int("IMPORT_STREAM_UPLOAD_PART_SIZE", default=16 * 1024 * 1024)
+
 
 # Cloudflare config
 CLOUDFLARE_AUTH_EMAIL = env("CLOUDFLARE_AUTH_EMAIL")
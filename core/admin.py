@@ -191,3 +191,32 @@ class TableFileAdmin(admin.ModelAdmin):
 
 
 admin.site.register(models.TableFile, TableFileAdmin)
+
+
+class DataTableImportAdmin(admin.ModelAdmin):
+    list_display = [
+        "data_table",
+        "created_at",
+        "rows_total",
+        "rows_inserted",
+        "rows_updated",
+        "rows_deleted",
+        "duration",
+    ]
+    list_filter = ["data_table__table__dataset"]
+    readonly_fields = [
+        "data_table",
+        "created_at",
+        "filename",
+        "rows_total",
+        "rows_inserted",
+        "rows_updated",
+        "rows_deleted",
+        "duration",
+    ]
+
+    def has_add_permission(self, *args, **kwargs):
+        return False
+
+
+admin.site.register(models.DataTableImport, DataTableImportAdmin)
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def make_cache_key(prefix, *parts):
+    """Create a short cache key for `parts` (which must be JSON-serializable)"""
+    content = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return f"{prefix}:{hashlib.md5(content).hexdigest()}"
+
+
+def dataset_tag(dataset_slug):
+    """Tag of cache entries which depend on any table of a dataset (like dataset-level pages)"""
+    return f"dataset:{dataset_slug}"
+
+
+def table_tag(dataset_slug, tablename):
+    """Tag of cache entries which depend on the data of one table"""
+    return f"table:{dataset_slug}.{tablename}"
+
+
+def _tag_version_key(tag):
+    return f"cache-tag-version:{tag}"
+
+
+def _new_tag_version():
+    return int(time.time() * 1000)
+
+
+def tagged_key_prefix(prefix, tags):
+    """Key prefix for entries which depend on `tags`
+
+    The prefix includes the tags' current versions, so when one of them is
+    invalidated (see `invalidate_tags`) the entries are not found anymore (and
+    expire by themselves), while the ones with other tags stay untouched.
+    """
+    tags = sorted(set(tags))
+    if not tags:
+        return prefix
+    keys = [_tag_version_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A new (not reused) version, so entries created before the
+            # version was evicted can't be found again
+            cache.add(key, _new_tag_version(), None)
+            versions[key] = cache.get(key)
+    return make_cache_key(prefix, tags, [versions[key] for key in keys])
+
+
+def invalidate_tags(*tags):
+    """Invalidate all cache entries tagged with any of `tags` (instead of clearing the whole cache)"""
+    for tag in tags:
+        key = _tag_version_key(tag)
+        try:
+            cache.incr(key)
+        except ValueError:  # Key does not exist (or the backend can't increment)
+            cache.set(key, _new_tag_version(), None)
+
+
+def _count_generation_key(db_table):
+    return f"table-count-generation:{db_table}"
+
+
+def invalidate_table_counts(db_table):
+    """Drop all cached counts for the physical table `db_table`"""
+    key = _count_generation_key(db_table)
+    try:
+        cache.incr(key)
+    except ValueError:  # Key does not exist (or the backend can't increment)
+        cache.set(key, 1, None)
+
+
+def count_cache_key(db_table, filters, search_terms):
+    generation = cache.get(_count_generation_key(db_table), 0)
+    filters = sorted((str(key), str(value)) for key, value in (filters or {}).items())
+    search_terms = sorted(set(search_terms or []))
+    return make_cache_key("table-count", db_table, generation, filters, search_terms)
+
+
+def get_cached_count(key):
+    """Return `(value, approximate)` for `key` or `None` if not cached"""
+    value = cache.get(key)
+    return tuple(value) if value is not None else None
+
+
+def set_cached_count(key, value, approximate):
+    cache.set(key, (value, approximate), settings.COUNT_CACHE_TIMEOUT)
+
+
+def table_page_cache_key(table, filters, search_terms, ordering, page, page_size):
+    """Key of a dataset table page's cached rows (the same for all users, since table data is public)
+
+    Depends on the active data table and on the table's tag (so incremental
+    imports, which keep the data table, also invalidate the pages).
+    """
+    prefix = tagged_key_prefix("table-page", [table_tag(table.dataset.slug, table.name)])
+    filters = sorted((str(key), str(value)) for key, value in (filters or {}).items())
+    search_terms = sorted(set(search_terms or []))
+    return make_cache_key(prefix, table.data_table.id, filters, search_terms, list(ordering or []), page, page_size)
+
+
+def get_cached_table_page(key):
+    return cache.get(key)
+
+
+def set_cached_table_page(key, value):
+    cache.set(key, value, settings.TABLE_PAGE_CACHE_TIMEOUT)
@@ -0,0 +1,98 @@
+from textwrap import dedent
+
+from django.conf import settings
+from django.db import connection
+
+from core.models import Field
+
+
+class ChoicesExtractor:
+    """
+    Collect the distinct values of many fields of a dataset table in one scan
+
+    Uses `GROUP BY GROUPING SETS` (one set per field), so the table is read
+    once no matter how many fields have choices. Fields with more than
+    `max_values` distinct values are not useful as dropdowns: they are skipped
+    (before the scan, if the planner's statistics already say so) and have
+    `None` as their choices.
+    """
+
+    ESTIMATE_MARGIN = 2
+
+    def __init__(self, Model, field_names, max_values=None):
+        self.Model = Model
+        self.field_names = list(field_names)
+        self.max_values = max_values if max_values is not None else settings.CHOICES_MAX_VALUES
+
+    def estimated_distinct_values(self):
+        """Estimated number of distinct values per column (from `pg_stats`, filled by `ANALYSE`)"""
+        db_table = self.Model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [db_table])
+            row = cursor.fetchone()
+            total = max(row[0], 0) if row else 0
+            cursor.execute("SELECT attname, n_distinct FROM pg_stats WHERE tablename = %s", [db_table])
+            # Negative values are a fraction of the number of rows
+            return {name: value if value >= 0 else -value * total for name, value in cursor.fetchall()}
+
+    def query(self, field_names):
+        qn = connection.ops.quote_name
+        columns = [qn(name) for name in field_names]
+        groupings = ", ".join(f"GROUPING({column})" for column in columns)
+        # Rows from the set of the first field come first (ordered by its
+        # values, NULL last, as `ORDER BY field` would), then the second etc.
+        ordering = ", ".join(f"GROUPING({column}), {column}" for column in columns)
+        sets = ", ".join(f"({column})" for column in columns)
+        return dedent(
+            f"""
+            SELECT {", ".join(columns)}, {groupings}
+            FROM {self.Model._meta.db_table}
+            GROUP BY GROUPING SETS ({sets})
+            ORDER BY {ordering}
+        """
+        ).strip()
+
+    def extract(self):
+        """Return a dict with the list of choices (as strings) per field name, or `None` if there are too many"""
+        choices = {name: None for name in self.field_names}
+        field_names = list(self.field_names)
+        if self.max_values:
+            # Estimates may be a little off, so only clearly high cardinality fields are skipped
+            estimated = self.estimated_distinct_values()
+            limit = self.max_values * self.ESTIMATE_MARGIN
+            field_names = [name for name in field_names if estimated.get(name, 0) <= limit]
+        if not field_names:
+            return choices
+
+        values = {name: [] for name in field_names}
+        too_many = set()
+        size = len(field_names)
+        with connection.cursor() as cursor:
+            cursor.execute(self.query(field_names))
+            for row in cursor:
+                index = row[size:].index(0)  # The set this row is from
+                name = field_names[index]
+                if name in too_many:
+                    continue
+                field_values = values[name]
+                field_values.append(str(row[index]))
+                if self.max_values and len(field_values) > self.max_values:
+                    too_many.add(name)
+        for name in field_names:
+            if name not in too_many:
+                choices[name] = values[name]
+        return choices
+
+
+def update_table_choices(table, data_table=None, max_values=None):
+    """Extract and save the choices of all choiceable fields of `table`, return `{field: choices}`"""
+    fields = list(Field.objects.for_table(table).choiceables())
+    if not fields:
+        return {}
+    Model = table.get_model(data_table=data_table)
+    choices = ChoicesExtractor(Model, [field.name for field in fields], max_values=max_values).extract()
+    for field in fields:
+        values = choices[field.name]
+        field.choices = {"data": values} if values is not None else None
+        field.save()
+    return choices
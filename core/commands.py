@@ -1,28 +1,120 @@
+import bz2
 import csv
 import hashlib
+import io
+import lzma
 import math
 import mimetypes
 import os
 import time
+import uuid
+import zlib
 from collections import OrderedDict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
 from pathlib import Path
+from queue import Queue
 from tempfile import NamedTemporaryFile
+from textwrap import dedent
+from threading import Thread
 from urllib.parse import urlparse
 
+import django
 import requests
 import rows
 from django.conf import settings
-from django.core.cache import cache
-from django.db import transaction
+from django.db import connection, connections, transaction
 from django.db.utils import ProgrammingError
 from django.utils import timezone
 from minio import Minio
 from tqdm import tqdm
 
-from core.models import Dataset, DataTable, Field, Table, TableFile
+from core.caching import invalidate_table_counts
+from core.choices import update_table_choices
+from core.import_profiler import ImportProfiler
+from core.models import Dataset, DataTable, DataTableImport, ImportCheckpoint, Table, TableFile
+from core.signals import table_data_updated
+from core.tasks import warm_view_cache_task
+from core.warmup import CacheWarmer
 from utils.minio import MinioProgress
 
 
+def read_csv_header(filename, encoding):
+    """Return the CSV dialect and header of a (possibly compressed) file"""
+    sample_size = 1 * 1024 * 1024  # 1 MiB
+    with rows.utils.open_compressed(filename, mode="rb") as fobj:
+        sample = fobj.read(sample_size)
+        dialect = rows.plugins.csv.discover_dialect(sample, encoding)
+    with rows.utils.open_compressed(filename) as fobj:
+        reader = csv.DictReader(fobj, dialect=dialect)
+        return dialect, reader.fieldnames
+
+
+def csv_chunks(fobj, chunk_size, quotechar='"'):
+    """Split a binary CSV stream in chunks of up to `chunk_size` records
+
+    Yield `(data, records, size)`, where `size` is the number of bytes read
+    from `fobj` (empty lines are skipped). Since quoted values may have line
+    breaks, a chunk only ends in a line where the number of quote characters
+    read in the record is even.
+    """
+    quote = quotechar.encode("ascii")
+    lines, records, size, quotes = [], 0, 0, 0
+    for line in fobj:
+        size += len(line)
+        if not quotes and not line.strip():
+            continue
+        lines.append(line)
+        quotes += line.count(quote)
+        if quotes % 2 == 0:
+            records += 1
+            quotes = 0
+            if records == chunk_size:
+                yield b"".join(lines), records, size
+                lines, records, size = [], 0, 0
+    if lines or size:
+        yield b"".join(lines), records, size
+
+
+def copy_from_stdin_sql(table_name, columns, dialect):
+    """`COPY ... FROM STDIN` statement for CSV data (without header) in `dialect`"""
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        return cursor.mogrify(
+            "COPY {} ({}) FROM STDIN WITH (FORMAT csv, DELIMITER %s, QUOTE %s, ENCODING 'UTF8')".format(
+                table_name, ", ".join(qn(name) for name in columns)
+            ),
+            [dialect.delimiter, dialect.quotechar],
+        ).decode("utf-8")
+
+
+def copy_file(filename, table_name, table_schema, unlogged=False):
+    """Import a CSV file into an existing table using COPY (only the file's columns are filled)
+
+    Return the import metadata from `rows.utils.pgimport` (raises
+    `RuntimeError` in case of errors).
+    """
+    database_uri = os.environ["DATABASE_URL"]
+    encoding = "utf-8"  # TODO: receive as a parameter
+    dialect, file_header = read_csv_header(filename, encoding)
+    progress = rows.utils.ProgressBar(prefix="Importing data", unit="bytes")
+    schema = OrderedDict([(field_name, table_schema[field_name]) for field_name in file_header])
+    try:
+        return rows.utils.pgimport(
+            filename=filename,
+            encoding=encoding,
+            dialect=dialect,
+            database_uri=database_uri,
+            table_name=table_name,
+            create_table=False,
+            callback=progress.update,
+            schema=schema,
+            unlogged=unlogged,
+        )
+    finally:
+        progress.close()
+
+
 class ImportDataCommand:
     def __init__(self, table, **options):
         self.table = table
@@ -34,6 +126,17 @@ class ImportDataCommand:
         self.flag_delete_old_table = options["delete_old_table"]
         self.collect_date = options["collect_date"]
         self.unlogged = options["unlogged"]
+        self.maintenance_work_mem = options.get("maintenance_work_mem")  # in MiB
+        # Compute `search_data` in bulk after COPY instead of using the trigger for each row
+        self.defer_search_data = options.get("defer_search_data", False)
+        # Import in chunks of `chunk_size` rows, saving checkpoints so a failed import can be resumed
+        self.resume = options.get("resume", False)
+        self.chunk_size = options.get("chunk_size") or (settings.IMPORT_CHUNK_SIZE if self.resume else None)
+        self.report_filename = options.get("report_filename")
+        # Run the most requested queries against the new table before activating it and cache its pages after
+        self.flag_warmup = options.get("warmup", True)
+        self.profiler = ImportProfiler(table.dataset.slug, table.name, options)
+        self.rows_imported = self.bytes_read = None  # Filled by `import_data`
 
     def log(self, msg, *args, **kwargs):
         print(msg, *args, **kwargs)
@@ -42,133 +145,596 @@ class ImportDataCommand:
     def execute(cls, dataset_slug, tablename, filename, **options):
         table = Table.with_hidden.for_dataset(dataset_slug).named(tablename)
         self = cls(table, **options)
-        data_table = DataTable.new_data_table(self.table)  # in memory instance, not persisted in the DB
+        data_table, Model = self.load_data(filename)
+        if self.flag_warmup:
+            self.warmup(Model)
+        cls.activate_data_tables([(self, data_table, Model)])
+        if self.flag_clear_view_cache:
+            self.clear_view_cache()
+            if self.flag_warmup:
+                self.warm_view_cache()
+        self.save_report(Model)
 
-        Model = self.refresh_model_table(data_table)
+    def save_report(self, Model):
+        """Save the profiler's report (to `report_filename` or `settings.IMPORT_REPORTS_PATH`), if configured"""
+        filename = self.report_filename
+        if not filename and settings.IMPORT_REPORTS_PATH:
+            filename = self.profiler.default_filename(settings.IMPORT_REPORTS_PATH)
+        if not filename:
+            return
+        try:
+            self.profiler.collect_sizes(Model.tablename())
+        except ProgrammingError:  # Table was deleted
+            pass
+        self.profiler.save(filename)
+        self.log(f"Import report saved to {filename}")
+
+    def load_data(self, filename):
+        """Create a new (inactive) data table, import data and prepare it to be activated"""
+        checkpoint = ImportCheckpoint.objects.resumable(self.table, str(filename)) if self.resume else None
+        if checkpoint is not None:
+            data_table = checkpoint.data_table
+            Model = self.table.get_model(cache=False, data_table=data_table)
+            self.log(f"Resuming import to table {data_table.db_table_name} after {checkpoint.rows_imported} rows")
+        else:
+            data_table = DataTable.new_data_table(self.table)  # in memory instance, not persisted in the DB
+            Model = self.refresh_model_table(data_table)
 
         if self.flag_import_data:
             self.log(f"Importing data to new table {data_table.db_table_name}")
-            self.import_data(filename, Model)
+            # Includes reading/decompressing/parsing the file and the search trigger
+            with self.profiler.stage("copy") as stage:
+                if self.chunk_size:
+                    self.import_data_in_chunks(filename, Model, data_table, checkpoint)
+                else:
+                    self.import_data(filename, Model)
+                stage["rows"], stage["bytes"] = self.rows_imported, self.bytes_read
+        if self.defer_search_data:
+            self.fill_search_data(Model)
+            Model.create_triggers()
 
         # Vaccum and concurrent index creation cannot run inside a transaction block
+        if self.maintenance_work_mem:  # For VACUUM (index builds use their own connections)
+            with connection.cursor() as cursor:
+                cursor.execute(f"SET maintenance_work_mem = '{int(self.maintenance_work_mem)}MB'")
         if self.flag_create_filter_indexes:
             self.create_filter_indexes(Model)
         if self.flag_vacuum:
             self.run_vacuum(Model)
 
-        try:
-            with transaction.atomic():
-                if self.flag_fill_choices:
-                    self.fill_choices(Model, data_table)
+        return data_table, Model
+
+    def activate(self, data_table, Model):
+        if self.flag_fill_choices:
+            self.fill_choices(Model, data_table)
 
-                if self.table.data_table is not None:
-                    self.table.data_table.deactivate(drop_table=self.flag_delete_old_table)
+        with self.profiler.stage("activate"):
+            current_data_table = self.table.data_tables.get_current_active()
+            if current_data_table is not None:
+                current_data_table.deactivate(drop_table=self.flag_delete_old_table)
 
-                data_table.activate()
-                self.table.refresh_from_db()  # To have data_table filled
+            data_table.activate()
+            self.table.refresh_from_db()  # To have data_table filled
+
+    @classmethod
+    def activate_data_tables(cls, imports):
+        """Activate new data tables (`imports` is a list of `(command, data_table, Model)`) in one transaction"""
+        try:
+            with transaction.atomic():
+                for command, data_table, Model in imports:
+                    command.activate(data_table, Model)
         except Exception as e:
-            self.log(f"Deleting import table {data_table.db_table_name} due to an error.")
-            data_table.delete_data_table()
+            for command, data_table, Model in imports:
+                command.log(f"Deleting import table {data_table.db_table_name} due to an error.")
+                data_table.delete_data_table()
             raise e
 
-        if self.flag_clear_view_cache:
-            self.log("Clearing view and table caches...")
+    def clear_view_cache(self):
+        self.log("Clearing view and table caches...")
+        with self.profiler.stage("clear_cache"):
+            # Only entries tagged with this table/dataset (other datasets' pages stay cached)
             self.table.invalidate_cache()
-            cache.clear()
+
+    def warmup(self, Model):
+        """Run the table's most requested queries against the new data table (loads its pages and caches counts)"""
+        warmer = CacheWarmer(self.table)
+        urls = warmer.urls()
+        self.log(f"Warming new table up with {len(urls)} queries...", end="", flush=True)
+        with self.profiler.stage("warmup") as stage:
+            try:
+                stage["rows"] = warmer.prepare(Model, urls)
+            except Exception as exception:  # Warming up is not required to import
+                self.log(f" ERROR: {exception}")
+                return
+        self.log(f" done ({stage['rows']} rows read).")
+
+    def warm_view_cache(self):
+        """Fill the table page and API caches with the table's most requested pages in the background"""
+        urls = CacheWarmer(self.table).urls()
+        try:
+            warm_view_cache_task.delay(self.table.dataset.slug, self.table.name, urls)
+        except Exception as exception:
+            self.log(f"Could not enqueue view cache warmup: {exception}")
+        else:
+            self.log(f"View cache warmup of {len(urls)} page(s) enqueued.")
 
     def refresh_model_table(self, data_table):
         Model = self.table.get_model(cache=False, data_table=data_table)
 
         # Create the table if not exists
-        with transaction.atomic():
+        with self.profiler.stage("create_table"), transaction.atomic():
             try:
                 Model.delete_table()
             except ProgrammingError:  # Does not exist
                 pass
             finally:
                 Model.create_table(indexes=False)
-                Model.create_triggers()
+                if not self.defer_search_data:
+                    Model.create_triggers()
 
         return Model
 
     def import_data(self, filename, Model):
-        # Get file object, header and set command to run
-        table_name = Model._meta.db_table
-        database_uri = os.environ["DATABASE_URL"]
-        encoding = "utf-8"  # TODO: receive as a parameter
         start_time = time.time()
-        progress = rows.utils.ProgressBar(prefix="Importing data", unit="bytes")
-
-        sample_size = 1 * 1024 * 1024  # 1 MiB
-        with rows.utils.open_compressed(filename, mode="rb") as fobj:
-            sample = fobj.read(sample_size)
-            dialect = rows.plugins.csv.discover_dialect(sample, encoding)
-        with rows.utils.open_compressed(filename) as fobj:
-            reader = csv.DictReader(fobj, dialect=dialect)
-            file_header = reader.fieldnames
-        table_schema = self.table.schema
-        schema = OrderedDict([(field_name, table_schema[field_name]) for field_name in file_header])
         try:
-            import_meta = rows.utils.pgimport(
-                filename=filename,
-                encoding=encoding,
-                dialect=dialect,
-                database_uri=database_uri,
-                table_name=table_name,
-                create_table=False,
-                callback=progress.update,
-                schema=schema,
-                unlogged=self.unlogged,
-            )
+            import_meta = copy_file(filename, Model._meta.db_table, self.table.schema, unlogged=self.unlogged)
         except RuntimeError as exception:
-            progress.close()
             Model.delete_table()
             self.log("ERROR: {}".format(exception.args[0]))
             exit(1)
         else:
-            progress.close()
-            self.table.import_date = timezone.now()
-            self.table.save()
-            if self.collect_date:
-                self.table.version.collected_at = self.collect_date
-                self.table.version.save()
+            self.update_import_date()
             end_time = time.time()
             duration = end_time - start_time
-            rows_imported = import_meta["rows_imported"]
+            rows_imported = self.rows_imported = import_meta["rows_imported"]
+            self.bytes_read = os.path.getsize(filename)
             self.log(
                 "  done in {:7.3f}s ({} rows imported, {:.3f} rows/s).".format(
                     duration, rows_imported, rows_imported / duration
                 )
             )
 
+    def import_data_in_chunks(self, filename, Model, data_table, checkpoint=None):
+        """Import data using one COPY per chunk of rows, saving a checkpoint after each one
+
+        The data table (and its data) is kept in case of errors, so the import
+        can be resumed from the last checkpoint (`resume` option).
+        """
+        encoding = "utf-8"  # TODO: receive as a parameter
+        dialect, file_header = read_csv_header(filename, encoding)
+        unknown = [field_name for field_name in file_header if field_name not in self.table.schema]
+        if unknown:
+            if checkpoint is None:
+                Model.delete_table()
+            self.log("ERROR: unknown columns in file: {}".format(", ".join(unknown)))
+            exit(1)
+        copy_sql = copy_from_stdin_sql(Model.tablename(), file_header, dialect)
+
+        if checkpoint is None:
+            data_table.save()  # The checkpoint needs a persisted (and still inactive) data table
+            checkpoint = ImportCheckpoint.objects.create(data_table=data_table, filename=str(filename))
+        start_time = time.time()
+        rows_imported = bytes_read = 0  # In this run (not since the first checkpoint)
+        with rows.utils.open_compressed(filename, mode="rb") as fobj:
+            if checkpoint.offset:
+                fobj.seek(checkpoint.offset)
+            else:
+                checkpoint.offset = len(fobj.readline())  # Header
+            for number, (data, records, size) in enumerate(csv_chunks(fobj, self.chunk_size, dialect.quotechar), 1):
+                chunk_start = time.time()
+                try:
+                    with transaction.atomic():  # The checkpoint is saved only if the chunk is imported
+                        with connection.cursor() as cursor:
+                            cursor.copy_expert(copy_sql, io.BytesIO(data))
+                        checkpoint.offset += size
+                        checkpoint.rows_imported += records
+                        checkpoint.save()
+                except Exception as exception:
+                    checkpoint.refresh_from_db()
+                    self.log(f"ERROR: {exception}")
+                    self.log(
+                        f"Import stopped after {checkpoint.rows_imported} rows - it can be resumed (`--resume`)."
+                    )
+                    exit(1)
+                rows_imported += records
+                bytes_read += size
+                duration = time.time() - chunk_start
+                self.log(
+                    "  chunk {}: {} rows in {:.3f}s ({:.3f} rows/s, {:.3f} MiB/s) - {} rows imported".format(
+                        number,
+                        records,
+                        duration,
+                        records / duration if duration else 0,
+                        size / duration / 1024 ** 2 if duration else 0,
+                        checkpoint.rows_imported,
+                    )
+                )
+        checkpoint.finished = True
+        checkpoint.save()
+        self.rows_imported, self.bytes_read = rows_imported, bytes_read
+
+        self.update_import_date()
+        duration = time.time() - start_time
+        self.log(
+            "  done in {:7.3f}s ({} rows imported, {:.3f} rows/s).".format(
+                duration, rows_imported, rows_imported / duration if duration else 0
+            )
+        )
+
+    def update_import_date(self):
+        self.table.import_date = timezone.now()
+        self.table.save()
+        if self.collect_date:
+            self.table.version.collected_at = self.collect_date
+            self.table.version.save()
+
+    def fill_search_data(self, Model):
+        if not Model.extra["search"]:
+            return
+        self.log("Filling search data...", end="", flush=True)
+        start = time.time()
+        min_id, max_id = Model.id_range()
+        if min_id is not None:
+            chunk_size = settings.SEARCH_DATA_CHUNK_SIZE
+            chunks = [(chunk_start, chunk_start + chunk_size) for chunk_start in range(min_id, max_id + 1, chunk_size)]
+
+            def update_chunk(chunk):
+                try:
+                    return Model.update_search_data(*chunk)
+                finally:
+                    connection.close()  # This thread's connection
+
+            with self.profiler.stage("search_data") as stage:
+                with ThreadPoolExecutor(max_workers=settings.SEARCH_DATA_WORKERS) as executor:
+                    updated = stage["rows"] = sum(executor.map(update_chunk, chunks))
+        else:
+            updated = 0
+        end = time.time()
+        self.log("  done in {:.3f}s ({} rows updated).".format(end - start, updated))
+
     def run_vacuum(self, Model):
         self.log("Running VACUUM ANALYSE...", end="", flush=True)
         start = time.time()
-        Model.analyse_table()
+        with self.profiler.stage("vacuum"):
+            Model.analyse_table()
         end = time.time()
         self.log("  done in {:.3f}s.".format(end - start))
 
     def create_filter_indexes(self, Model):
         # TODO: warn if field has_choices but not in Table.filtering
-        self.log("Creating filter indexes...", end="", flush=True)
+        self.log("Creating filter indexes...")
         start = time.time()
-        Model.create_indexes()  # TODO: add "IF NOT EXISTS"
+        workers = settings.INDEX_BUILD_WORKERS
+        if self.maintenance_work_mem:  # Memory budget for this import, split between the connections
+            maintenance_work_mem = max(1, self.maintenance_work_mem // workers)
+        else:
+            maintenance_work_mem = settings.INDEX_BUILD_MAINTENANCE_WORK_MEM
+
+        def report(index, duration):
+            self.profiler.record_index(index.name, index.fields, duration)
+            self.log("  {} ({}) - done in {:.3f}s.".format(index.name, ", ".join(index.fields), duration))
+
+        # The new table is not active yet, so it's safe (and much faster) to
+        # create the indexes non-concurrently and in parallel
+        with self.profiler.stage("indexes"):
+            Model.create_indexes(
+                concurrently=False,
+                workers=workers,
+                callback=report,
+                maintenance_work_mem=maintenance_work_mem,
+                max_parallel_maintenance_workers=settings.INDEX_BUILD_MAX_PARALLEL_MAINTENANCE_WORKERS,
+            )
         end = time.time()
         self.log("  done in {:.3f}s.".format(end - start))
 
     def fill_choices(self, Model, data_table):
-        self.log("Filling choices...")
+        self.log("Filling choices...", end="", flush=True)
         start = time.time()
-        choiceables = Field.objects.for_table(self.table).choiceables()
-        for field in choiceables:
-            self.log("  {}".format(field.name), end="", flush=True)
-            start_field = time.time()
-            field.update_choices(data_table)
-            field.save()
-            end_field = time.time()
-            self.log(" - done in {:.3f}s.".format(end_field - start_field))
+        with self.profiler.stage("choices"):
+            choices = update_table_choices(self.table, data_table=data_table)
         end = time.time()
         self.log("  done in {:.3f}s.".format(end - start))
+        for name, values in choices.items():
+            if values is None:
+                self.log(f"  WARNING: {name} has too many distinct values (choices not filled)")
+
+
+def load_table_data(dataset_slug, tablename, filename, options):
+    """Run `ImportDataCommand.load_data` in a worker process, return the new data table name"""
+    django.setup()
+    table = Table.with_hidden.for_dataset(dataset_slug).named(tablename)
+    command = ImportDataCommand(table, **options)
+    command.log = lambda msg, *args, **kwargs: print(f"[{tablename}] {msg}", *args, **kwargs)
+    try:
+        data_table, Model = command.load_data(filename)
+        command.save_report(Model)
+    except SystemExit as exception:  # `import_data` exits on errors
+        raise RuntimeError(f"Error importing {tablename} (exit code {exception.code})")
+    finally:
+        connections.close_all()
+    return data_table.db_table_name
+
+
+class ImportDatasetCommand:
+    """
+    Import many tables of a dataset in parallel (one process per table)
+
+    COPY, index creation and VACUUM ANALYZE run in the worker processes; the
+    new data tables are then activated in a single transaction, so the whole
+    dataset is switched at once.
+    """
+
+    def __init__(self, dataset_slug, manifest, workers, memory_budget=None, **options):
+        self.dataset_slug = dataset_slug
+        self.manifest = manifest  # list of (tablename, filename)
+        self.workers = max(1, min(workers, len(manifest)))
+        self.options = options
+        if memory_budget:
+            # Each worker may use its share of the budget to build indexes
+            self.options["maintenance_work_mem"] = max(1, memory_budget // self.workers)
+
+    def log(self, msg, *args, **kwargs):
+        print(msg, *args, **kwargs)
+
+    @staticmethod
+    def read_manifest(filename):
+        with open(filename, encoding="utf-8") as fobj:
+            return [(row["tablename"], row["filename"]) for row in csv.DictReader(fobj)]
+
+    def execute(self):
+        tables = {
+            tablename: Table.with_hidden.for_dataset(self.dataset_slug).named(tablename)
+            for tablename, _ in self.manifest
+        }
+        self.log(f"Importing {len(self.manifest)} tables using {self.workers} worker(s)")
+        start = time.time()
+
+        # Forked workers must not share the parent's database connection
+        connections.close_all()
+        imported, errors = {}, []
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {
+                executor.submit(load_table_data, self.dataset_slug, tablename, filename, self.options): tablename
+                for tablename, filename in self.manifest
+            }
+            for future in as_completed(futures):
+                tablename = futures[future]
+                try:
+                    imported[tablename] = future.result()
+                except Exception as exception:
+                    errors.append(tablename)
+                    self.log(f"ERROR importing {tablename}: {exception}")
+                else:
+                    self.log(f"{tablename} imported to {imported[tablename]}")
+
+        commands = []
+        for tablename, db_table_name in imported.items():
+            table = tables[tablename]
+            data_table = DataTable(table=table, db_table_name=db_table_name)
+            Model = table.get_model(cache=False, data_table=data_table)
+            commands.append((ImportDataCommand(table, **self.options), data_table, Model))
+
+        if errors:
+            for _, data_table, _ in commands:
+                self.log(f"Deleting import table {data_table.db_table_name} due to errors in other tables.")
+                data_table.delete_data_table()
+            raise RuntimeError(f"Could not import: {', '.join(sorted(errors))}")
+
+        if self.options.get("warmup", True):
+            for command, _, Model in commands:
+                command.warmup(Model)
+        self.log("Activating new data tables...")
+        ImportDataCommand.activate_data_tables(commands)
+        if self.options["clear_view_cache"]:
+            for command, _, _ in commands:
+                command.table.invalidate_cache()
+            if self.options.get("warmup", True):
+                for command, _, _ in commands:
+                    command.warm_view_cache()
+        self.log("Dataset imported in {:.3f}s.".format(time.time() - start))
+
+
+class IncrementalImportCommand(ImportDataCommand):
+    """
+    Apply only the differences between a file and the table's active data table
+
+    The file is loaded into an unlogged staging table and its rows are matched
+    with the active ones by the table's natural key (see
+    `Table.get_natural_key`): new rows are inserted, missing rows deleted and
+    rows whose hash changed are updated, in batches. The search vectors are
+    updated by the data table's trigger. Schema changes need a full import
+    (`ImportDataCommand`), which creates a new data table.
+    """
+
+    def __init__(self, table, **options):
+        super().__init__(table, **options)
+        self.batch_size = options.get("batch_size") or settings.INCREMENTAL_IMPORT_BATCH_SIZE
+
+    @classmethod
+    def execute(cls, dataset_slug, tablename, filename, **options):
+        table = Table.with_hidden.for_dataset(dataset_slug).named(tablename)
+        self = cls(table, **options)
+        data_table_import = self.import_changes(filename)
+        if data_table_import.rows_total != data_table_import.rows_unchanged:
+            table_data_updated.send(sender=Table, table=self.table)
+        if self.flag_clear_view_cache and data_table_import.rows_total != data_table_import.rows_unchanged:
+            self.clear_view_cache()
+            if self.flag_warmup:  # Rows changed in place, so only the view cache is warmed up
+                self.warm_view_cache()
+        self.save_report(self.table.get_model(data_table=data_table_import.data_table))
+        return data_table_import
+
+    def import_changes(self, filename):
+        start = time.time()
+        natural_key = self.table.get_natural_key()
+        if not natural_key:
+            raise RuntimeError(f"Table {self.table} has no natural key (set `natural_key` in its options)")
+        data_table = self.table.data_tables.get_current_active()
+        if data_table is None:
+            raise RuntimeError(f"Table {self.table} has no active data table (a full import is needed)")
+        Model = self.table.get_model(cache=False, data_table=data_table)
+        self.check_schema(Model)
+
+        staging_data_table = DataTable.new_data_table(self.table)  # Not persisted
+        staging_data_table.db_table_name += "_staging"
+        StagingModel = self.table.get_model(cache=False, data_table=staging_data_table)
+        StagingModel.create_table(indexes=False)
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {StagingModel.tablename()} SET UNLOGGED")
+        try:
+            self.log(f"Importing data to staging table {staging_data_table.db_table_name}")
+            try:
+                with self.profiler.stage("copy") as stage:
+                    import_meta = copy_file(filename, StagingModel.tablename(), self.table.schema, unlogged=True)
+                    stage["rows"], stage["bytes"] = import_meta["rows_imported"], os.path.getsize(filename)
+            except RuntimeError as exception:
+                self.log("ERROR: {}".format(exception.args[0]))
+                exit(1)
+            self.check_natural_key(StagingModel, natural_key)
+            with self.profiler.stage("apply_changes") as stage:
+                stats = self.apply_changes(Model, StagingModel, natural_key)
+                stage["rows"] = stats["inserted"] + stats["updated"] + stats["deleted"]
+        finally:
+            staging_data_table.delete_data_table()
+
+        data_table_import = DataTableImport.objects.create(
+            data_table=data_table,
+            filename=str(filename),
+            rows_total=import_meta["rows_imported"],
+            rows_inserted=stats["inserted"],
+            rows_updated=stats["updated"],
+            rows_deleted=stats["deleted"],
+            duration=time.time() - start,
+        )
+        self.log(
+            "{} rows inserted, {} updated, {} deleted and {} unchanged.".format(
+                data_table_import.rows_inserted,
+                data_table_import.rows_updated,
+                data_table_import.rows_deleted,
+                data_table_import.rows_unchanged,
+            )
+        )
+
+        self.update_import_date()
+        if stats["inserted"] or stats["updated"] or stats["deleted"]:
+            invalidate_table_counts(data_table.db_table_name)
+            if self.flag_vacuum:
+                self.run_vacuum(Model)
+            if self.flag_fill_choices:
+                self.fill_choices(Model, data_table)
+        return data_table_import
+
+    @staticmethod
+    def data_columns(Model):
+        return [field.column for field in Model._meta.fields if field.column not in ("id", "search_data")]
+
+    def check_schema(self, Model):
+        with connection.cursor() as cursor:
+            description = connection.introspection.get_table_description(cursor, Model.tablename())
+        columns = {column.name for column in description}
+        expected = {field.column for field in Model._meta.fields}
+        if columns != expected:
+            raise RuntimeError(
+                f"Schema of {Model.tablename()} differs from table {self.table}'s fields (a full import is needed)"
+            )
+
+    def check_natural_key(self, Model, natural_key):
+        """Incremental imports need unique and non-null natural keys"""
+        qn = connection.ops.quote_name
+        key_columns = ", ".join(qn(name) for name in natural_key)
+        null_condition = " OR ".join(f"{qn(name)} IS NULL" for name in natural_key)
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT 1 FROM {Model.tablename()} WHERE {null_condition} LIMIT 1")
+            if cursor.fetchone():
+                raise RuntimeError(f"Natural key ({key_columns}) has null values")
+            cursor.execute(
+                f"SELECT {key_columns} FROM {Model.tablename()} GROUP BY {key_columns} HAVING COUNT(*) > 1 LIMIT 1"
+            )
+            row = cursor.fetchone()
+            if row:
+                raise RuntimeError(f"Natural key ({key_columns}) is duplicated: {row}")
+
+    def apply_changes(self, Model, StagingModel, natural_key):
+        """Insert, update and delete rows in `Model` so it has the same data as `StagingModel`
+
+        Return the number of inserted, updated and deleted rows.
+        """
+        qn = connection.ops.quote_name
+        table, staging = Model.tablename(), StagingModel.tablename()
+        diff = f"{staging}_diff"
+        columns = self.data_columns(Model)
+        column_list = ", ".join(qn(name) for name in columns)
+        join_condition = " AND ".join(f"s.{qn(name)} = t.{qn(name)}" for name in natural_key)
+
+        def row_hash(alias):
+            return "md5(ROW({})::text)".format(", ".join(f"{alias}.{qn(name)}" for name in columns))
+
+        self.log("Computing differences...", end="", flush=True)
+        start = time.time()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {diff}")
+            cursor.execute(
+                dedent(
+                    f"""
+                    CREATE UNLOGGED TABLE {diff} AS
+                    SELECT ROW_NUMBER() OVER () AS n, s.id AS staging_id, t.id AS target_id
+                    FROM {staging} AS s
+                    FULL OUTER JOIN {table} AS t ON {join_condition}
+                    WHERE s.id IS NULL OR t.id IS NULL OR {row_hash("s")} <> {row_hash("t")}
+                """
+                ).strip()
+            )
+            cursor.execute(f"CREATE INDEX ON {diff} (n)")
+            cursor.execute(
+                dedent(
+                    f"""
+                    SELECT
+                        COUNT(*) FILTER (WHERE target_id IS NULL),
+                        COUNT(*) FILTER (WHERE staging_id IS NOT NULL AND target_id IS NOT NULL),
+                        COUNT(*) FILTER (WHERE staging_id IS NULL)
+                    FROM {diff}
+                """
+                ).strip()
+            )
+            inserted, updated, deleted = cursor.fetchone()
+        self.log("  done in {:.3f}s.".format(time.time() - start))
+
+        total = inserted + updated + deleted
+        set_columns = ", ".join(f"{qn(name)} = s.{qn(name)}" for name in columns)
+        source_columns = ", ".join(f"s.{qn(name)}" for name in columns)
+        progress = tqdm(desc="Applying changes", total=total, unit="rows")
+        try:
+            for batch_start in range(1, total + 1, self.batch_size):
+                batch = [batch_start, batch_start + self.batch_size]
+                # Each batch is committed, so locks on the active table are kept short
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(
+                        f"""DELETE FROM {table} WHERE id IN (
+                            SELECT target_id FROM {diff} WHERE n >= %s AND n < %s AND staging_id IS NULL
+                        )""",
+                        batch,
+                    )
+                    cursor.execute(
+                        f"""UPDATE {table} AS t SET {set_columns}
+                        FROM {diff} AS d INNER JOIN {staging} AS s ON s.id = d.staging_id
+                        WHERE t.id = d.target_id AND d.n >= %s AND d.n < %s""",
+                        batch,
+                    )
+                    cursor.execute(
+                        f"""INSERT INTO {table} ({column_list})
+                        SELECT {source_columns}
+                        FROM {diff} AS d INNER JOIN {staging} AS s ON s.id = d.staging_id
+                        WHERE d.target_id IS NULL AND d.n >= %s AND d.n < %s
+                        ORDER BY s.id""",
+                        batch,
+                    )
+                progress.update(min(self.batch_size, total - batch_start + 1))
+        finally:
+            progress.close()
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE IF EXISTS {diff}")
+
+        return {"inserted": inserted, "updated": updated, "deleted": deleted}
 
 
 class UpdateTableFileCommand:
@@ -212,11 +778,30 @@ class UpdateTableFileCommand:
         if self.should_upload:
             self.output_file.write(chunk)
 
+    @property
+    def destination(self):
+        """Return bucket and object name where the table file is stored"""
+        suffix = "".join(Path(self.file_url_info.path).suffixes)
+        return settings.MINIO_STORAGE_DATASETS_BUCKET_NAME, f"{self.table.dataset.slug}/{self.table.name}{suffix}"
+
+    @property
+    def destination_url(self):
+        bucket, dest_name = self.destination
+        return f"{settings.AWS_S3_ENDPOINT_URL}{bucket}/{dest_name}"
+
+    @staticmethod
+    def content_type(dest_name):
+        content_type, encoding = mimetypes.guess_type(dest_name)
+        if encoding == "gzip":
+            # quando é '.csv.gz' o retorno de guess_type é ('text/csv', 'gzip')
+            content_type = "application/gzip"
+        elif encoding is None:
+            content_type = "text/plain"
+        return content_type
+
     def finish_process(self):
         source = self.file_url_info.path  # /BUCKET_NAME/OBJ_PATH
-        suffix = "".join(Path(source).suffixes)
-        dest_name = f"{self.table.dataset.slug}/{self.table.name}{suffix}"
-        bucket = settings.MINIO_STORAGE_DATASETS_BUCKET_NAME
+        bucket, dest_name = self.destination
         is_same_file = source == f"/{bucket}/{dest_name}"
 
         if self.should_upload:
@@ -224,13 +809,7 @@ class UpdateTableFileCommand:
             progress = MinioProgress()
             self.log(f"Uploading file to bucket: {bucket}")
 
-            content_type, encoding = mimetypes.guess_type(dest_name)
-            if encoding == "gzip":
-                # quando é '.csv.gz' o retorno de guess_type é ('text/csv', 'gzip')
-                content_type = "application/gzip"
-            elif encoding is None:
-                content_type = "text/plain"
-
+            content_type = self.content_type(dest_name)
             self.minio.fput_object(
                 bucket, dest_name, self.output_file.name, progress=progress, content_type=content_type
             )
@@ -247,7 +826,7 @@ class UpdateTableFileCommand:
             self.log(f"Using {source} as the dataset file.", end="")
 
         os.remove(self.output_file.name)
-        return f"{settings.AWS_S3_ENDPOINT_URL}{bucket}/{dest_name}"
+        return self.destination_url
 
     @classmethod
     def execute(cls, dataset_slug, tablename, file_url, **options):
@@ -285,6 +864,228 @@ class UpdateTableFileCommand:
         print(msg, *args, **kwargs)
 
 
+def decompressor_factory(filename):
+    """Return a callable creating a decompressor for the file's extension (`None` if not compressed)"""
+    extension = Path(filename).suffix.lower()
+    if extension == ".gz":
+        return lambda: zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif extension == ".xz":
+        return lzma.LZMADecompressor
+    elif extension == ".bz2":
+        return bz2.BZ2Decompressor
+    return None
+
+
+class QueueStream:
+    """
+    Read-only file-like object for the byte chunks put in a queue by another thread
+
+    Chunks are decompressed if `decompressor_factory` is given (multi-member
+    gzip/xz/bz2 streams are supported).
+    """
+
+    END = None  # Last chunk of a stream
+    ABORTED = object()  # The producer failed, so the stream must not be taken as complete
+
+    def __init__(self, queue, decompressor_factory=None):
+        self.queue = queue
+        self.decompressor_factory = decompressor_factory
+        self.decompressor = decompressor_factory() if decompressor_factory is not None else None
+        self.buffer = bytearray()
+        self.finished = False
+
+    def _fill(self):
+        chunk = self.queue.get()
+        if chunk is self.END:
+            self.finished = True
+            return
+        elif chunk is self.ABORTED:
+            self.finished = True
+            raise RuntimeError("Stream aborted")
+        while chunk and self.decompressor is not None:
+            self.buffer += self.decompressor.decompress(chunk)
+            chunk = b""
+            if self.decompressor.eof:  # Another member may start in the same chunk
+                chunk = self.decompressor.unused_data
+                self.decompressor = self.decompressor_factory()
+        self.buffer += chunk
+
+    def read(self, size=-1):
+        while not self.finished and (size is None or size < 0 or len(self.buffer) < size):
+            self._fill()
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def peek(self, size):
+        while not self.finished and len(self.buffer) < size:
+            self._fill()
+        return bytes(self.buffer[:size])
+
+    def readline(self):
+        while not self.finished and b"\n" not in self.buffer:
+            self._fill()
+        position = self.buffer.find(b"\n")
+        return self.read(position + 1 if position >= 0 else len(self.buffer))
+
+    def drain(self):
+        """Consume the queue until the producer finishes (so it's never blocked)"""
+        while not self.finished:
+            chunk = self.queue.get()
+            self.finished = chunk is self.END or chunk is self.ABORTED
+
+
+class StreamImportCommand(ImportDataCommand):
+    """
+    Import a table file from its URL in a single pass
+
+    The HTTP response is hashed and, at the same time, uploaded to MinIO (when
+    it's not already there) and decompressed into COPY, each consumer in its
+    own thread, connected by bounded queues (so memory usage doesn't depend on
+    the file size). The `TableFile` and the new `DataTable` are then created in
+    the same transaction.
+
+    The file is uploaded to a temporary object and only copied over the
+    table's file after the data is imported and activated, so a failed import
+    never replaces the published file.
+    """
+
+    def __init__(self, table, file_url, **options):
+        super().__init__(table, **options)
+        self.file_command = UpdateTableFileCommand(table, file_url, delete_source=False)
+        self.file_command.log = self.log
+        _, dest_name = self.file_command.destination
+        self.upload_name = f"{dest_name}.{uuid.uuid4().hex}.importing"
+
+    @classmethod
+    def execute(cls, dataset_slug, tablename, file_url, **options):
+        table = Table.with_hidden.for_dataset(dataset_slug).named(tablename)
+        self = cls(table, file_url, **options)
+        try:
+            data_table, Model = self.load_data(file_url)
+            if self.flag_warmup:
+                self.warmup(Model)
+            with transaction.atomic():
+                table_file, created = self.file_command.create_table_file(self.file_command.destination_url)
+                cls.activate_data_tables([(self, data_table, Model)])
+                try:
+                    self.publish_file()
+                except Exception:  # The activation is rolled back
+                    data_table.delete_data_table()
+                    raise
+        finally:
+            self.remove_uploaded_file()
+        if self.flag_clear_view_cache:
+            self.clear_view_cache()
+            if self.flag_warmup:
+                self.warm_view_cache()
+        self.save_report(Model)
+        self.log(f"TableFile: https://{settings.APP_HOST}{table_file.admin_url}")
+        self.log(f"File hash: {table_file.sha512sum}")
+        self.log(f"File size: {table_file.readable_size}")
+
+    def import_data(self, filename, Model):
+        start_time = time.time()
+        queue_size = settings.IMPORT_STREAM_QUEUE_SIZE
+        decompress = decompressor_factory(urlparse(filename).path)
+        consumers = {"copy": QueueStream(Queue(maxsize=queue_size), decompress)}
+        if self.file_command.should_upload:
+            consumers["upload"] = QueueStream(Queue(maxsize=queue_size))
+        results, errors = {}, {}
+
+        def run(name, function, stream):
+            try:
+                results[name] = function(stream)
+            except Exception as exception:
+                errors[name] = exception
+                stream.drain()
+
+        threads = [Thread(target=run, args=("copy", partial(self.copy_stream, Model), consumers["copy"]))]
+        if "upload" in consumers:
+            threads.append(Thread(target=run, args=("upload", self.upload_stream, consumers["upload"])))
+        for thread in threads:
+            thread.start()
+
+        end_chunk = QueueStream.ABORTED
+        try:
+            for chunk in self.file_command.read_file_chunks(settings.IMPORT_STREAM_CHUNK_SIZE):
+                if errors:
+                    break
+                for stream in consumers.values():
+                    stream.queue.put(chunk)
+            else:
+                end_chunk = QueueStream.END
+        except Exception as exception:
+            errors["download"] = exception
+        finally:
+            for stream in consumers.values():
+                stream.queue.put(end_chunk)
+            for thread in threads:
+                thread.join()
+
+        if errors or end_chunk is QueueStream.ABORTED:
+            Model.delete_table()
+            for name, exception in errors.items():
+                self.log(f"ERROR ({name}): {exception}")
+            exit(1)
+        self.update_import_date()
+        duration = time.time() - start_time
+        rows_imported = self.rows_imported = results["copy"]
+        self.bytes_read = self.file_command.file_size
+        self.log(
+            "  done in {:7.3f}s ({} rows imported, {:.3f} rows/s).".format(
+                duration, rows_imported, rows_imported / duration if duration else 0
+            )
+        )
+
+    def copy_stream(self, Model, stream):
+        encoding = "utf-8"  # TODO: receive as a parameter
+        try:
+            dialect = rows.plugins.csv.discover_dialect(stream.peek(1024 * 1024), encoding)
+            file_header = next(csv.reader([stream.readline().decode(encoding)], dialect=dialect))
+            unknown = [field_name for field_name in file_header if field_name not in self.table.schema]
+            if unknown:
+                raise RuntimeError("unknown columns in file: {}".format(", ".join(unknown)))
+            with connection.cursor() as cursor:  # This thread's connection
+                cursor.copy_expert(copy_from_stdin_sql(Model.tablename(), file_header, dialect), stream)
+                return cursor.rowcount
+        finally:
+            connection.close()
+
+    def upload_stream(self, stream):
+        bucket, dest_name = self.file_command.destination
+        self.log(f"Uploading file to bucket: {bucket}")
+        # A failed read aborts the multipart upload
+        self.file_command.minio.put_object(
+            bucket,
+            self.upload_name,
+            stream,
+            length=-1,
+            part_size=settings.IMPORT_STREAM_UPLOAD_PART_SIZE,
+            content_type=self.file_command.content_type(dest_name),
+        )
+
+    def publish_file(self):
+        """Replace the table's file in MinIO with the imported one"""
+        if self.file_command.should_upload:
+            bucket, dest_name = self.file_command.destination
+            self.log(f"Copying uploaded file to {dest_name}")
+            self.file_command.minio.copy_object(bucket, dest_name, f"/{bucket}/{self.upload_name}")
+        else:  # Already in MinIO, copied to the destination if needed (without downloading it again)
+            self.file_command.finish_process()
+
+    def remove_uploaded_file(self):
+        if not self.file_command.should_upload:
+            return
+        bucket, _ = self.file_command.destination
+        try:
+            self.file_command.minio.remove_object(bucket, self.upload_name)
+        except Exception as exception:
+            self.log(f"Could not remove temporary file {self.upload_name}: {exception}")
+
+
 class UpdateTableFileListCommand:
     FileListInfo = namedtuple("FileListInfo", ("filename", "file_url", "readable_size", "sha512sum"))
 
@@ -0,0 +1,83 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+from core.models import Table, TableFile, get_table
+
+VALIDATORS_ATTR = "_conditional_validators"
+
+
+def table_last_modified(table):
+    """When the data of `table` last changed (import or activation of a new data table)"""
+    data_table = table.data_table
+    dates = [table.import_date, data_table.created_at if data_table is not None else None]
+    return max((date for date in dates if date is not None), default=None)
+
+
+def tables_validators(tables, extra=None, user=None):
+    """Return `(etag, last_modified)` for a response built from `tables`
+
+    The ETag changes when any table is imported, when `extra` (JSON-serializable)
+    changes and per user (pages have user-specific parts). Deploys that change
+    templates must change `settings.CONDITIONAL_RESPONSE_SALT`.
+    """
+    tables = list(tables)
+    if not tables:
+        return None, None
+    dates = [table_last_modified(table) for table in tables]
+    parts = [
+        settings.CONDITIONAL_RESPONSE_SALT,
+        [(table.id, table.data_table.id if table.data_table else None) for table in tables],
+        dates,
+        extra,
+        user.pk if user is not None and user.is_authenticated else None,
+    ]
+    etag = hashlib.md5(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+    return etag, max((date for date in dates if date is not None), default=None)
+
+
+def conditional_on_tables(get_tables, get_extra=None, vary_on_user=True):
+    """`condition` decorator with ETag/Last-Modified built from the tables a view reads
+
+    `get_tables` (and `get_extra`) receive the view's arguments. Requests with
+    matching validators get a 304 before the view runs; if the tables don't
+    exist no validators are used (so the view answers as usual).
+    """
+
+    def validators(request, *args, **kwargs):
+        if not hasattr(request, VALIDATORS_ATTR):  # Both functions below are called for each request
+            try:
+                tables = get_tables(request, *args, **kwargs)
+            except Table.DoesNotExist:
+                tables = []
+            extra = get_extra(request, *args, **kwargs) if get_extra is not None else None
+            user = request.user if vary_on_user else None
+            setattr(request, VALIDATORS_ATTR, tables_validators(tables, extra, user))
+        return getattr(request, VALIDATORS_ATTR)
+
+    return condition(
+        etag_func=lambda *args, **kwargs: validators(*args, **kwargs)[0],
+        last_modified_func=lambda *args, **kwargs: validators(*args, **kwargs)[1],
+    )
+
+
+def request_table(request, slug, tablename=""):
+    if not tablename:
+        return []
+    return [get_table(slug, tablename, allow_hidden=request.user.is_superuser)]
+
+
+def dataset_tables(request, slug):
+    return Table.objects.for_dataset(slug)
+
+
+def dataset_files_version(request, slug):
+    files = TableFile.objects.filter(table__dataset__slug=slug).aggregate(Max("id"), Max("created_at"))
+    return [files["id__max"], files["created_at__max"]]
+
+
+conditional_table_page = conditional_on_tables(request_table)
+conditional_dataset_files = conditional_on_tables(dataset_tables, get_extra=dataset_files_version)
@@ -1,7 +1,12 @@
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from textwrap import dedent
+from threading import RLock
 
 import django.contrib.postgres.indexes as pg_indexes
 import django.db.models.indexes as django_indexes
+from django.apps import apps
 from django.db import connection, models
 
 FIELD_TYPES = {
@@ -41,37 +46,15 @@ class DynamicModelMixin:
             cls._meta.indexes = model_indexes
 
     @classmethod
-    def create_indexes(cls):
-        with connection.cursor() as cursor:
-            for index in cls._meta.indexes:
-                index_class = type(index)
-                if index_class is django_indexes.Index:
-                    index_type = "btree"
-                elif index_class is pg_indexes.GinIndex:
-                    index_type = "gin"
-                else:
-                    raise ValueError("Cannot identify index type of {index}")
-
-                fieldnames = []
-                for fieldname in index.fields:
-                    if fieldname.startswith("-"):
-                        value = f"{fieldname[1:]} DESC"
-                    else:
-                        value = f"{fieldname} ASC"
-                    if index_type == "gin":
-                        value = value.split(" ")[0]
-                    fieldnames.append(value)
-
-                fieldnames = ",\n                            ".join(fieldnames)
-                query = dedent(
-                    f"""
-                    CREATE INDEX CONCURRENTLY IF NOT EXISTS {index.name}
-                        ON {cls.tablename()} USING {index_type} (
-                            {fieldnames}
-                        );
-                """
-                ).strip()
-                cursor.execute(query)
+    def create_indexes(cls, concurrently=True, workers=1, callback=None, **session_settings):
+        """Create all indexes declared in Meta, return a list of `(index, duration)`
+
+        See `ParallelIndexBuilder` for the parameters.
+        """
+        builder = ParallelIndexBuilder(
+            cls._meta.db_table, cls._meta.indexes, concurrently=concurrently, workers=workers, **session_settings
+        )
+        return builder.run(callback=callback)
 
     @classmethod
     def delete_table(cls):
@@ -79,6 +62,101 @@ class DynamicModelMixin:
             schema_editor.delete_model(cls)
 
 
+def index_sql(tablename, index, concurrently=True, where=None):
+    """`CREATE INDEX` statement for a Django `Index`/`GinIndex`
+
+    `where` is an optional SQL condition, used to create partial indexes.
+    """
+    index_class = type(index)
+    if index_class is django_indexes.Index:
+        index_type = "btree"
+    elif index_class is pg_indexes.GinIndex:
+        index_type = "gin"
+    else:
+        raise ValueError(f"Cannot identify index type of {index}")
+
+    fieldnames = []
+    for fieldname in index.fields:
+        if fieldname.startswith("-"):
+            value = f"{fieldname[1:]} DESC"
+        else:
+            value = f"{fieldname} ASC"
+        if index_type == "gin":
+            value = value.split(" ")[0]
+        fieldnames.append(value)
+
+    fieldnames = ",\n                    ".join(fieldnames)
+    concurrently = "CONCURRENTLY " if concurrently else ""
+    where = f"\n                WHERE {where}" if where else ""
+    return dedent(
+        f"""
+            CREATE INDEX {concurrently}IF NOT EXISTS {index.name}
+                ON {tablename} USING {index_type} (
+                    {fieldnames}
+                ){where};
+        """
+    ).strip()
+
+
+class ParallelIndexBuilder:
+    """
+    Create indexes for a table using `workers` database connections at once
+
+    Each index is built in a thread with its own connection (so the caller's
+    connection/session isn't changed), which is configured with
+    `maintenance_work_mem` (in MiB) and `max_parallel_maintenance_workers`, if
+    given. `CREATE INDEX CONCURRENTLY` on the same table conflicts with itself,
+    so concurrent builds always use one connection - the non-concurrent mode
+    is the fast one, to be used while the table is not being read/written by
+    other sessions (like before a new data table is activated).
+    """
+
+    def __init__(
+        self,
+        tablename,
+        indexes,
+        concurrently=True,
+        workers=1,
+        maintenance_work_mem=None,
+        max_parallel_maintenance_workers=None,
+    ):
+        self.tablename = tablename
+        self.indexes = list(indexes)
+        self.concurrently = concurrently
+        self.workers = 1 if concurrently else max(1, workers)
+        self.session_settings = []
+        if maintenance_work_mem:
+            self.session_settings.append(f"SET maintenance_work_mem = '{int(maintenance_work_mem)}MB'")
+        if max_parallel_maintenance_workers is not None:
+            self.session_settings.append(
+                f"SET max_parallel_maintenance_workers = {int(max_parallel_maintenance_workers)}"
+            )
+
+    def build_index(self, index):
+        start = time.time()
+        try:
+            with connection.cursor() as cursor:
+                for sql in self.session_settings:
+                    cursor.execute(sql)
+                cursor.execute(index_sql(self.tablename, index, concurrently=self.concurrently))
+        finally:
+            connection.close()  # This thread's connection
+        return index, time.time() - start
+
+    def run(self, callback=None):
+        # GIN indexes are the slowest ones to build, so they start first
+        indexes = sorted(self.indexes, key=lambda index: type(index) is not pg_indexes.GinIndex)
+        timings = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.build_index, index) for index in indexes]
+            for future in as_completed(futures):
+                index, duration = future.result()
+                timings.append((index, duration))
+                if callback is not None:
+                    callback(index, duration)
+        return timings
+
+
 def create_model_class(name, module, fields, mixins=None, meta=None, managers=None):
     """
     Create a Django Model class dynamically
@@ -127,6 +205,78 @@ def create_model_class(name, module, fields, mixins=None, meta=None, managers=No
     return Model
 
 
+def unregister_model(Model):
+    """Remove `Model` from Django's app registry (if it's the registered one)"""
+    app_label, model_name = Model._meta.app_label, Model._meta.model_name
+    app_models = apps.all_models[app_label]
+    if app_models.get(model_name) is Model:
+        del app_models[model_name]
+        apps.clear_cache()
+
+
+class DynamicModelRegistry:
+    """
+    LRU cache for dynamic model classes
+
+    Keeps at most `max_size` models (`None` means unlimited). Models evicted
+    or replaced are also unregistered from Django's app registry, so they can
+    be garbage collected.
+    """
+
+    def __init__(self, max_size=None):
+        self.max_size = max_size
+        self._models = OrderedDict()
+        self._lock = RLock()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, key):
+        return key in self._models
+
+    def get(self, key):
+        with self._lock:
+            Model = self._models.get(key)
+            if Model is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._models.move_to_end(key)
+            return Model
+
+    def set(self, key, Model):
+        with self._lock:
+            old_model = self._models.pop(key, None)
+            if old_model is not None and old_model is not Model:
+                unregister_model(old_model)
+            self._models[key] = Model
+            while self.max_size is not None and len(self._models) > self.max_size:
+                _, evicted_model = self._models.popitem(last=False)
+                unregister_model(evicted_model)
+                self.evictions += 1
+
+    def remove(self, key):
+        with self._lock:
+            Model = self._models.pop(key, None)
+            if Model is not None:
+                unregister_model(Model)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._models.keys()):
+                self.remove(key)
+
+    def stats(self):
+        return {
+            "size": len(self._models),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
 def model_source_code(Model):
     meta = Model._meta
     model_name = Model.__name__
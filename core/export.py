@@ -0,0 +1,230 @@
+import csv
+import io
+import threading
+from queue import Empty, Full, Queue
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Concat, Length, NullIf, Substr
+
+from core.templatetags.utils import obfuscate
+
+COPY_QUEUE_SIZE = 64  # Max number of COPY chunks held in memory per export
+# Field types whose PostgreSQL text output is the same as Python's `str` (see
+# `CopyCSVExporter.copy_expression`)
+COPY_FIELD_TYPES = {"bool", "date", "email", "integer", "string", "text"}
+TEXT_FIELD_TYPES = {"email", "string", "text"}
+PYTHON_EXPORT_CHUNK_SIZE = 2000
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def obfuscated_expression(field_name, length_alias):
+    """SQL version of `core.templatetags.utils.obfuscate`
+
+    `length_alias` must be an annotation with `Length(field_name)` (there's no
+    `__length` lookup on text fields).
+    """
+    return Case(
+        When(
+            **{length_alias: 11},
+            then=Concat(Value("***"), Substr(field_name, 4, 6), Value("**"), output_field=models.TextField()),
+        ),
+        default=F(field_name),
+        output_field=models.TextField(),
+    )
+
+
+def boolean_expression(field_name):
+    """Represent booleans as Python's `csv` module does ("True"/"False")"""
+    return Case(
+        When(**{field_name: True}, then=Value("True")),
+        When(**{field_name: False}, then=Value("False")),
+        default=Value(None),
+        output_field=models.TextField(),
+    )
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def crlf_line_endings(chunks):
+    """Convert the row terminators of COPY's CSV `chunks` to "\\r\\n" (as Python's `csv.excel` dialect writes)
+
+    Newlines inside quoted values are kept (quotes are escaped by doubling
+    them, so counting them is enough to know if a newline is inside a value).
+    """
+    quoted = False
+    for chunk in chunks:
+        parts = chunk.split(b'"')
+        for index, part in enumerate(parts):
+            if not quoted:
+                parts[index] = part.replace(b"\n", b"\r\n")
+            if index < len(parts) - 1:
+                quoted = not quoted
+        yield b'"'.join(parts)
+
+
+class CopyWriter:
+    """File-like object which receives COPY chunks and pushes them to a queue"""
+
+    def __init__(self, queue, cancelled):
+        self.queue = queue
+        self.cancelled = cancelled
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        while True:
+            if self.cancelled.is_set():
+                raise ExportCancelled()
+            try:
+                self.queue.put(data, timeout=1)
+            except Full:
+                continue
+            else:
+                return len(data)
+
+
+class CopyCSVExporter:
+    """
+    Export a dataset table queryset to CSV using PostgreSQL's `COPY TO`
+
+    The rows are selected and formatted (including obfuscation) by the
+    database and the CSV chunks are streamed directly to the HTTP response,
+    so no model instances are created. The `COPY` runs in a separate thread
+    (using the same database connection) and a bounded queue keeps the memory
+    usage constant.
+
+    The output is the same as `csv.writer` (`excel` dialect) with the Python
+    values: tables with fields whose text representation is different in
+    PostgreSQL (like datetimes, decimals and floats) are exported from
+    `values_list` rows instead.
+    """
+
+    def __init__(self, queryset, fields):
+        self.queryset = queryset
+        self.fields = [field for field in fields if field.show_on_frontend and field.name != "search_data"]
+
+    @property
+    def header(self):
+        return [field.name for field in self.fields]
+
+    @property
+    def use_copy(self):
+        return all(field.type in COPY_FIELD_TYPES for field in self.fields)
+
+    @staticmethod
+    def copy_expression(field):
+        """Expression formatting `field` as `str` does (`None` if the column can be used as is)"""
+        if field.obfuscate:
+            expression = obfuscated_expression(field.name, f"_length_{field.name}")
+        elif field.type == "bool":
+            return boolean_expression(field.name)
+        elif field.type in TEXT_FIELD_TYPES:
+            expression = F(field.name)
+        else:
+            return None
+        # COPY quotes empty strings (to tell them from NULLs) but `csv.writer` doesn't
+        return NullIf(expression, Value(""), output_field=models.TextField())
+
+    def get_select_queryset(self):
+        lengths = {f"_length_{field.name}": Length(field.name) for field in self.fields if field.obfuscate}
+        annotations, columns = {}, []
+        for field in self.fields:
+            expression = self.copy_expression(field)
+            if expression is not None:
+                alias = f"_export_{field.name}"
+                annotations[alias] = expression
+            else:
+                alias = field.name
+            columns.append(alias)
+        return self.queryset.annotate(**lengths).annotate(**annotations).values_list(*columns)
+
+    def get_copy_sql(self, cursor):
+        sql, params = self.get_select_queryset().query.sql_with_params()
+        select = cursor.mogrify(sql, params)
+        if isinstance(select, bytes):
+            select = select.decode(connection.connection.encoding or "utf-8")
+        return f"COPY ({select}) TO STDOUT WITH CSV"
+
+    def header_line(self):
+        fobj = io.StringIO()
+        csv.writer(fobj, dialect=csv.excel).writerow(self.header)
+        return fobj.getvalue().encode("utf-8")
+
+    def __iter__(self):
+        if self.use_copy:
+            yield self.header_line()
+            yield from crlf_line_endings(self.copy_chunks())
+        else:
+            yield from self.python_rows()
+
+    def python_rows(self):
+        writer = csv.writer(Echo(), dialect=csv.excel)
+        obfuscated = [index for index, field in enumerate(self.fields) if field.obfuscate]
+        yield self.header_line()
+        rows = self.queryset.values_list(*self.header).iterator(chunk_size=PYTHON_EXPORT_CHUNK_SIZE)
+        for row in rows:
+            if obfuscated:
+                row = list(row)
+                for index in obfuscated:
+                    row[index] = obfuscate(row[index])
+            yield writer.writerow(row).encode("utf-8")
+
+    def copy_chunks(self):
+        connection.ensure_connection()
+        cursor = connection.connection.cursor()
+        try:
+            copy_sql = self.get_copy_sql(cursor)
+        except EmptyResultSet:  # Query is known to return no rows (like `.none()`)
+            cursor.close()
+            return
+        queue, cancelled, finished = Queue(maxsize=COPY_QUEUE_SIZE), threading.Event(), object()
+        errors = []
+
+        def run_copy():
+            try:
+                cursor.copy_expert(copy_sql, CopyWriter(queue, cancelled))
+            except ExportCancelled:
+                pass
+            except Exception as exception:
+                errors.append(exception)
+            finally:
+                while not cancelled.is_set():
+                    try:
+                        queue.put(finished, timeout=1)
+                    except Full:
+                        continue
+                    else:
+                        break
+
+        thread = threading.Thread(target=run_copy, daemon=True)
+        completed = False
+        try:
+            thread.start()
+            while True:
+                try:
+                    chunk = queue.get(timeout=1)
+                except Empty:
+                    continue
+                if chunk is finished:
+                    break
+                yield chunk
+            if errors:
+                raise errors[0]
+            completed = True
+        finally:
+            cancelled.set()
+            if thread.is_alive():
+                thread.join()
+            cursor.close()
+            if not completed:
+                # An interrupted COPY leaves the connection in an unknown
+                # state, so it's safer to discard it.
+                connection.close()
@@ -59,7 +59,7 @@ class DatasetSearchForm(forms.Form):
 
 def get_table_dynamic_form(table, cache=True):
     def config_dynamic_filter(model_field):
-        dynamic_field = table.get_field(model_field.name)
+        dynamic_field = schema.get_field(model_field.name)
         kwargs = {"required": False, "label": dynamic_field.title}
         field_factory = model_field.formfield
 
@@ -72,6 +72,9 @@ def get_table_dynamic_form(table, cache=True):
 
         return field_factory(**kwargs)
 
+    # The model is rebuilt when the table's schema version changes (like after
+    # `fill_choices`), so the choices are always the current ones
     model = table.get_model(cache=cache)
+    schema = model.extra["schema"]
     fields = model.extra["filtering"]
     return forms.modelform_factory(model, fields=fields, formfield_callback=config_dynamic_filter)
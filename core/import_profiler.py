@@ -0,0 +1,133 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.utils import timezone
+
+
+class ImportProfiler:
+    """
+    Record wall/CPU time, rows and bytes per stage of an import
+
+    CPU time is the one spent by this process (the database server's work is
+    only seen in the wall time). The report also has the table and index
+    sizes, so runs with different schemas or settings can be compared (see
+    the `compare_import_reports` command).
+    """
+
+    def __init__(self, dataset_slug, tablename, options=None):
+        self.dataset_slug = dataset_slug
+        self.tablename = tablename
+        self.options = {key: value for key, value in (options or {}).items()}
+        self.started_at = timezone.now()
+        self._start = time.monotonic()
+        self.stages = []
+        self.indexes = []
+        self.sizes = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage - the yielded dict may be filled with `rows` and `bytes`"""
+        info = {"rows": None, "bytes": None}
+        start_wall, start_cpu = time.monotonic(), time.process_time()
+        try:
+            yield info
+        finally:
+            self.record(name, time.monotonic() - start_wall, time.process_time() - start_cpu, **info)
+
+    def record(self, name, wall_time, cpu_time=None, rows=None, bytes=None):
+        stage = {"name": name, "wall_time": round(wall_time, 6)}
+        if cpu_time is not None:
+            stage["cpu_time"] = round(cpu_time, 6)
+        if rows is not None:
+            stage["rows"] = rows
+            stage["rows_per_second"] = round(rows / wall_time, 3) if wall_time else None
+        if bytes is not None:
+            stage["bytes"] = bytes
+            stage["bytes_per_second"] = round(bytes / wall_time, 3) if wall_time else None
+        self.stages.append(stage)
+
+    def record_index(self, name, fields, wall_time):
+        """Index build times (they may run in parallel, inside the `indexes` stage)"""
+        self.indexes.append({"name": name, "fields": list(fields), "wall_time": round(wall_time, 6)})
+
+    def collect_sizes(self, db_table):
+        """Table, TOAST and index sizes (in bytes) of `db_table`"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_relation_size(%s), pg_total_relation_size(%s), pg_indexes_size(%s)",
+                [db_table, db_table, db_table],
+            )
+            table_size, total_size, indexes_size = cursor.fetchone()
+            cursor.execute(
+                "SELECT indexrelname, pg_relation_size(indexrelid) FROM pg_stat_user_indexes WHERE relname = %s",
+                [db_table],
+            )
+            indexes = dict(cursor.fetchall())
+        self.sizes = {
+            "table": table_size,
+            "total": total_size,
+            "indexes_total": indexes_size,
+            "indexes": indexes,
+        }
+
+    def report(self):
+        return {
+            "dataset": self.dataset_slug,
+            "table": self.tablename,
+            "started_at": self.started_at.isoformat(),
+            "options": self.options,
+            "stages": self.stages,
+            "indexes": self.indexes,
+            "total_wall_time": round(time.monotonic() - self._start, 6),
+            "sizes": self.sizes,
+        }
+
+    def save(self, filename):
+        with open(filename, mode="w", encoding="utf-8") as fobj:
+            json.dump(self.report(), fobj, indent=2, sort_keys=True, default=str)
+
+    def default_filename(self, directory):
+        timestamp = self.started_at.strftime("%Y%m%dT%H%M%S")
+        return os.path.join(directory, f"{self.dataset_slug}-{self.tablename}-{timestamp}.json")
+
+
+def compare_reports(old, new, threshold=0.1):
+    """Compare two import reports stage by stage
+
+    Return a list of dicts with `name`, the old and new values (wall time and
+    rows/s) and `regression` (`True` if the stage got slower by more than
+    `threshold`, like 0.1 for 10%).
+    """
+    old_stages = {stage["name"]: stage for stage in old["stages"]}
+    new_stages = {stage["name"]: stage for stage in new["stages"]}
+    names = [stage["name"] for stage in old["stages"]]
+    names += [name for name in new_stages if name not in old_stages]
+
+    result = []
+    for name in names + ["total"]:
+        if name == "total":
+            old_stage, new_stage = {"wall_time": old["total_wall_time"]}, {"wall_time": new["total_wall_time"]}
+        else:
+            old_stage, new_stage = old_stages.get(name, {}), new_stages.get(name, {})
+        old_time, new_time = old_stage.get("wall_time"), new_stage.get("wall_time")
+        old_rate, new_rate = old_stage.get("rows_per_second"), new_stage.get("rows_per_second")
+        change = (new_time - old_time) / old_time if old_time and new_time is not None else None
+        if old_rate and new_rate is not None:
+            regression = new_rate < old_rate * (1 - threshold)
+        else:
+            regression = change is not None and change > threshold
+        result.append(
+            {
+                "name": name,
+                "old_wall_time": old_time,
+                "new_wall_time": new_time,
+                "wall_time_change": change,
+                "old_rows_per_second": old_rate,
+                "new_rows_per_second": new_rate,
+                "regression": regression,
+            }
+        )
+    return result
@@ -1,9 +1,24 @@
 from django.core.cache import cache
 from django.core.management.base import BaseCommand
 
+from core.models import Table
+
 
 class Command(BaseCommand):
-    help = "Clear cache"
+    help = "Clear cache (only the entries of a dataset/table, if specified)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dataset-slug", required=False, action="store")
+        parser.add_argument("--tablename", required=False, action="store", help="Needs --dataset-slug")
 
     def handle(self, *args, **kwargs):
-        cache.clear()
+        dataset_slug, tablename = kwargs["dataset_slug"], kwargs["tablename"]
+        if not dataset_slug:
+            cache.clear()
+            return
+
+        tables = Table.with_hidden.for_dataset(dataset_slug)
+        if tablename:
+            tables = [tables.named(tablename)]
+        for table in tables:
+            table.invalidate_cache()
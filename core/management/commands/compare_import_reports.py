@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.import_profiler import compare_reports
+
+
+def format_number(value, template="{:.3f}"):
+    return template.format(value) if value is not None else "-"
+
+
+class Command(BaseCommand):
+    help = "Compare two import reports (saved by `import_data --report`) stage by stage"
+
+    def add_arguments(self, parser):
+        parser.add_argument("old_report")
+        parser.add_argument("new_report")
+        parser.add_argument(
+            "--threshold", type=float, default=0.1, help="Slowdown to be considered a regression (default: 0.1 = 10%%)"
+        )
+        parser.add_argument(
+            "--fail-on-regression", required=False, action="store_true", help="Exit with an error on regressions"
+        )
+
+    def handle(self, *args, **kwargs):
+        reports = []
+        for filename in (kwargs["old_report"], kwargs["new_report"]):
+            with open(filename, encoding="utf-8") as fobj:
+                reports.append(json.load(fobj))
+        old, new = reports
+
+        print(f"Old: {old['dataset']}.{old['table']} ({old['started_at']})")
+        print(f"New: {new['dataset']}.{new['table']} ({new['started_at']})")
+        header = ("stage", "old time (s)", "new time (s)", "change", "old rows/s", "new rows/s", "")
+        lines = [header]
+        comparison = compare_reports(old, new, threshold=kwargs["threshold"])
+        for stage in comparison:
+            change = stage["wall_time_change"]
+            lines.append(
+                (
+                    stage["name"],
+                    format_number(stage["old_wall_time"]),
+                    format_number(stage["new_wall_time"]),
+                    format_number(change * 100 if change is not None else None, "{:+.1f}%"),
+                    format_number(stage["old_rows_per_second"], "{:.1f}"),
+                    format_number(stage["new_rows_per_second"], "{:.1f}"),
+                    "REGRESSION" if stage["regression"] else "",
+                )
+            )
+        widths = [max(len(line[index]) for line in lines) for index in range(len(header))]
+        for line in lines:
+            print("  ".join(value.ljust(width) for value, width in zip(line, widths)).rstrip())
+
+        old_size, new_size = old.get("sizes", {}).get("total"), new.get("sizes", {}).get("total")
+        if old_size and new_size:
+            print(f"Total size: {old_size} -> {new_size} bytes ({(new_size - old_size) / old_size * 100:+.1f}%)")
+
+        regressions = [stage["name"] for stage in comparison if stage["regression"]]
+        if regressions and kwargs["fail_on_regression"]:
+            raise CommandError("Regressions found in: {}".format(", ".join(regressions)))
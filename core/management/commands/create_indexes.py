@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Table
+
+
+class Command(BaseCommand):
+    help = "Create missing indexes (like the ones configured in `Table.options`) for a table's active data table"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset_slug")
+        parser.add_argument("table_name")
+
+    def handle(self, *args, **kwargs):
+        dataset_slug = kwargs["dataset_slug"]
+        table_name = kwargs["table_name"]
+        table = Table.with_hidden.for_dataset(dataset_slug).named(table_name)
+        Model = table.get_model(cache=False)
+
+        for index in Model._meta.indexes:
+            print("  {} ({})".format(index.name, ", ".join(index.fields)))
+        print("Creating indexes...", end="", flush=True)
+        start = time.time()
+        Model.create_indexes()
+        end = time.time()
+        print("  done in {:.3f}s.".format(end - start))
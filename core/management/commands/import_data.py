@@ -2,7 +2,7 @@ from datetime import date
 
 from django.core.management.base import BaseCommand
 
-from core.commands import ImportDataCommand
+from core.commands import ImportDataCommand, IncrementalImportCommand
 
 
 class Command(BaseCommand):
@@ -19,7 +19,37 @@ class Command(BaseCommand):
         parser.add_argument("--no-clear-view-cache", required=False, action="store_true")
         parser.add_argument("--no-create-filter-indexes", required=False, action="store_true")
         parser.add_argument("--no-fill-choices", required=False, action="store_true")
+        parser.add_argument(
+            "--no-warmup",
+            required=False,
+            action="store_true",
+            help="Don't warm the new table and its cached pages up (using the most requested queries)",
+        )
         parser.add_argument("--delete-old-table", required=False, action="store_true")
+        parser.add_argument(
+            "--defer-search-data",
+            required=False,
+            action="store_true",
+            help="Compute search vectors in bulk after loading the data (faster for searchable tables)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            required=False,
+            help="Import in chunks of this number of rows, saving checkpoints (so it can be resumed)",
+        )
+        parser.add_argument(
+            "--resume", required=False, action="store_true", help="Resume the last failed chunked import of this file",
+        )
+        parser.add_argument(
+            "--incremental",
+            required=False,
+            action="store_true",
+            help="Apply only the changed rows to the active data table (needs the table's natural key)",
+        )
+        parser.add_argument(
+            "--report", required=False, action="store", help="Save the import's timing report (JSON) to this file",
+        )
         parser.add_argument(
             "--collect-date", required=False, action="store", help="collect date in format YYYY-MM-DD",
         )
@@ -44,14 +74,19 @@ class Command(BaseCommand):
         fill_choices = not kwargs["no_fill_choices"]
         delete_old_table = kwargs["delete_old_table"]
         collect_date = self.clean_collect_date(kwargs["collect_date"])
+        incremental = kwargs["incremental"]
 
         if ask_confirmation:
-            print("This operation will DESTROY the existing data for this " "dataset table.")
+            if incremental:
+                print("This operation will UPDATE the existing data for this dataset table.")
+            else:
+                print("This operation will DESTROY the existing data for this " "dataset table.")
             answer = input("Do you want to continue? (y/n) ")
             if answer.lower().strip() not in ("y", "yes"):
                 exit()
 
-        ImportDataCommand.execute(
+        command_class = IncrementalImportCommand if incremental else ImportDataCommand
+        command_class.execute(
             dataset_slug,
             tablename,
             filename,
@@ -60,7 +95,12 @@ class Command(BaseCommand):
             clear_view_cache=clear_view_cache,
             create_filter_indexes=create_filter_indexes,
             fill_choices=fill_choices,
+            warmup=not kwargs["no_warmup"],
             delete_old_table=delete_old_table,
             collect_date=collect_date,
             unlogged=unlogged,
+            defer_search_data=kwargs["defer_search_data"],
+            report_filename=kwargs["report"],
+            chunk_size=kwargs["chunk_size"],
+            resume=kwargs["resume"],
         )
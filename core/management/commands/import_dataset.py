@@ -0,0 +1,79 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from core.commands import ImportDatasetCommand
+
+
+class Command(BaseCommand):
+    help = "Import many tables of a dataset in parallel and activate them at once"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset_slug")
+        parser.add_argument("manifest", help="CSV file with `tablename` and `filename` columns")
+        parser.add_argument("--workers", type=int, default=2, help="Number of tables imported at the same time")
+        parser.add_argument(
+            "--memory-budget",
+            type=int,
+            required=False,
+            help="Memory (in MiB) to be split between workers for index creation (maintenance_work_mem)",
+        )
+        parser.add_argument("--unlogged", required=False, action="store_true")
+        parser.add_argument("--no-input", required=False, action="store_true")
+        parser.add_argument("--no-vacuum", required=False, action="store_true")
+        parser.add_argument("--no-clear-view-cache", required=False, action="store_true")
+        parser.add_argument("--no-create-filter-indexes", required=False, action="store_true")
+        parser.add_argument("--no-fill-choices", required=False, action="store_true")
+        parser.add_argument(
+            "--no-warmup",
+            required=False,
+            action="store_true",
+            help="Don't warm the new table and its cached pages up (using the most requested queries)",
+        )
+        parser.add_argument("--delete-old-table", required=False, action="store_true")
+        parser.add_argument(
+            "--defer-search-data",
+            required=False,
+            action="store_true",
+            help="Compute search vectors in bulk after loading the data (faster for searchable tables)",
+        )
+        parser.add_argument(
+            "--collect-date", required=False, action="store", help="collect date in format YYYY-MM-DD",
+        )
+
+    def clean_collect_date(self, collect_date):
+        if not collect_date:
+            return None
+
+        year, month, day = [int(v) for v in collect_date.split("-")]
+        return date(year, month, day)
+
+    def handle(self, *args, **kwargs):
+        dataset_slug = kwargs["dataset_slug"]
+        manifest = ImportDatasetCommand.read_manifest(kwargs["manifest"])
+        ask_confirmation = not kwargs["no_input"]
+
+        if ask_confirmation:
+            tablenames = ", ".join(tablename for tablename, _ in manifest)
+            print(f"This operation will DESTROY the existing data for these dataset tables: {tablenames}.")
+            answer = input("Do you want to continue? (y/n) ")
+            if answer.lower().strip() not in ("y", "yes"):
+                exit()
+
+        command = ImportDatasetCommand(
+            dataset_slug,
+            manifest,
+            workers=kwargs["workers"],
+            memory_budget=kwargs["memory_budget"],
+            import_data=True,
+            vacuum=not kwargs["no_vacuum"],
+            clear_view_cache=not kwargs["no_clear_view_cache"],
+            create_filter_indexes=not kwargs["no_create_filter_indexes"],
+            fill_choices=not kwargs["no_fill_choices"],
+            warmup=not kwargs["no_warmup"],
+            delete_old_table=kwargs["delete_old_table"],
+            collect_date=self.clean_collect_date(kwargs["collect_date"]),
+            unlogged=kwargs["unlogged"],
+            defer_search_data=kwargs["defer_search_data"],
+        )
+        command.execute()
@@ -0,0 +1,79 @@
+from datetime import date
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from core.commands import StreamImportCommand
+
+
+class Command(BaseCommand):
+    help = "Download, store (in MinIO) and import a table's data file in a single pass"
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset_slug")
+        parser.add_argument("tablename")
+        parser.add_argument("file_url")
+        parser.add_argument("--unlogged", required=False, action="store_true")
+        parser.add_argument("--no-input", required=False, action="store_true")
+        parser.add_argument("--no-vacuum", required=False, action="store_true")
+        parser.add_argument("--no-clear-view-cache", required=False, action="store_true")
+        parser.add_argument("--no-create-filter-indexes", required=False, action="store_true")
+        parser.add_argument("--no-fill-choices", required=False, action="store_true")
+        parser.add_argument(
+            "--no-warmup",
+            required=False,
+            action="store_true",
+            help="Don't warm the new table and its cached pages up (using the most requested queries)",
+        )
+        parser.add_argument("--delete-old-table", required=False, action="store_true")
+        parser.add_argument(
+            "--defer-search-data",
+            required=False,
+            action="store_true",
+            help="Compute search vectors in bulk after loading the data (faster for searchable tables)",
+        )
+        parser.add_argument(
+            "--update-list", required=False, action="store_true", help="update dataset _meta/list.html (default False)"
+        )
+        parser.add_argument(
+            "--report", required=False, action="store", help="Save the import's timing report (JSON) to this file",
+        )
+        parser.add_argument(
+            "--collect-date", required=False, action="store", help="collect date in format YYYY-MM-DD",
+        )
+
+    def clean_collect_date(self, collect_date):
+        if not collect_date:
+            return None
+
+        year, month, day = [int(v) for v in collect_date.split("-")]
+        return date(year, month, day)
+
+    def handle(self, *args, **kwargs):
+        dataset_slug = kwargs["dataset_slug"]
+        tablename = kwargs["tablename"]
+
+        if not kwargs["no_input"]:
+            print("This operation will DESTROY the existing data for this " "dataset table.")
+            answer = input("Do you want to continue? (y/n) ")
+            if answer.lower().strip() not in ("y", "yes"):
+                exit()
+
+        StreamImportCommand.execute(
+            dataset_slug,
+            tablename,
+            kwargs["file_url"],
+            import_data=True,
+            vacuum=not kwargs["no_vacuum"],
+            clear_view_cache=not kwargs["no_clear_view_cache"],
+            create_filter_indexes=not kwargs["no_create_filter_indexes"],
+            fill_choices=not kwargs["no_fill_choices"],
+            warmup=not kwargs["no_warmup"],
+            delete_old_table=kwargs["delete_old_table"],
+            collect_date=self.clean_collect_date(kwargs["collect_date"]),
+            unlogged=kwargs["unlogged"],
+            defer_search_data=kwargs["defer_search_data"],
+            report_filename=kwargs["report"],
+        )
+        if kwargs["update_list"]:
+            call_command("update_table_file_list", dataset_slug, collect_date=kwargs["collect_date"])
@@ -0,0 +1,145 @@
+import django.db.models.indexes as django_indexes
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.dynamic_models import index_sql
+from core.models import Table, make_index_name
+from core.query_log import aggregate_query_shapes, read_query_log
+
+
+def condition_sql(field_name, value):
+    column = connection.ops.quote_name(field_name)
+    if value is None:
+        return f"{column} IS NULL"
+    return f"{column} IS {'TRUE' if value else 'FALSE'}"
+
+
+class Command(BaseCommand):
+    help = "Propose (and optionally create) indexes for the query shapes sampled in the query log"
+
+    def add_arguments(self, parser):
+        parser.add_argument("log_filenames", nargs="*", help="Query log files (default: settings.QUERY_LOG_FILENAME)")
+        parser.add_argument("--dataset-slug", required=False, action="store")
+        parser.add_argument("--tablename", required=False, action="store")
+        parser.add_argument("--min-samples", type=int, default=5, help="Ignore shapes with fewer samples")
+        parser.add_argument("--create", action="store_true", help="Create proposed indexes (concurrently)")
+
+    def handle(self, *args, **kwargs):
+        filenames = kwargs["log_filenames"] or [settings.QUERY_LOG_FILENAME]
+        if not all(filenames):
+            raise CommandError("No query log file specified (set QUERY_LOG_FILENAME or pass file names)")
+
+        shapes_by_table = aggregate_query_shapes(read_query_log(filenames))
+        for (dataset_slug, tablename), shapes in sorted(shapes_by_table.items()):
+            if kwargs["dataset_slug"] and dataset_slug != kwargs["dataset_slug"]:
+                continue
+            elif kwargs["tablename"] and tablename != kwargs["tablename"]:
+                continue
+            try:
+                table = Table.with_hidden.for_dataset(dataset_slug).named(tablename)
+            except Table.DoesNotExist:
+                print(f"{dataset_slug}.{tablename}: table does not exist (skipping)")
+                continue
+
+            proposals = self.table_proposals(table, shapes, kwargs["min_samples"])
+            print(f"{dataset_slug}.{tablename}: {len(proposals)} index(es) proposed")
+            for proposal in proposals:
+                self.print_proposal(proposal)
+                if kwargs["create"]:
+                    print("    Creating...", end="", flush=True)
+                    with connection.cursor() as cursor:
+                        cursor.execute(proposal["sql"])
+                    print(" done.")
+
+    def table_proposals(self, table, shapes, min_samples):
+        Model = table.get_model()
+        schema = table.get_schema()
+        db_table = Model._meta.db_table
+        declared = [list(index.fields) for index in Model._meta.indexes if type(index) is django_indexes.Index]
+        existing = self.existing_indexes(db_table)
+        distinct_values = self.distinct_values(db_table)
+
+        proposals = {}
+        for (filters, conditions, ordering, search), stats in shapes.items():
+            if stats["samples"] < min_samples or search:
+                # Searches are served by the GIN index and ordered by rank
+                continue
+            conditions = dict(conditions)
+            equality = [name for name in filters if name not in conditions and name in schema.filtering]
+            # Same ordering rules as `DatasetTableModelQuerySet.apply_ordering`
+            allowed = set(schema.ordering) | set(schema.filtering)
+            ordering = [field for field in ordering if field.lstrip("-") in allowed] or list(schema.ordering)
+            if not equality and not conditions:
+                continue
+
+            equality.sort(key=lambda name: -distinct_values.get(name, 0))
+            fields = equality + [field for field in ordering if field.lstrip("-") not in equality]
+            if not fields:  # Only boolean/null filters and no ordering
+                fields = sorted(conditions)
+            leading = set(equality) | set(conditions)
+            if self.is_covered(declared, leading, fields[len(equality) :]):
+                continue
+
+            where = " AND ".join(condition_sql(name, value) for name, value in sorted(conditions.items()))
+            name_parts = fields + [f"{name}={value}" for name, value in sorted(conditions.items())]
+            index = django_indexes.Index(name=make_index_name(db_table, "advisor", name_parts), fields=fields)
+            proposal = proposals.get(index.name)
+            if proposal is None:
+                proposal = proposals[index.name] = {
+                    "fields": fields,
+                    "where": where,
+                    "sql": index_sql(db_table, index, concurrently=True, where=where or None),
+                    "exists": index.name in existing,
+                    "requests": 0.0,
+                    "total_duration": 0.0,
+                    "max_page": 0,
+                }
+            proposal["requests"] += stats["requests"]
+            proposal["total_duration"] += stats["total_duration"]
+            proposal["max_page"] = max(proposal["max_page"], stats["max_page"])
+
+        return sorted(
+            (proposal for proposal in proposals.values() if not proposal["exists"]),
+            key=lambda proposal: proposal["total_duration"],
+            reverse=True,
+        )
+
+    @staticmethod
+    def is_covered(declared, leading, ordering):
+        """Check if some declared index starts with `leading` (any order) followed by `ordering`"""
+        size = len(leading)
+        for fields in declared:
+            if set(fields[:size]) == leading and fields[size : size + len(ordering)] == list(ordering):
+                return True
+        return False
+
+    @staticmethod
+    def existing_indexes(db_table):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = %s", [db_table])
+            return {row[0] for row in cursor.fetchall()}
+
+    @staticmethod
+    def distinct_values(db_table):
+        """Estimated number of distinct values per column (from the planner's statistics)"""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples FROM pg_class WHERE relname = %s", [db_table])
+            row = cursor.fetchone()
+            total = max(row[0], 0) if row else 0
+            cursor.execute("SELECT attname, n_distinct FROM pg_stats WHERE tablename = %s", [db_table])
+            # Negative values are a fraction of the number of rows
+            return {name: value if value >= 0 else -value * total for name, value in cursor.fetchall()}
+
+    @staticmethod
+    def print_proposal(proposal):
+        requests, duration = proposal["requests"], proposal["total_duration"]
+        average = duration / requests if requests else 0
+        where = f" WHERE {proposal['where']}" if proposal["where"] else ""
+        print(f"  - ({', '.join(proposal['fields'])}){where}")
+        print(
+            f"    Estimated benefit: up to {duration:.1f}s of query time in ~{requests:.0f} requests "
+            f"(avg. {average:.3f}s, max. page {proposal['max_page']})"
+        )
+        for line in proposal["sql"].splitlines():
+            print(f"    {line}")
@@ -1,9 +1,12 @@
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 from django.core.management.base import BaseCommand
+from django.db import connection
 from django.db.utils import ProgrammingError
 
-from core.models import Dataset, Field, Table
+from core.choices import update_table_choices
+from core.models import Dataset, Table
 
 
 class Command(BaseCommand):
@@ -12,10 +15,32 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument("--dataset-slug", required=False, action="store")
         parser.add_argument("--tablename", required=False, action="store")
+        parser.add_argument("--workers", type=int, default=1, help="Number of tables processed at the same time")
+        parser.add_argument(
+            "--max-values",
+            type=int,
+            required=False,
+            help="Don't fill choices for fields with more distinct values (default: settings.CHOICES_MAX_VALUES)",
+        )
+
+    def update_table(self, table, max_values):
+        start = time.time()
+        try:
+            choices = update_table_choices(table, max_values=max_values)
+        except ProgrammingError:
+            return table, None, "ERROR: model does not exist."
+        finally:
+            connection.close()  # This thread's connection
+        skipped = sorted(name for name, values in choices.items() if values is None)
+        message = "{} field(s) done in {:7.3f}s.".format(len(choices), time.time() - start)
+        if skipped:
+            message += " Too many values (not filled): {}".format(", ".join(skipped))
+        return table, choices, message
 
     def handle(self, *args, **kwargs):
         dataset_slug = kwargs["dataset_slug"]
         tablename = kwargs["tablename"]
+        max_values = kwargs["max_values"]
 
         datasets = Dataset.objects.all()
         if dataset_slug:
@@ -28,25 +53,11 @@ class Command(BaseCommand):
             tables = Table.with_hidden.for_dataset(dataset)
             if tablename:
                 tables = [tables.named(tablename)]
-            for table in tables:
-                print("  {}".format(table.name))
-                start_table = time.time()
-
-                choiceables = Field.objects.for_table(table).choiceables()
-                for field in choiceables:
-                    start = time.time()
-                    print("    {}... ".format(field.name), end="", flush=True)
-                    try:
-                        field.update_choices()
-                        field.save()
-                    except ProgrammingError:
-                        print("ERROR: model does not exist.")
-                    else:
-                        end = time.time()
-                        print("done in {:7.3f}s.".format(end - start))
-
-                end_table = time.time()
-                print("    table done in {:7.3f}s.".format(end_table - start_table))
+            # Each table's choices are extracted in one scan - tables run in parallel
+            with ThreadPoolExecutor(max_workers=max(1, kwargs["workers"])) as executor:
+                results = executor.map(lambda table: self.update_table(table, max_values), list(tables))
+                for table, choices, message in results:
+                    print("  {}: {}".format(table.name, message))
 
             end_dataset = time.time()
             print("  dataset done in {:7.3f}s.".format(end_dataset - start_dataset))
@@ -1,11 +1,16 @@
+import copy
 import functools
 
 import rest_framework
-from django.middleware.cache import FetchFromCacheMiddleware
+from django.middleware.cache import FetchFromCacheMiddleware, UpdateCacheMiddleware
 from django.urls import resolve
 from django.urls.base import get_urlconf
 
+from core.caching import dataset_tag, table_tag, tagged_key_prefix
+
 DISABLE_CACHE_ATTR = "_disable_non_logged_user_cache"
+CACHE_TAGS_ATTR = "_cache_tags"
+CACHE_KEY_PREFIX_ATTR = "_cache_key_prefix"
 
 
 def disable_non_logged_user_cache(func):
@@ -19,6 +24,34 @@ def disable_non_logged_user_cache(func):
     return wrapper
 
 
+def cache_tags(*tags):
+    """Tag the cached pages of a view (when they can't be found from its URL, see `page_cache_tags`)"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return func(*args, **kwargs)
+
+        setattr(wrapper, CACHE_TAGS_ATTR, tags)
+        return wrapper
+
+    return decorator
+
+
+def page_cache_tags(req_info):
+    """Cache tags of a page: the ones set by `cache_tags` or its dataset/table (from the URL)"""
+    tags = getattr(req_info.func, CACHE_TAGS_ATTR, None)
+    if tags is not None:
+        return list(tags)
+
+    slug, tablename = req_info.kwargs.get("slug"), req_info.kwargs.get("tablename")
+    if slug and tablename:
+        return [table_tag(slug, tablename)]
+    elif slug:
+        return [dataset_tag(slug)]
+    return []
+
+
 class NotLoggedUserFetchFromCacheMiddleware(FetchFromCacheMiddleware):
     def process_request(self, request):
         """
@@ -27,7 +60,15 @@ class NotLoggedUserFetchFromCacheMiddleware(FetchFromCacheMiddleware):
         """
 
         if not self.should_skip_cache(request):
-            return super().process_request(request)
+            # Pages are stored with their tags' versions in the key prefix, so
+            # invalidating a tag makes only its pages miss (see `core.caching`).
+            # The middleware is shared by all requests, so a copy is used.
+            req_info = resolve(request.path, urlconf=get_urlconf())
+            key_prefix = tagged_key_prefix(self.key_prefix, page_cache_tags(req_info))
+            setattr(request, CACHE_KEY_PREFIX_ATTR, key_prefix)
+            fetcher = copy.copy(self)
+            fetcher.key_prefix = key_prefix
+            return FetchFromCacheMiddleware.process_request(fetcher, request)
 
     def should_skip_cache(self, request):
         req_info = resolve(request.path, urlconf=get_urlconf())
@@ -48,3 +89,16 @@ class NotLoggedUserFetchFromCacheMiddleware(FetchFromCacheMiddleware):
             return True
 
         return False
+
+
+class TaggedUpdateCacheMiddleware(UpdateCacheMiddleware):
+    """Store pages with the key prefix (including cache tags) chosen by `NotLoggedUserFetchFromCacheMiddleware`"""
+
+    def process_response(self, request, response):
+        key_prefix = getattr(request, CACHE_KEY_PREFIX_ATTR, None)
+        if key_prefix is None:  # Cache was skipped
+            return super().process_response(request, response)
+
+        updater = copy.copy(self)
+        updater.key_prefix = key_prefix
+        return UpdateCacheMiddleware.process_response(updater, request, response)
@@ -0,0 +1,32 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0029_auto_20201206_2132"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataTableImport",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("filename", models.TextField()),
+                ("rows_total", models.BigIntegerField(default=0)),
+                ("rows_inserted", models.BigIntegerField(default=0)),
+                ("rows_updated", models.BigIntegerField(default=0)),
+                ("rows_deleted", models.BigIntegerField(default=0)),
+                ("duration", models.FloatField(blank=True, null=True)),
+                (
+                    "data_table",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="imports", to="core.datatable"
+                    ),
+                ),
+            ],
+            options={"ordering": ["-created_at"]},
+        ),
+    ]
@@ -1,7 +1,9 @@
 import hashlib
+import json
 import random
 import string
-from collections import OrderedDict, namedtuple
+from collections import namedtuple
+from functools import lru_cache
 from textwrap import dedent
 from urllib.parse import urlparse
 
@@ -14,18 +16,27 @@ from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
 from django.db import connection, models, transaction
 from django.db.models import F
-from django.db.models.signals import post_delete, pre_delete
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.db.utils import ProgrammingError
 from django.urls import reverse
 from markdownx.models import MarkdownxField
-from rows import fields as rows_fields
 
 from core import dynamic_models
+from core.caching import (
+    count_cache_key,
+    dataset_tag,
+    get_cached_count,
+    invalidate_table_counts,
+    invalidate_tags,
+    set_cached_count,
+    table_tag,
+)
 from core.filters import DynamicModelFilterProcessor
+from core.schema import TABLE_SCHEMA_REGISTRY, TableSchema, invalidate_table_schemas
 from utils.classes import subclasses
 from utils.file_info import human_readable_size
 
-DYNAMIC_MODEL_REGISTRY = {}
+DYNAMIC_MODEL_REGISTRY = dynamic_models.DynamicModelRegistry(max_size=settings.DYNAMIC_MODEL_REGISTRY_MAX_SIZE)
 
 
 def make_index_name(tablename, index_type, fields):
@@ -67,28 +78,82 @@ class DatasetTableModelMixin:
         with connection.cursor() as cursor:
             cursor.execute(query)
 
+    @classmethod
+    def id_range(cls):
+        """Return `(min_id, max_id)` (both are `None` if the table is empty)"""
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT MIN(id), MAX(id) FROM {cls.tablename()}")
+            return cursor.fetchone()
+
+    @classmethod
+    def update_search_data(cls, start_id, end_id):
+        """Fill `search_data` for rows with `start_id <= id < end_id`, as the trigger would
+
+        Used to compute the search vectors in bulk after loading a table without
+        the trigger (see `create_triggers`). Return the number of updated rows.
+        """
+        columns = ", ".join(connection.ops.quote_name(name) for name in cls.extra["search"])
+        query = dedent(
+            f"""
+            UPDATE {cls.tablename()}
+            SET search_data = to_tsvector('pg_catalog.portuguese', concat_ws(' ', {columns}))
+            WHERE id >= %s AND id < %s
+        """
+        ).strip()
+        with connection.cursor() as cursor:
+            cursor.execute(query, [start_id, end_id])
+            return cursor.rowcount
+
+
+def search_terms(search_query):
+    return sorted(set(word for word in (search_query or "").split() if word))
+
+
+@lru_cache(maxsize=1024)
+def build_search_query(words, config):
+    """Combine (AND) one `SearchQuery` per word (`words` must be a tuple)"""
+    query = None
+    for word in words:
+        if query is None:
+            query = SearchQuery(word, config=config)
+        else:
+            query = query & SearchQuery(word, config=config)
+    return query
+
 
 class DatasetTableModelQuerySet(models.QuerySet):
     def search(self, search_query):
         qs = self
         search_fields = self.model.extra["search"]
         if search_query and search_fields:
-            words = search_query.split()
+            words = tuple(search_terms(search_query))
             config = "pg_catalog.portuguese"  # TODO: get from self.model.extra
-            query = None
-            for word in set(words):
-                if not word:
-                    continue
-                if query is None:
-                    query = SearchQuery(word, config=config)
-                else:
-                    query = query & SearchQuery(word, config=config)
-            qs = qs.annotate(search_rank=SearchRank(F("search_data"), query)).filter(search_data=query)
+            query = build_search_query(words, config)
+            limit = settings.SEARCH_CANDIDATES_LIMIT
+            if limit:
+                # Rank only a bounded set of candidates (found using the GIN
+                # index) instead of all matching rows, so common terms don't
+                # need to rank millions of rows. One extra candidate is
+                # counted (but not returned) so we know if the limit was
+                # reached.
+                candidates = qs.filter(search_data=query).order_by().values("id")
+                qs = qs.filter(id__in=candidates[:limit])
+                qs._search_limit = limit
+                qs._search_candidates = candidates[: limit + 1]
+            else:
+                qs = qs.filter(search_data=query)
+            qs = qs.annotate(search_rank=SearchRank(F("search_data"), query))
             # Using `qs.query.add_ordering` will APPEND ordering fields instead
             # of OVERWRITTING (as in `qs.order_by`).
             qs.query.add_ordering("-search_rank")
         return qs
 
+    @property
+    def search_limit_reached(self):
+        """`True` if the search matched more rows than the candidates limit"""
+        limit = getattr(self, "_search_limit", None)
+        return limit is not None and self._search_candidates.count() > limit
+
     def apply_filters(self, filtering):
         # TODO: filtering must be based on field's settings, not on models
         # settings.
@@ -115,17 +180,69 @@ class DatasetTableModelQuerySet(models.QuerySet):
 
     def composed_query(self, filter_query=None, search_query=None, order_by=None):
         qs = self
-        if search_query:
-            qs = qs.search(search_query)
+        # Filters are applied first so the search candidates (if limited)
+        # are collected only from the filtered rows.
         if filter_query:
             qs = qs.apply_filters(filter_query)
-        return qs.apply_ordering(order_by or [])
+        if search_query:
+            qs = qs.search(search_query)
+        qs = qs.apply_ordering(order_by or [])
+
+        # Only counts for queries composed from the user's input are cached
+        # (and may be estimated), so other `.count()` calls stay exact.
+        filters = DynamicModelFilterProcessor(filter_query or {}, self.model.extra["filtering"]).filters
+        terms = search_terms(search_query) if self.model.extra["search"] else []
+        qs._count_cache_key = count_cache_key(self.model._meta.db_table, filters, terms)
+        return qs
+
+    def select_columns(self, *field_names):
+        """`values_list()` which keeps the cached count of composed queries"""
+        qs = self.values_list(*field_names)
+        qs._count_cache_key = getattr(self, "_count_cache_key", None)
+        qs._search_limit = getattr(self, "_search_limit", None)
+        qs._search_candidates = getattr(self, "_search_candidates", None)
+        return qs
+
+    def estimate_count(self):
+        """Return the number of rows the query planner expects this query to return"""
+        sql, params = self.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    def cached_count(self, cache_key):
+        cached = get_cached_count(cache_key)
+        if cached is not None:
+            return cached
+
+        value, approximate = None, False
+        threshold = settings.COUNT_ESTIMATE_THRESHOLD
+        if threshold:
+            try:
+                estimate = self.estimate_count()
+            except Exception:
+                estimate = None
+            if estimate is not None and estimate > threshold:
+                value, approximate = estimate, True
+        if value is None:
+            value = super().count()
+        set_cached_count(cache_key, value, approximate)
+        return value, approximate
+
+    @property
+    def count_is_approximate(self):
+        self.count()
+        return self._count_is_approximate
 
     def count(self):
         if getattr(self, "_count", None) is not None:
             return self._count
 
         query = self.query
+        self._count_is_approximate = False
         if not query.where:  # TODO: check groupby etc.
             try:
                 with connection.cursor() as cursor:
@@ -135,6 +252,8 @@ class DatasetTableModelQuerySet(models.QuerySet):
                     self._count = int(cursor.fetchone()[0])
             except Exception:
                 self._count = super().count()
+        elif getattr(self, "_count_cache_key", None) is not None:
+            self._count, self._count_is_approximate = self.cached_count(self._count_cache_key)
         else:
             self._count = super().count()
 
@@ -318,7 +437,7 @@ class Table(models.Model):
 
     @property
     def filtering(self):
-        return [f.name for f in self.fields.frontend_filters()]
+        return list(self.get_schema().filtering)
 
     @property
     def collect_date(self):
@@ -326,7 +445,7 @@ class Table(models.Model):
 
     @property
     def data_table(self):
-        return self.data_tables.get_current_active()
+        return self.get_schema().data_table
 
     @property
     def db_table(self):
@@ -334,11 +453,11 @@ class Table(models.Model):
 
     @property
     def fields(self):
-        return self.field_set.all()
+        return self.get_schema().fields
 
     @property
     def search(self):
-        return [f.name for f in self.fields.searchable()]
+        return list(self.get_schema().search)
 
     @property
     def enabled(self):
@@ -346,25 +465,14 @@ class Table(models.Model):
 
     @property
     def schema(self):
-        db_fields_to_rows_fields = {
-            "binary": rows_fields.BinaryField,
-            "bool": rows_fields.BoolField,
-            "date": rows_fields.DateField,
-            "datetime": rows_fields.DatetimeField,
-            "decimal": rows_fields.DecimalField,
-            "email": rows_fields.EmailField,
-            "float": rows_fields.FloatField,
-            "integer": rows_fields.IntegerField,
-            "json": rows_fields.JSONField,
-            "string": rows_fields.TextField,
-            "text": rows_fields.TextField,
-        }
-        return OrderedDict(
-            [
-                (n, db_fields_to_rows_fields.get(t, rows_fields.Field))
-                for n, t in self.fields.values_list("name", "type")
-            ]
-        )
+        return self.get_schema().schema
+
+    def get_schema(self, cache=True):
+        schema = TABLE_SCHEMA_REGISTRY.get(self.id) if cache else None
+        if schema is None:
+            schema = TableSchema.from_table(self, version=TABLE_SCHEMA_REGISTRY.version())
+            TABLE_SCHEMA_REGISTRY.set(schema)
+        return schema
 
     @property
     def model_name(self):
@@ -390,41 +498,84 @@ class Table(models.Model):
         return custom_mixins + mixins
 
     def get_field(self, name):
-        return self.fields.get(name=name)
+        field = self.get_schema().get_field(name)
+        if field is None:
+            raise Field.DoesNotExist(f"Field {repr(name)} not found for table {self}")
+        return field
 
-    def get_model(self, cache=True, data_table=None):
-        # TODO: the current dynamic model registry is handled by Brasil.IO's
-        # code but it needs to be delegated to dynamic_models.
+    def get_natural_key(self, schema=None):
+        """Return the field names which identify a row (used by incremental imports)
+
+        Configured in `Table.options` (the fields must not have null values):
+            {"natural_key": ["state", "date"]}
+        """
+        schema = schema or self.get_schema()
+        natural_key = list(schema.options.get("natural_key") or [])
+        for name in natural_key:
+            if schema.get_field(name) is None:
+                raise Field.DoesNotExist(f"Natural key field {repr(name)} not found for table {self}")
+        return natural_key
+
+    def get_composite_index_filters(self, schema=None):
+        """Return the filter fields which must be indexed together with the ordering
+
+        Configured in `Table.options`, as a list of filter field names or
+        `true` (for all of them):
+            {"indexes": {"filter_with_ordering": ["state", "city"]}}
+        """
+        schema = schema or self.get_schema()
+        if not schema.ordering:
+            return set()
+        config = (schema.options.get("indexes") or {}).get("filter_with_ordering") or []
+        if config is True:
+            config = schema.filtering
+        return set(config) & set(schema.filtering)
 
-        data_table = data_table or self.data_table
+    def get_model(self, cache=True, data_table=None):
+        schema = self.get_schema(cache=cache)
+        data_table = data_table or schema.data_table
         db_table = data_table.db_table_name
 
-        # TODO: limit the max number of items in DYNAMIC_MODEL_REGISTRY
         cache_key = (self.id, db_table)
-        if cache and cache_key in DYNAMIC_MODEL_REGISTRY:
-            return DYNAMIC_MODEL_REGISTRY[cache_key]
-
-        # TODO: unregister the model in Django if already registered (cache_key
-        # in DYNAMIC_MODEL_REGISTRY and not cache)
-        fields = {field.name: field.field_class for field in self.fields}
+        if cache:
+            Model = DYNAMIC_MODEL_REGISTRY.get(cache_key)
+            # Field changes (like `obfuscate`, `show` or choices) must rebuild the
+            # model and everything cached on it (like the API row encoder)
+            if Model is not None and Model.extra["schema"].version == schema.version:
+                return Model
+
+        fields = {field.name: field.field_class for field in schema.fields}
         fields["search_data"] = SearchVectorField(null=True)
-        ordering = self.ordering or []
-        filtering = self.filtering or []
-        search = self.search or []
+        ordering = list(schema.ordering)
+        filtering = list(schema.filtering)
+        search = list(schema.search)
         indexes = []
 
         if ordering and ordering != ["id"]:
             indexes.append(django_indexes.Index(name=make_index_name(db_table, "order", ordering), fields=ordering,))
         if filtering:
+            composite_filters = self.get_composite_index_filters(schema)
             for field_name in filtering:
                 if ordering and field_name == ordering[0]:
                     # This index is not needed, since it's covered by compound
                     # index from `ordering`. More info at:
                     # <https://github.com/gregnavis/active_record_doctor#removing-extraneous-indexes>
                     continue
-                indexes.append(
-                    django_indexes.Index(name=make_index_name(db_table, "filter", [field_name]), fields=[field_name])
-                )
+                elif field_name in composite_filters:
+                    # Filtered pages can be read already sorted from this index
+                    # (it also covers the single-column filter index).
+                    index_fields = [field_name] + [field for field in ordering if field.lstrip("-") != field_name]
+                    indexes.append(
+                        django_indexes.Index(
+                            name=make_index_name(db_table, "composite", index_fields), fields=index_fields
+                        )
+                    )
+                else:
+                    indexes.append(
+                        django_indexes.Index(
+                            name=make_index_name(db_table, "filter", [field_name]), fields=[field_name]
+                        )
+                    )
         if search:
             indexes.append(
                 pg_indexes.GinIndex(name=make_index_name(db_table, "search", ["search_data"]), fields=["search_data"])
@@ -441,17 +592,24 @@ class Table(models.Model):
             "filtering": filtering,
             "ordering": ordering,
             "search": search,
+            "schema": schema,
             "table": self,
         }
-        DYNAMIC_MODEL_REGISTRY[cache_key] = Model
+        DYNAMIC_MODEL_REGISTRY.set(cache_key, Model)  # Replaces (and unregisters) any previous model
         return Model
 
     def get_model_declaration(self):
         Model = self.get_model()
         return dynamic_models.model_source_code(Model)
 
+    @property
+    def cache_tags(self):
+        """Tags of the cache entries which depend on this table's data (see `core.caching`)"""
+        return [dataset_tag(self.dataset.slug), table_tag(self.dataset.slug, self.name)]
+
     def invalidate_cache(self):
         invalidate(self.db_table)
+        invalidate_tags(*self.cache_tags)
 
 
 class DynamicTableConfig:
@@ -607,11 +765,12 @@ class DataTable(models.Model):
 
     def activate(self, drop_inactive_table=False):
         with transaction.atomic():
-            prev_data_table = self.table.data_table
+            prev_data_table = self.table.data_tables.get_current_active()
             if prev_data_table:
                 prev_data_table.deactivate(drop_table=drop_inactive_table)
             self.active = True
             self.save()
+        invalidate_table_counts(self.db_table_name)
 
     def deactivate(self, drop_table=False, activate_most_recent=False):
         with transaction.atomic():
@@ -632,6 +791,7 @@ class DataTable(models.Model):
             Model.delete_table()
         except ProgrammingError:  # model does not exist
             pass
+        DYNAMIC_MODEL_REGISTRY.remove((self.table.id, self.db_table_name))
 
 
 def prevent_active_data_table_deletion(sender, instance, **kwargs):
@@ -644,8 +804,70 @@ def clean_associated_data_base_table(sender, instance, **kwargs):
     instance.delete_data_table()
 
 
+def invalidate_field_table_cache(sender, instance, **kwargs):
+    # Cached pages/API responses may show a field which is now hidden or obfuscated
+    invalidate_tags(*instance.table.cache_tags)
+
+
 pre_delete.connect(prevent_active_data_table_deletion, sender=DataTable)
 post_delete.connect(clean_associated_data_base_table, sender=DataTable)
+post_save.connect(invalidate_table_schemas, sender=Table)
+post_delete.connect(invalidate_table_schemas, sender=Table)
+post_save.connect(invalidate_table_schemas, sender=Field)
+post_delete.connect(invalidate_table_schemas, sender=Field)
+post_save.connect(invalidate_field_table_cache, sender=Field)
+post_save.connect(invalidate_table_schemas, sender=DataTable)
+post_delete.connect(invalidate_table_schemas, sender=DataTable)
+
+
+class DataTableImport(models.Model):
+    """Statistics of an incremental import into a data table"""
+
+    data_table = models.ForeignKey(DataTable, related_name="imports", on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    filename = models.TextField()
+    rows_total = models.BigIntegerField(default=0)
+    rows_inserted = models.BigIntegerField(default=0)
+    rows_updated = models.BigIntegerField(default=0)
+    rows_deleted = models.BigIntegerField(default=0)
+    duration = models.FloatField(null=True, blank=True)  # seconds
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"DataTableImport: {self.data_table.db_table_name} ({self.created_at})"
+
+    @property
+    def rows_unchanged(self):
+        return self.rows_total - self.rows_inserted - self.rows_updated
+
+
+class ImportCheckpointQuerySet(models.QuerySet):
+    def resumable(self, table, filename):
+        """Return the most recent unfinished checkpoint for this table and file (or `None`)"""
+        return (
+            self.filter(data_table__table=table, data_table__active=False, filename=filename, finished=False)
+            .order_by("-updated_at")
+            .first()
+        )
+
+
+class ImportCheckpoint(models.Model):
+    """Progress of a chunked import into a new data table, used to resume it"""
+
+    objects = ImportCheckpointQuerySet.as_manager()
+
+    data_table = models.OneToOneField(DataTable, related_name="import_checkpoint", on_delete=models.CASCADE)
+    filename = models.TextField()
+    offset = models.BigIntegerField(default=0)  # bytes read from the decompressed file
+    rows_imported = models.BigIntegerField(default=0)
+    finished = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"ImportCheckpoint: {self.data_table.db_table_name} ({self.rows_imported} rows)"
 
 
 class TableFileQuerySet(models.QuerySet):
@@ -0,0 +1,92 @@
+import json
+import random
+from collections import defaultdict
+from threading import Lock
+
+from django.conf import settings
+from django.utils import timezone
+
+_write_lock = Lock()
+
+
+def query_shape(table, filters, search_query, ordering, page=None, cursor=False, source=None):
+    """Normalized description of a dataset table query
+
+    Filter values are only recorded for boolean/null filters (they may lead to
+    partial indexes); other values and search terms are user input and are
+    never logged.
+    """
+
+    conditions = {
+        key: value for key, value in filters.items() if isinstance(value, bool) or value is None or value == "None"
+    }
+    return {
+        "dataset": table.dataset.slug,
+        "table": table.name,
+        "filters": sorted(filters.keys()),
+        "conditions": {key: None if value == "None" else value for key, value in sorted(conditions.items())},
+        "ordering": list(ordering or []),
+        "search": bool(search_query),
+        "page": page,
+        "cursor": cursor,
+        "source": source,
+    }
+
+
+def should_sample():
+    rate = settings.QUERY_LOG_SAMPLE_RATE
+    return bool(settings.QUERY_LOG_FILENAME) and rate > 0 and random.random() < rate
+
+
+def log_query_shape(shape, duration):
+    record = dict(shape)
+    record["duration"] = round(duration, 6)
+    record["sample_rate"] = settings.QUERY_LOG_SAMPLE_RATE
+    record["logged_at"] = timezone.now().isoformat()
+    line = json.dumps(record, sort_keys=True, default=str) + "\n"
+    # Small appends are atomic, so many workers can share the same file
+    try:
+        with _write_lock, open(settings.QUERY_LOG_FILENAME, mode="a", encoding="utf-8") as fobj:
+            fobj.write(line)
+    except OSError:  # Logging must never break the request
+        pass
+
+
+def read_query_log(filenames):
+    for filename in filenames:
+        with open(filename, encoding="utf-8") as fobj:
+            for line in fobj:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:  # Truncated line
+                    continue
+
+
+def aggregate_query_shapes(records):
+    """Group log records by table and query shape
+
+    Return `{(dataset, table): {shape_key: stats}}`, where the number of
+    requests and the total duration are extrapolated using the sample rate.
+    """
+
+    result = defaultdict(dict)
+    for record in records:
+        key = (
+            tuple(record["filters"]),
+            tuple(sorted((record.get("conditions") or {}).items(), key=lambda item: item[0])),
+            tuple(record["ordering"]),
+            record["search"],
+        )
+        weight = 1 / (record.get("sample_rate") or 1)
+        table_shapes = result[(record["dataset"], record["table"])]
+        stats = table_shapes.get(key)
+        if stats is None:
+            stats = table_shapes[key] = {"samples": 0, "requests": 0.0, "total_duration": 0.0, "max_page": 0}
+        stats["samples"] += 1
+        stats["requests"] += weight
+        stats["total_duration"] += record["duration"] * weight
+        stats["max_page"] = max(stats["max_page"], record.get("page") or 0)
+    return result
@@ -0,0 +1,137 @@
+import time
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from types import MappingProxyType
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rows import fields as rows_fields
+
+DB_FIELDS_TO_ROWS_FIELDS = {
+    "binary": rows_fields.BinaryField,
+    "bool": rows_fields.BoolField,
+    "date": rows_fields.DateField,
+    "datetime": rows_fields.DatetimeField,
+    "decimal": rows_fields.DecimalField,
+    "email": rows_fields.EmailField,
+    "float": rows_fields.FloatField,
+    "integer": rows_fields.IntegerField,
+    "json": rows_fields.JSONField,
+    "string": rows_fields.TextField,
+    "text": rows_fields.TextField,
+}
+SCHEMA_VERSION_KEY = "table-schema-version"
+
+
+class TableSchema(
+    namedtuple(
+        "TableSchema",
+        (
+            "table_id",
+            "data_table",
+            "fields",
+            "fields_by_name",
+            "filtering",
+            "search",
+            "ordering",
+            "options",
+            "obfuscate",
+            "rows_schema",
+            "version",
+        ),
+    )
+):
+    """
+    Immutable snapshot of a `Table`'s configuration (fields and active DataTable)
+
+    Built with two queries and reused by every call site which needs the
+    table's fields during a request (model creation, forms, API serializers
+    etc.). The `Field` instances must be treated as read-only.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_table(cls, table, version=None):
+        fields = tuple(table.field_set.all())
+        return cls(
+            table_id=table.id,
+            data_table=table.data_tables.get_current_active(),
+            fields=fields,
+            fields_by_name=MappingProxyType({field.name: field for field in fields}),
+            filtering=tuple(field.name for field in fields if field.frontend_filter),
+            search=tuple(field.name for field in fields if field.searchable),
+            ordering=tuple(table.ordering or []),
+            options=MappingProxyType(dict(table.options or {})),
+            obfuscate=frozenset(field.name for field in fields if field.obfuscate),
+            rows_schema=tuple(
+                (field.name, DB_FIELDS_TO_ROWS_FIELDS.get(field.type, rows_fields.Field)) for field in fields
+            ),
+            version=version,
+        )
+
+    @property
+    def schema(self):
+        return OrderedDict(self.rows_schema)
+
+    def get_field(self, name):
+        return self.fields_by_name.get(name)
+
+
+class TableSchemaRegistry:
+    """
+    Per-process cache of `TableSchema` objects
+
+    Snapshots are stamped with a version composed of a local counter (bumped
+    as soon as this process changes some table configuration) and a global
+    one, stored in Django's cache, so changes made by other processes (like
+    `update_data` or `import_data`) are noticed in at most
+    `settings.TABLE_SCHEMA_CHECK_INTERVAL` seconds.
+    """
+
+    def __init__(self):
+        self._schemas = {}
+        self._lock = Lock()
+        self._local_version = 0
+        self._global_version = None
+        self._global_checked_at = 0
+
+    def version(self):
+        now = time.monotonic()
+        if self._global_version is None or now - self._global_checked_at >= settings.TABLE_SCHEMA_CHECK_INTERVAL:
+            self._global_version = cache.get(SCHEMA_VERSION_KEY, 0)
+            self._global_checked_at = now
+        return (self._local_version, self._global_version)
+
+    def get(self, table_id):
+        schema = self._schemas.get(table_id)
+        if schema is not None and schema.version == self.version():
+            return schema
+        return None
+
+    def set(self, schema):
+        self._schemas[schema.table_id] = schema
+
+    def invalidate(self):
+        with self._lock:
+            self._local_version += 1
+            self._schemas = {}
+        # Other processes must only rebuild their snapshots after the change
+        # is visible to them
+        transaction.on_commit(self._bump_global_version)
+
+    def _bump_global_version(self):
+        try:
+            cache.incr(SCHEMA_VERSION_KEY)
+        except ValueError:  # Key does not exist (or the backend can't increment)
+            cache.set(SCHEMA_VERSION_KEY, 1, None)
+        self._global_version = None
+
+
+TABLE_SCHEMA_REGISTRY = TableSchemaRegistry()
+
+
+def invalidate_table_schemas(*args, **kwargs):
+    """Invalidate all `TableSchema` snapshots (can be used as a signal receiver)"""
+    TABLE_SCHEMA_REGISTRY.invalidate()
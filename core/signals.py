@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Sent (with `table`) when the rows of a table's active data table are changed
+# in place, like by incremental imports (new data tables send `DataTable`'s
+# `post_save` when activated)
+table_data_updated = Signal()
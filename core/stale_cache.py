@@ -0,0 +1,106 @@
+import time
+from contextvars import ContextVar
+from functools import update_wrapper, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import add_never_cache_headers
+
+from core.caching import make_cache_key, tagged_key_prefix
+from core.tasks import refresh_stale_cache_task
+
+# Set when a stale value is returned (see `uncacheable_if_stale`)
+served_stale = ContextVar("served_stale", default=False)
+
+
+class StaleWhileRevalidate:
+    """
+    Cache a function's results, refreshing them in the background
+
+    After `soft_ttl` seconds (or when one of `tags` is invalidated, see
+    `core.caching`) the cached value is still returned, but one RQ job
+    (deduplicated by a lock per entry) computes it again. Only the first call
+    of each set of arguments (before the cache is primed, see `refresh`) or
+    calls after `hard_ttl` run the function synchronously. Arguments must be
+    JSON-serializable and the results picklable. Views returning values from
+    before an invalidation must use `uncacheable_if_stale`.
+    """
+
+    def __init__(self, func, tags=(), soft_ttl=None, hard_ttl=None):
+        update_wrapper(self, func)
+        self.func = func
+        self.path = f"{func.__module__}.{func.__qualname__}"
+        self.tags = list(tags)
+        self.soft_ttl = soft_ttl if soft_ttl is not None else settings.STALE_CACHE_SOFT_TTL
+        self.hard_ttl = hard_ttl if hard_ttl is not None else settings.STALE_CACHE_HARD_TTL
+
+    def key(self, args):
+        return make_cache_key("stale-cache", self.path, list(args))
+
+    def lock_key(self, args):
+        return f"{self.key(args)}:refreshing"
+
+    def version(self):
+        return tagged_key_prefix("stale-cache", self.tags)
+
+    def __call__(self, *args):
+        entry = cache.get(self.key(args))
+        if entry is None:
+            return self.refresh(*args)
+        elif entry["version"] != self.version():  # Data changed: the value is outdated
+            served_stale.set(True)
+            self.enqueue_refresh(args)
+        elif entry["refresh_at"] <= time.time():
+            self.enqueue_refresh(args)
+        return entry["value"]
+
+    def refresh(self, *args):
+        """Compute and cache the value (also used to prime the cache)"""
+        version = self.version()  # Before computing, so invalidations during it aren't lost
+        value = self.func(*args)
+        entry = {"value": value, "refresh_at": time.time() + self.soft_ttl, "version": version}
+        cache.set(self.key(args), entry, self.hard_ttl)
+        return value
+
+    def enqueue_refresh(self, args):
+        if cache.add(self.lock_key(args), True, settings.STALE_CACHE_LOCK_TIMEOUT):
+            refresh_stale_cache_task.delay(self.path, list(args))
+
+    def release_lock(self, args):
+        cache.delete(self.lock_key(args))
+
+
+def stale_while_revalidate(tags=(), soft_ttl=None, hard_ttl=None):
+    """Decorator version of `StaleWhileRevalidate` (must be used in module-level functions)"""
+
+    def decorator(func):
+        return StaleWhileRevalidate(func, tags=tags, soft_ttl=soft_ttl, hard_ttl=hard_ttl)
+
+    return decorator
+
+
+def uncacheable_if_stale(view):
+    """Don't let clients/caches store a response built with outdated values
+
+    The view's validators (like the ones from `core.conditional`) describe the
+    current data, so a response with a value computed before an import can't
+    have them: it would be revalidated (and stored by the cache middleware) as
+    if it was up to date. Must be above the decorators which add validators.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = served_stale.set(False)
+        try:
+            response = view(request, *args, **kwargs)
+            stale = served_stale.get()
+        finally:
+            served_stale.reset(token)
+        if stale:
+            for header in ("ETag", "Last-Modified"):
+                if response.has_header(header):
+                    del response[header]
+            add_never_cache_headers(response)
+        return response
+
+    return wrapper
@@ -0,0 +1,21 @@
+from django.utils.module_loading import import_string
+from django_rq import job
+
+from core.models import Table
+from core.warmup import CacheWarmer
+
+
+@job
+def warm_view_cache_task(dataset_slug, tablename, urls):
+    table = Table.with_hidden.for_dataset(dataset_slug).named(tablename)
+    statuses = CacheWarmer(table).fill_caches(urls)
+    print(f"Warmed {len(statuses)} page(s) of {dataset_slug}.{tablename} up: {statuses}")
+
+
+@job
+def refresh_stale_cache_task(path, args):
+    cached_function = import_string(path)  # A `core.stale_cache.StaleWhileRevalidate`
+    try:
+        cached_function.refresh(*args)
+    finally:
+        cached_function.release_lock(args)
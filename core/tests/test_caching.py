@@ -0,0 +1,51 @@
+from unittest.mock import Mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core.caching import count_cache_key, dataset_tag, invalidate_tags, table_tag, tagged_key_prefix
+from core.middlewares import cache_tags, page_cache_tags
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "tags"}}
+
+
+class CountCacheKeyTests(SimpleTestCase):
+    def test_key_does_not_depend_on_filters_or_search_terms_order(self):
+        key_1 = count_cache_key("data_table", {"uf": "SP", "city": "Campinas"}, ["silva", "maria"])
+        key_2 = count_cache_key("data_table", {"city": "Campinas", "uf": "SP"}, ["maria", "silva", "maria"])
+        assert key_1 == key_2
+
+    def test_key_depends_on_table_filters_and_search_terms(self):
+        key = count_cache_key("data_table", {"uf": "SP"}, ["silva"])
+        assert key != count_cache_key("data_other", {"uf": "SP"}, ["silva"])
+        assert key != count_cache_key("data_table", {"uf": "RJ"}, ["silva"])
+        assert key != count_cache_key("data_table", {"uf": "SP"}, ["souza"])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CacheTagsTests(SimpleTestCase):
+    def test_prefix_changes_only_for_invalidated_tags(self):
+        caso, obito = table_tag("covid19", "caso"), table_tag("covid19", "obito")
+        caso_prefix = tagged_key_prefix("page", [caso])
+        obito_prefix = tagged_key_prefix("page", [obito])
+        assert caso_prefix == tagged_key_prefix("page", [caso])
+        assert caso_prefix != obito_prefix
+
+        invalidate_tags(caso)
+
+        assert caso_prefix != tagged_key_prefix("page", [caso])
+        assert obito_prefix == tagged_key_prefix("page", [obito])
+
+    def test_prefix_without_tags(self):
+        assert "page" == tagged_key_prefix("page", [])
+
+    def test_page_cache_tags(self):
+        def view(request):
+            pass
+
+        assert [table_tag("sample", "data")] == page_cache_tags(
+            Mock(func=view, kwargs={"slug": "sample", "tablename": "data"})
+        )
+        assert [dataset_tag("sample")] == page_cache_tags(Mock(func=view, kwargs={"slug": "sample"}))
+        assert [] == page_cache_tags(Mock(func=view, kwargs={}))
+        tagged_view = cache_tags(dataset_tag("covid19"))(view)
+        assert [dataset_tag("covid19")] == page_cache_tags(Mock(func=tagged_view, kwargs={}))
@@ -0,0 +1,45 @@
+from model_bakery import baker
+
+from core.choices import ChoicesExtractor, update_table_choices
+from core.models import Field
+from core.tests.utils import BaseTestCaseWithSampleDataset
+
+
+class ChoicesExtractorTests(BaseTestCaseWithSampleDataset):
+    DATASET_SLUG = "sample"
+    TABLE_NAME = "sample_table"
+    FIELDS_KWARGS = [
+        {"name": "uf", "options": {"max_length": 2}, "type": "text", "null": True, "filtering": True, "choices": {}},
+        {"name": "city", "options": {"max_length": 50}, "type": "text", "null": False, "filtering": True},
+        {"name": "code", "type": "integer", "null": False, "filtering": True, "choices": {}},
+    ]
+
+    def setUp(self):
+        baker.make(self.TableModel, uf="SP", city="Santos", code=3)
+        baker.make(self.TableModel, uf="RJ", city="Niterói", code=1)
+        baker.make(self.TableModel, uf="SP", city="Campinas", code=2)
+        baker.make(self.TableModel, uf=None, city="Campinas", code=2)
+
+    def test_extract_all_fields_in_one_query(self):
+        extractor = ChoicesExtractor(self.TableModel, ["uf", "city", "code"], max_values=0)
+
+        with self.assertNumQueries(1):
+            choices = extractor.extract()
+
+        assert {
+            "uf": ["RJ", "SP", "None"],
+            "city": ["Campinas", "Niterói", "Santos"],
+            "code": ["1", "2", "3"],
+        } == choices
+
+    def test_skip_fields_with_too_many_values(self):
+        choices = ChoicesExtractor(self.TableModel, ["uf", "city"], max_values=2).extract()
+
+        assert {"uf": None, "city": None} == choices
+        assert {"code": ["1", "2", "3"]} == ChoicesExtractor(self.TableModel, ["code"], max_values=3).extract()
+
+    def test_update_table_choices(self):
+        update_table_choices(self.table, max_values=3)
+
+        assert {"data": ["RJ", "SP", "None"]} == Field.objects.get(table=self.table, name="uf").choices
+        assert {"data": ["1", "2", "3"]} == Field.objects.get(table=self.table, name="code").choices
@@ -0,0 +1,162 @@
+import gzip
+import io
+from queue import Queue
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from model_bakery import baker
+
+from core.commands import (
+    IncrementalImportCommand,
+    QueueStream,
+    StreamImportCommand,
+    csv_chunks,
+    decompressor_factory,
+)
+from core.models import DataTable
+from core.tests.utils import BaseTestCaseWithSampleDataset
+
+
+class IncrementalImportCommandTests(BaseTestCaseWithSampleDataset):
+    DATASET_SLUG = "sample"
+    TABLE_NAME = "sample_table"
+    FIELDS_KWARGS = [
+        {"name": "state", "options": {"max_length": 2}, "type": "text", "null": False},
+        {"name": "city", "options": {"max_length": 50}, "type": "text", "null": False},
+        {"name": "cases", "type": "integer", "null": True},
+    ]
+
+    def setUp(self):
+        staging_data_table = DataTable.new_data_table(self.table)
+        staging_data_table.db_table_name += "_staging"
+        self.StagingModel = self.table.get_model(cache=False, data_table=staging_data_table)
+        self.StagingModel.create_table(indexes=False)
+        self.addCleanup(staging_data_table.delete_data_table)
+        self.command = IncrementalImportCommand(
+            self.table,
+            import_data=True,
+            vacuum=False,
+            clear_view_cache=False,
+            create_filter_indexes=False,
+            fill_choices=False,
+            delete_old_table=False,
+            collect_date=None,
+            unlogged=False,
+            batch_size=2,
+        )
+        self.command.log = lambda *args, **kwargs: None
+
+    def test_apply_changes(self):
+        kept = baker.make(self.TableModel, state="PR", city="Curitiba", cases=10)
+        changed = baker.make(self.TableModel, state="SP", city="Santos", cases=1)
+        baker.make(self.TableModel, state="RJ", city="Niterói", cases=5)
+        baker.make(self.StagingModel, state="PR", city="Curitiba", cases=10)
+        baker.make(self.StagingModel, state="SP", city="Santos", cases=None)
+        baker.make(self.StagingModel, state="SP", city="Campinas", cases=3)
+        baker.make(self.StagingModel, state="BA", city="Salvador", cases=7)
+
+        stats = self.command.apply_changes(self.TableModel, self.StagingModel, ["state", "city"])
+
+        assert {"inserted": 2, "updated": 1, "deleted": 1} == stats
+        rows = {(row.state, row.city): (row.id, row.cases) for row in self.TableModel.objects.all()}
+        assert {
+            ("PR", "Curitiba"): (kept.id, 10),
+            ("SP", "Santos"): (changed.id, None),
+            ("SP", "Campinas"): (rows[("SP", "Campinas")][0], 3),
+            ("BA", "Salvador"): (rows[("BA", "Salvador")][0], 7),
+        } == rows
+
+    def test_natural_key_must_be_unique(self):
+        baker.make(self.StagingModel, state="PR", city="Curitiba", _quantity=2)
+
+        with self.assertRaises(RuntimeError):
+            self.command.check_natural_key(self.StagingModel, ["state", "city"])
+
+
+class CsvChunksTests(SimpleTestCase):
+    def test_chunks_end_on_record_boundaries(self):
+        fobj = io.BytesIO(b'1,"multi\nline"\n\n2,b\n3,"quoted ""value"""\n')
+
+        chunks = list(csv_chunks(fobj, chunk_size=2))
+
+        assert [
+            (b'1,"multi\nline"\n2,b\n', 2, 20),
+            (b'3,"quoted ""value"""\n', 1, 21),
+        ] == chunks
+        assert fobj.tell() == sum(size for _, _, size in chunks)
+
+
+class QueueStreamTests(SimpleTestCase):
+    def make_stream(self, chunks, filename="data.csv"):
+        queue = Queue()
+        for chunk in chunks:
+            queue.put(chunk)
+        queue.put(None)
+        return QueueStream(queue, decompressor_factory(filename))
+
+    def test_read_lines_and_blocks(self):
+        stream = self.make_stream([b"a,b\n1,", b"2\n3,4\n"])
+
+        assert b"a,b\n1," == stream.peek(6)
+        assert b"a,b\n" == stream.readline()
+        assert b"1,2\n" == stream.read(4)
+        assert b"3,4\n" == stream.read()
+        assert b"" == stream.read(10)
+
+    def test_decompress_multi_member_gzip(self):
+        compressed = gzip.compress(b"a,b\n1,2\n") + gzip.compress(b"3,4\n")
+        stream = self.make_stream([compressed[:10], compressed[10:]], filename="data.csv.gz")
+
+        assert b"a,b\n1,2\n3,4\n" == stream.read()
+
+    def test_aborted_stream_raises(self):
+        queue = Queue()
+        queue.put(b"a,b\n")
+        queue.put(QueueStream.ABORTED)
+        stream = QueueStream(queue)
+
+        with self.assertRaises(RuntimeError):
+            stream.read()
+
+
+@patch("core.commands.Minio")
+class StreamImportCommandTests(BaseTestCaseWithSampleDataset):
+    DATASET_SLUG = "sample"
+    TABLE_NAME = "sample_table"
+    FIELDS_KWARGS = [
+        {"name": "name", "options": {"max_length": 50}, "type": "text", "null": False},
+    ]
+    FILE_URL = "https://example.com/sample_table.csv.gz"
+    OPTIONS = {
+        "import_data": True,
+        "vacuum": False,
+        "clear_view_cache": False,
+        "create_filter_indexes": False,
+        "fill_choices": False,
+        "delete_old_table": False,
+        "collect_date": None,
+        "unlogged": False,
+        "warmup": False,
+    }
+
+    def test_failed_import_does_not_replace_published_file(self, mocked_minio):
+        with patch.object(StreamImportCommand, "load_data", side_effect=RuntimeError("COPY failed")):
+            with self.assertRaises(RuntimeError):
+                StreamImportCommand.execute(self.DATASET_SLUG, self.TABLE_NAME, self.FILE_URL, **self.OPTIONS)
+
+        minio = mocked_minio.return_value
+        minio.copy_object.assert_not_called()
+        bucket, upload_name = minio.remove_object.call_args[0]
+        assert upload_name.startswith("sample/sample_table.csv.gz.")
+        assert upload_name.endswith(".importing")
+
+    def test_uploaded_file_is_published_after_activation(self, mocked_minio):
+        command = StreamImportCommand(self.table, self.FILE_URL, **self.OPTIONS)
+        command.log = lambda *args, **kwargs: None
+
+        command.publish_file()
+
+        bucket, dest_name = command.file_command.destination
+        mocked_minio.return_value.copy_object.assert_called_once_with(
+            bucket, "sample/sample_table.csv.gz", f"/{bucket}/{command.upload_name}"
+        )
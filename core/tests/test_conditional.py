@@ -0,0 +1,35 @@
+import datetime
+from unittest.mock import Mock
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from core.conditional import table_last_modified, tables_validators
+
+
+class TablesValidatorsTests(SimpleTestCase):
+    def make_table(self, table_id, data_table_id, import_date, created_at):
+        return Mock(id=table_id, import_date=import_date, data_table=Mock(id=data_table_id, created_at=created_at))
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.table = self.make_table(1, 10, self.now, self.now - datetime.timedelta(hours=1))
+
+    def test_last_modified_is_the_newest_date(self):
+        assert self.now == table_last_modified(self.table)
+        self.table.import_date = None
+        assert self.now - datetime.timedelta(hours=1) == table_last_modified(self.table)
+
+    def test_etag_changes_with_data_table_extra_and_user(self):
+        etag, last_modified = tables_validators([self.table])
+        assert self.now == last_modified
+        assert etag == tables_validators([self.table])[0]
+
+        assert etag != tables_validators([self.table], extra={"id__max": 2})[0]
+        assert etag != tables_validators([self.table], user=Mock(pk=1, is_authenticated=True))[0]
+        assert etag == tables_validators([self.table], user=Mock(pk=None, is_authenticated=False))[0]
+        new_table = self.make_table(1, 11, self.now, self.now)
+        assert etag != tables_validators([new_table])[0]
+
+    def test_no_validators_without_tables(self):
+        assert (None, None) == tables_validators([])
@@ -0,0 +1,65 @@
+from django.apps import apps
+from django.db import models
+from django.test import SimpleTestCase
+
+from core.dynamic_models import DynamicModelRegistry, ParallelIndexBuilder, create_model_class
+
+
+def make_model(name):
+    return create_model_class(name=name, module="core.models", fields={"name": models.TextField()})
+
+
+class DynamicModelRegistryTests(SimpleTestCase):
+    def test_hits_and_misses(self):
+        registry = DynamicModelRegistry(max_size=2)
+        Model = make_model("RegistryHitModel")
+
+        assert registry.get("key") is None
+        registry.set("key", Model)
+        assert registry.get("key") is Model
+
+        assert {"size": 1, "max_size": 2, "hits": 1, "misses": 1, "evictions": 0} == registry.stats()
+
+    def test_evict_least_recently_used_and_unregister_from_django(self):
+        registry = DynamicModelRegistry(max_size=2)
+        Model1, Model2, Model3 = [make_model(f"RegistryLRUModel{i}") for i in range(1, 4)]
+        registry.set(1, Model1)
+        registry.set(2, Model2)
+        registry.get(1)  # Model2 is now the least recently used
+
+        registry.set(3, Model3)
+
+        assert 1 in registry and 3 in registry
+        assert 2 not in registry
+        assert 1 == registry.stats()["evictions"]
+        assert "registrylrumodel2" not in apps.all_models["core"]
+        assert apps.all_models["core"]["registrylrumodel3"] is Model3
+        registry.clear()
+        assert "registrylrumodel1" not in apps.all_models["core"]
+
+    def test_remove_unregisters_model(self):
+        registry = DynamicModelRegistry()
+        Model = make_model("RegistryReplacedModel")
+        registry.set("key", Model)
+        assert apps.all_models["core"]["registryreplacedmodel"] is Model
+
+        registry.remove("key")
+
+        assert "registryreplacedmodel" not in apps.all_models["core"]
+
+
+class ParallelIndexBuilderTests(SimpleTestCase):
+    def test_session_settings(self):
+        builder = ParallelIndexBuilder(
+            "data_table", [], concurrently=False, maintenance_work_mem=512, max_parallel_maintenance_workers=2
+        )
+        assert [
+            "SET maintenance_work_mem = '512MB'",
+            "SET max_parallel_maintenance_workers = 2",
+        ] == builder.session_settings
+        assert [] == ParallelIndexBuilder("data_table", []).session_settings
+
+    def test_concurrent_builds_use_one_connection(self):
+        # `CREATE INDEX CONCURRENTLY` on the same table lock each other
+        assert 1 == ParallelIndexBuilder("data_table", [], concurrently=True, workers=4).workers
+        assert 4 == ParallelIndexBuilder("data_table", [], concurrently=False, workers=4).workers
@@ -0,0 +1,136 @@
+import csv
+import datetime
+from decimal import Decimal
+
+from core.export import CopyCSVExporter, Echo
+from core.templatetags.utils import obfuscate
+from core.tests.utils import BaseTestCaseWithSampleDataset
+
+
+def legacy_csv(queryset, fields):
+    """CSV as exported before `CopyCSVExporter` (Python's `csv.writer` with model instances)"""
+    fields = [field for field in fields if field.show_on_frontend and field.name != "search_data"]
+    writer = csv.writer(Echo(), dialect=csv.excel)
+    lines = [writer.writerow([field.name for field in fields])]
+    for row in queryset.iterator():
+        values = []
+        for field in fields:
+            value = getattr(row, field.name)
+            values.append(obfuscate(value) if field.obfuscate else value)
+        lines.append(writer.writerow(values))
+    return "".join(lines)
+
+
+class CopyCSVExporterTests(BaseTestCaseWithSampleDataset):
+    DATASET_SLUG = "sample"
+    TABLE_NAME = "sample_table"
+    FIELDS_KWARGS = [
+        {"name": "name", "options": {"max_length": 20}, "type": "text", "null": False, "show_on_frontend": True},
+        {
+            "name": "document",
+            "options": {"max_length": 14},
+            "type": "text",
+            "null": True,
+            "obfuscate": True,
+            "show_on_frontend": True,
+        },
+        {"name": "active", "type": "bool", "null": True, "show_on_frontend": True},
+        {"name": "count", "type": "integer", "null": True, "show_on_frontend": True},
+        {"name": "date", "type": "date", "null": True, "show_on_frontend": True},
+        {"name": "hidden", "options": {"max_length": 10}, "type": "text", "null": True, "show_on_frontend": False},
+    ]
+
+    def export(self, queryset):
+        exporter = CopyCSVExporter(queryset, self.table.fields)
+        return b"".join(exporter).decode("utf-8")
+
+    def test_export_visible_fields_with_obfuscation(self):
+        self.TableModel.objects.create(name="Álvaro", document="12345678901", active=True, hidden="x")
+        self.TableModel.objects.create(name="Maria, A.", document="12345678000199", active=False, hidden="y")
+
+        result = self.export(self.TableModel.objects.order_by("name"))
+
+        assert result.splitlines() == [
+            "name,document,active,count,date",
+            "Álvaro,***456789**,True,,",
+            '"Maria, A.",12345678000199,False,,',
+        ]
+
+    def test_obfuscated_field_is_obfuscated_by_the_database(self):
+        self.TableModel.objects.create(name="a", document="12345678901")
+        self.TableModel.objects.create(name="b", document="12345678000199")
+        self.TableModel.objects.create(name="c", document=None)
+        exporter = CopyCSVExporter(self.TableModel.objects.order_by("name"), self.table.fields)
+
+        documents = [row[1] for row in exporter.get_select_queryset()]
+
+        assert documents == ["***456789**", "12345678000199", None]
+
+    def test_export_respects_queryset_filters(self):
+        self.TableModel.objects.create(name="foo", document=None, active=None)
+        self.TableModel.objects.create(name="bar", document=None, active=None)
+
+        result = self.export(self.TableModel.objects.filter(name="foo"))
+
+        assert result.splitlines() == ["name,document,active,count,date", "foo,,,,"]
+
+    def test_export_empty_queryset(self):
+        result = self.export(self.TableModel.objects.none())
+
+        assert result.splitlines() == ["name,document,active,count,date"]
+
+    def test_export_is_the_same_as_legacy_csv(self):
+        self.TableModel.objects.create(
+            name="Álvaro", document="12345678901", active=True, count=-42, date=datetime.date(2020, 3, 1)
+        )
+        self.TableModel.objects.create(name='Multi\nline "quoted"', document="", active=False, count=0)
+        self.TableModel.objects.create(name="", document=None, active=None, date=datetime.date(1999, 12, 31))
+        queryset = self.TableModel.objects.order_by("id")
+
+        result = self.export(queryset)
+
+        assert CopyCSVExporter(queryset, self.table.fields).use_copy
+        assert "\r\n" in result
+        assert result == legacy_csv(queryset, self.table.fields)
+
+
+class PythonCSVExporterTests(BaseTestCaseWithSampleDataset):
+    DATASET_SLUG = "sample"
+    TABLE_NAME = "sample_table"
+    FIELDS_KWARGS = [
+        {"name": "name", "options": {"max_length": 20}, "type": "text", "null": False, "show_on_frontend": True},
+        {
+            "name": "document",
+            "options": {"max_length": 14},
+            "type": "text",
+            "null": True,
+            "obfuscate": True,
+            "show_on_frontend": True,
+        },
+        {
+            "name": "amount",
+            "options": {"max_digits": 10, "decimal_places": 2},
+            "type": "decimal",
+            "null": True,
+            "show_on_frontend": True,
+        },
+        {"name": "ratio", "type": "float", "null": True, "show_on_frontend": True},
+        {"name": "updated_at", "type": "datetime", "null": True, "show_on_frontend": True},
+    ]
+
+    def test_export_is_the_same_as_legacy_csv(self):
+        self.TableModel.objects.create(
+            name="Álvaro",
+            document="12345678901",
+            amount=Decimal("10.50"),
+            ratio=0.1,
+            updated_at=datetime.datetime(2020, 3, 1, 12, 30, tzinfo=datetime.timezone.utc),
+        )
+        self.TableModel.objects.create(name='Multi\nline "quoted"', document="", amount=None, ratio=None)
+        queryset = self.TableModel.objects.order_by("id")
+        exporter = CopyCSVExporter(queryset, self.table.fields)
+
+        result = b"".join(exporter).decode("utf-8")
+
+        assert not exporter.use_copy
+        assert result == legacy_csv(queryset, self.table.fields)
@@ -72,6 +72,20 @@ class DynamicModelFormTests(BaseTestCaseWithSampleDataset):
         assert "city" not in form.errors
         assert {"city": "Rio de Janeiro"} == form.cleaned_data
 
+    def test_cached_form_uses_updated_choices(self):
+        uf_field = self.table.get_field("uf")
+        uf_field.frontend_filter = True
+        uf_field.has_choices = True
+        uf_field.choices = {"data": ["RJ", "SP"]}
+        uf_field.save()
+        assert not get_table_dynamic_form(self.table)(data={"uf": "MG"}).is_valid()
+
+        uf_field = self.table.get_field("uf")
+        uf_field.choices = {"data": ["MG", "RJ", "SP"]}
+        uf_field.save()
+
+        assert get_table_dynamic_form(self.table)(data={"uf": "MG"}).is_valid()
+
     def test_choice_failback_to_default_type_if_has_choice_field_but_no_data(self):
         self.table.field_set.filter(name__in=["uf", "city"]).update(frontend_filter=True)
         uf_field = self.table.get_field("uf")
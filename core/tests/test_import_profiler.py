@@ -0,0 +1,38 @@
+from django.test import SimpleTestCase
+
+from core.import_profiler import ImportProfiler, compare_reports
+
+
+class ImportProfilerTests(SimpleTestCase):
+    def test_stage_report(self):
+        profiler = ImportProfiler("sample", "sample_table", {"vacuum": True})
+
+        with profiler.stage("copy") as stage:
+            stage["rows"], stage["bytes"] = 100, 2048
+        profiler.record_index("idx_sample", ["state"], 0.5)
+        report = profiler.report()
+
+        assert ["copy"] == [stage["name"] for stage in report["stages"]]
+        copy = report["stages"][0]
+        assert 100 == copy["rows"] and 2048 == copy["bytes"]
+        assert {"wall_time", "cpu_time", "rows_per_second", "bytes_per_second"} < set(copy)
+        assert [{"name": "idx_sample", "fields": ["state"], "wall_time": 0.5}] == report["indexes"]
+        assert {"vacuum": True} == report["options"]
+
+
+class CompareReportsTests(SimpleTestCase):
+    def make_report(self, copy_time, vacuum_time):
+        return {
+            "stages": [
+                {"name": "copy", "wall_time": copy_time, "rows": 1000, "rows_per_second": 1000 / copy_time},
+                {"name": "vacuum", "wall_time": vacuum_time},
+            ],
+            "total_wall_time": copy_time + vacuum_time,
+        }
+
+    def test_detect_regressions(self):
+        result = compare_reports(self.make_report(10, 2), self.make_report(10.5, 4), threshold=0.1)
+
+        assert ["copy", "vacuum", "total"] == [stage["name"] for stage in result]
+        assert [False, True, True] == [stage["regression"] for stage in result]
+        assert 1.0 == result[1]["wall_time_change"]
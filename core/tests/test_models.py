@@ -4,12 +4,14 @@ from unittest.mock import Mock, patch
 
 import pytest
 from django.conf import settings
-from django.test import TestCase
+from django.contrib.postgres.search import SearchVector
+from django.test import TestCase, override_settings
 from model_bakery import baker, seq
 from rows import fields
 
 from core.dynamic_models import DynamicModelMixin
-from core.models import Dataset, DataTable, Field, Table, TableFile, Version
+from core.models import Dataset, DatasetTableModelQuerySet, DataTable, Field, Table, TableFile, Version
+from core.tests.utils import BaseTestCaseWithSampleDataset
 from utils.file_info import human_readable_size
 
 
@@ -79,6 +81,63 @@ class TableModelTests(TestCase):
         assert hidden_table in tables
 
 
+class TableGetModelIndexesTests(TestCase):
+    def setUp(self):
+        self.table = baker.make(Table, ordering=["state", "-date"])
+        for name in ("state", "city", "date"):
+            baker.make("core.Field", table=self.table, dataset=self.table.dataset, name=name, frontend_filter=True)
+        DataTable.new_data_table(self.table).activate()
+
+    def get_indexes(self):
+        Model = self.table.get_model(cache=False)
+        return sorted(index.fields for index in Model._meta.indexes)
+
+    def test_single_column_filter_indexes_by_default(self):
+        assert [["city"], ["date"], ["state", "-date"]] == self.get_indexes()
+
+    def test_composite_filter_and_ordering_indexes_from_table_options(self):
+        self.table.options = {"indexes": {"filter_with_ordering": ["city", "date"]}}
+        self.table.save()
+
+        assert [["city", "state", "-date"], ["date", "state"], ["state", "-date"]] == self.get_indexes()
+
+    def test_composite_indexes_for_all_filters(self):
+        self.table.options = {"indexes": {"filter_with_ordering": True}}
+        self.table.save()
+
+        assert [["city", "state", "-date"], ["date", "state"], ["state", "-date"]] == self.get_indexes()
+
+
+class TableSchemaTests(TestCase):
+    def test_schema_snapshot_is_reused(self):
+        table = baker.make(Table)
+        baker.make("core.Field", table=table, dataset=table.dataset, name="uf", frontend_filter=True)
+
+        schema = table.get_schema()
+
+        with self.assertNumQueries(0):
+            assert schema is table.get_schema()
+            assert ["uf"] == table.filtering
+            assert "uf" == table.get_field("uf").name
+
+    def test_schema_snapshot_is_invalidated_when_fields_change(self):
+        table = baker.make(Table)
+        field = baker.make("core.Field", table=table, dataset=table.dataset, name="uf", frontend_filter=True)
+        schema = table.get_schema()
+
+        field.frontend_filter = False
+        field.save()
+
+        assert schema is not table.get_schema()
+        assert [] == table.filtering
+
+    def test_get_field_raises_does_not_exist(self):
+        table = baker.make(Table)
+
+        with pytest.raises(Field.DoesNotExist):
+            table.get_field("unknown")
+
+
 class FieldModelTests(TestCase):
     def test_searchable_queryset(self):
         field = baker.make(Field, searchable=True)
@@ -265,3 +324,103 @@ class DatasetModelTests(TestCase):
         Table.objects.all().update(hidden=True)
 
         assert [] == self.dataset.all_files
+
+
+class DatasetTableModelQuerySetCountTests(BaseTestCaseWithSampleDataset):
+    DATASET_SLUG = "sample"
+    TABLE_NAME = "sample_table"
+    FIELDS_KWARGS = [
+        {"name": "sample_field", "options": {"max_length": 10}, "type": "text", "null": False, "filtering": True},
+    ]
+
+    def setUp(self):
+        baker.make(self.TableModel, sample_field="foo", _quantity=3)
+        baker.make(self.TableModel, sample_field="bar")
+
+    def test_exact_count_for_filtered_query_below_threshold(self):
+        qs = self.TableModel.objects.composed_query({"sample_field": "foo"})
+
+        assert 3 == qs.count()
+        assert qs.count_is_approximate is False
+
+    @override_settings(COUNT_ESTIMATE_THRESHOLD=1000)
+    @patch.object(DatasetTableModelQuerySet, "estimate_count", Mock(return_value=5000))
+    def test_estimated_count_for_filtered_query_above_threshold(self):
+        qs = self.TableModel.objects.composed_query({"sample_field": "foo"})
+
+        assert 5000 == qs.count()
+        assert qs.count_is_approximate is True
+
+    @patch.object(DatasetTableModelQuerySet, "estimate_count", Mock(return_value=5000))
+    def test_count_outside_composed_query_is_always_exact(self):
+        qs = self.TableModel.objects.filter(sample_field="foo")
+
+        assert 3 == qs.count()
+        assert DatasetTableModelQuerySet.estimate_count.called is False
+
+
+class DatasetTableModelQuerySetSearchTests(BaseTestCaseWithSampleDataset):
+    DATASET_SLUG = "sample"
+    TABLE_NAME = "sample_table"
+    FIELDS_KWARGS = [
+        {"name": "name", "options": {"max_length": 50}, "type": "text", "null": False, "searchable": True},
+        {"name": "uf", "options": {"max_length": 2}, "type": "text", "null": False, "filtering": True},
+    ]
+
+    def setUp(self):
+        baker.make(self.TableModel, name="Maria Silva", uf="SP", _quantity=4)
+        baker.make(self.TableModel, name="João Silva", uf="RJ")
+        baker.make(self.TableModel, name="Ana Souza", uf="RJ")
+        self.TableModel.objects.update(search_data=SearchVector("name", config="pg_catalog.portuguese"))
+
+    @override_settings(SEARCH_CANDIDATES_LIMIT=0)
+    def test_search_without_candidates_limit(self):
+        qs = self.TableModel.objects.composed_query(search_query="silva")
+
+        assert 5 == qs.count()
+        assert qs.search_limit_reached is False
+
+    @override_settings(SEARCH_CANDIDATES_LIMIT=3)
+    def test_search_ranks_limited_candidates(self):
+        qs = self.TableModel.objects.composed_query(search_query="silva")
+
+        assert 3 == qs.count()
+        assert 3 == len(list(qs))
+        assert qs.search_limit_reached is True
+
+    @override_settings(SEARCH_CANDIDATES_LIMIT=3)
+    def test_search_candidates_are_collected_after_filters(self):
+        qs = self.TableModel.objects.composed_query({"uf": "RJ"}, search_query="silva")
+
+        assert ["João Silva"] == [row.name for row in qs]
+        assert qs.search_limit_reached is False
+
+    @override_settings(SEARCH_CANDIDATES_LIMIT=5)
+    def test_search_limit_not_reached_when_matches_equal_limit(self):
+        qs = self.TableModel.objects.composed_query(search_query="silva")
+
+        assert 5 == qs.count()
+        assert qs.search_limit_reached is False
+
+
+class DatasetTableModelSearchDataTests(BaseTestCaseWithSampleDataset):
+    DATASET_SLUG = "sample"
+    TABLE_NAME = "sample_table"
+    FIELDS_KWARGS = [
+        {"name": "name", "options": {"max_length": 50}, "type": "text", "null": False, "searchable": True},
+        {"name": "city", "options": {"max_length": 50}, "type": "text", "null": True, "searchable": True},
+    ]
+
+    def test_update_search_data_matches_trigger(self):
+        baker.make(self.TableModel, name="Maria Silva", city=None)
+        baker.make(self.TableModel, name="João Souza", city="Rio de Janeiro")
+        min_id, max_id = self.TableModel.id_range()
+
+        assert 1 == self.TableModel.update_search_data(min_id, min_id + 1)
+        assert 1 == self.TableModel.objects.filter(search_data__isnull=False).count()
+        assert 1 == self.TableModel.update_search_data(min_id + 1, max_id + 1)
+        bulk = {row.id: row.search_data for row in self.TableModel.objects.all()}
+
+        self.TableModel.create_triggers()
+        self.TableModel.objects.update(search_data=None)  # Trigger recomputes it
+        assert bulk == {row.id: row.search_data for row in self.TableModel.objects.all()}
@@ -0,0 +1,44 @@
+import json
+from tempfile import NamedTemporaryFile
+from unittest.mock import Mock
+
+from django.test import SimpleTestCase, override_settings
+
+from core.query_log import aggregate_query_shapes, log_query_shape, query_shape, read_query_log
+
+
+class QueryLogTests(SimpleTestCase):
+    def setUp(self):
+        self.table = Mock()
+        self.table.name = "caso"
+        self.table.dataset.slug = "covid19"
+
+    def test_query_shape_does_not_keep_filter_values(self):
+        filters = {"state": "SP", "is_last": True, "city": "None"}
+
+        shape = query_shape(self.table, filters, "silva", ["-date"], page=2, source="html")
+
+        assert ["city", "is_last", "state"] == shape["filters"]
+        assert {"city": None, "is_last": True} == shape["conditions"]
+        assert ["-date"] == shape["ordering"]
+        assert shape["search"] is True
+        assert "SP" not in json.dumps(shape) and "silva" not in json.dumps(shape)
+
+    def test_log_and_aggregate_query_shapes(self):
+        with NamedTemporaryFile(suffix=".jsonl") as fobj:
+            with override_settings(QUERY_LOG_FILENAME=fobj.name, QUERY_LOG_SAMPLE_RATE=0.5):
+                for _ in range(3):
+                    log_query_shape(query_shape(self.table, {"state": "SP"}, "", []), 0.25)
+                log_query_shape(query_shape(self.table, {}, "silva", []), 1)
+
+            records = list(read_query_log([fobj.name]))
+            result = aggregate_query_shapes(records)
+
+        assert 4 == len(records)
+        assert 0.25 == json.loads(json.dumps(records[0]))["duration"]
+        shapes = result[("covid19", "caso")]
+        stats = shapes[(("state",), (), (), False)]
+        assert 3 == stats["samples"]
+        assert 6 == stats["requests"]  # Extrapolated using the sample rate
+        assert 1.5 == stats["total_duration"]
+        assert 1 == shapes[((), (), (), True)]["samples"]
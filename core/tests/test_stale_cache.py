@@ -0,0 +1,72 @@
+import time
+from unittest.mock import patch
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.caching import invalidate_tags
+from core.stale_cache import stale_while_revalidate, uncacheable_if_stale
+from core.tasks import refresh_stale_cache_task
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "stale"}}
+CALLS = []
+
+
+@stale_while_revalidate(tags=["test:stale-cache"], soft_ttl=3600)
+def compute(value):
+    CALLS.append(value)
+    return {"value": value, "call": len(CALLS)}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+@patch("core.stale_cache.refresh_stale_cache_task.delay")
+class StaleWhileRevalidateTests(SimpleTestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_computes_only_to_prime_the_cache(self, mocked_delay):
+        assert {"value": 1, "call": 1} == compute(1)
+        assert {"value": 1, "call": 1} == compute(1)
+        assert {"value": 2, "call": 2} == compute(2)
+        assert [1, 2] == CALLS
+        mocked_delay.assert_not_called()
+
+    def test_serves_stale_value_and_enqueues_one_refresh(self, mocked_delay):
+        compute(1)
+        invalidate_tags("test:stale-cache")
+
+        assert {"value": 1, "call": 1} == compute(1)
+        assert {"value": 1, "call": 1} == compute(1)
+        assert [1] == CALLS
+        mocked_delay.assert_called_once_with("core.tests.test_stale_cache.compute", [1])
+
+        refresh_stale_cache_task("core.tests.test_stale_cache.compute", [1])
+
+        assert {"value": 1, "call": 2} == compute(1)
+        assert [1, 1] == CALLS
+        assert 1 == mocked_delay.call_count
+
+    def test_refresh_after_soft_ttl(self, mocked_delay):
+        compute(1)
+        with patch("core.stale_cache.time.time", return_value=time.time() + 3601):
+            assert {"value": 1, "call": 1} == compute(1)
+        mocked_delay.assert_called_once_with("core.tests.test_stale_cache.compute", [1])
+
+    def test_responses_with_outdated_values_are_not_cacheable(self, mocked_delay):
+        @uncacheable_if_stale
+        def view(request):
+            response = HttpResponse(str(compute(1)))
+            response["ETag"] = '"current-data"'
+            return response
+
+        request = RequestFactory().get("/")
+        compute(1)
+        response = view(request)
+        assert '"current-data"' == response["ETag"]
+        assert not response.has_header("Cache-Control")
+
+        invalidate_tags("test:stale-cache")
+        response = view(request)
+        assert not response.has_header("ETag")
+        assert "no-store" in response["Cache-Control"]
+        assert "private" in response["Cache-Control"]
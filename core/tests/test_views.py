@@ -5,6 +5,7 @@ from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.test import override_settings
 from django.urls import reverse
+from django.utils import timezone
 from model_bakery import baker
 
 from core.models import TableFile
@@ -85,6 +86,39 @@ class SampleDatasetDetailView(DjangoAssertionsMixin, BaseTestCaseWithSampleDatas
         assert 1 == len(context["data"].paginator.object_list)
         assert match in context["data"].paginator.object_list
 
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def test_table_page_is_cached_for_logged_users(self):
+        call_command("clear_cache")
+        self.login()
+        baker.make(self.TableModel, sample_field="bar", _quantity=3)
+        url = self.url + "?sample_field=bar"
+
+        response = self.client.get(url)
+        assert 3 == response.context["total_count"]
+        self.TableModel.objects.filter(id__in=self.TableModel.objects.values("id")[:1]).delete()
+
+        response = self.client.get(url)
+        assert 3 == response.context["total_count"]
+        assert 3 == len(response.context["data"].object_list)
+
+        self.table.invalidate_cache()
+        response = self.client.get(url)
+        assert 2 == response.context["total_count"]
+
+    def test_304_if_table_was_not_modified(self):
+        response = self.client.get(self.url)
+        assert 200 == response.status_code
+        etag = response["ETag"]
+        assert response.has_header("Last-Modified")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        assert 304 == response.status_code
+
+        self.table.import_date = timezone.now()
+        self.table.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        assert 200 == response.status_code
+
     @override_settings(RATELIMIT_ENABLE=True)
     @override_settings(RATELIMIT_RATE="0/s")
     @patch("traffic_control.decorators.ratelimit")
@@ -0,0 +1,116 @@
+import json
+from tempfile import NamedTemporaryFile
+from unittest.mock import Mock, patch
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from core.warmup import CacheWarmer, popular_shapes
+
+
+def record(filters=(), conditions=None, ordering=(), page=1, source="html", table="caso", sample_rate=0.5, **extra):
+    return {
+        "dataset": "covid19",
+        "table": table,
+        "filters": list(filters),
+        "conditions": conditions or {},
+        "ordering": list(ordering),
+        "page": page,
+        "search": False,
+        "cursor": False,
+        "source": source,
+        "sample_rate": sample_rate,
+        **extra,
+    }
+
+
+class PopularShapesTests(SimpleTestCase):
+    def test_shapes_are_ranked_by_extrapolated_requests(self):
+        records = [
+            record(["state"]),
+            record(["state"]),
+            record(["state"], ordering=["-date"], sample_rate=0.1),
+            record(["state"], source="api"),
+            record(["state"], table="obito"),
+            record(["state"], search=True),
+            record(["state"], cursor=True),
+        ]
+
+        result = popular_shapes(records, "covid19", "caso")
+
+        assert [
+            ("html", (("state",), (), ("-date",), 1), 10.0),
+            ("html", (("state",), (), (), 1), 4.0),
+            ("api", (("state",), (), (), 1), 2.0),
+        ] == result
+        assert 1 == len(popular_shapes(records, "covid19", "caso", limit=1))
+
+
+class CacheWarmerTests(SimpleTestCase):
+    def setUp(self):
+        self.table = Mock()
+        self.table.name = "caso"
+        self.table.dataset.slug = "covid19"
+        self.table_url = "/dataset/covid19/caso/"
+
+    def warmer(self, records, max_urls=10):
+        fobj = NamedTemporaryFile(mode="w", suffix=".jsonl")
+        self.addCleanup(fobj.close)
+        for item in records:
+            fobj.write(json.dumps(item) + "\n")
+        fobj.flush()
+        return CacheWarmer(self.table, max_urls=max_urls, workers=2, log_filenames=[fobj.name])
+
+    def test_urls_start_with_table_page(self):
+        warmer = self.warmer([record(["is_last"], conditions={"is_last": True}), record()])
+
+        with patch.object(CacheWarmer, "table_url", return_value=self.table_url):
+            urls = warmer.urls()
+
+        assert [("html", self.table_url), ("html", "/dataset/covid19/caso/?is_last=True")] == urls
+
+    def test_urls_respect_max_urls(self):
+        warmer = self.warmer([record(page=page) for page in range(5)], max_urls=3)
+
+        with patch.object(CacheWarmer, "table_url", return_value=self.table_url):
+            assert 3 == len(warmer.urls())
+
+    def test_shape_url_uses_logged_conditions_and_field_choices(self):
+        warmer = CacheWarmer(self.table, max_urls=10, workers=1, log_filenames=[])
+        self.table.get_schema.return_value.get_field.side_effect = lambda name: {
+            "state": Mock(has_choices=True, choices={"data": ["AC", "AL"]}),
+            "city": Mock(has_choices=False, choices=None),
+        }.get(name)
+
+        with patch.object(CacheWarmer, "table_url", return_value=self.table_url):
+            url = warmer.shape_url("html", ("is_last", "state"), (("is_last", True),), ("-date",), 2)
+            assert "/dataset/covid19/caso/?is_last=True&state=AC&order-by=-date&page=2" == url
+            assert warmer.shape_url("html", ("city",), (), (), 1) is None
+
+    @patch.object(CacheWarmer, "fill_api_cache", return_value=200)
+    @patch.object(CacheWarmer, "fill_table_page_cache", side_effect=[200, Exception("boom")])
+    def test_fill_caches_per_source(self, fill_table_page_cache, fill_api_cache):
+        warmer = CacheWarmer(self.table, max_urls=10, workers=1, log_filenames=[])
+        urls = [
+            ("html", self.table_url),
+            ("html", "/dataset/covid19/caso/?state=SP"),
+            ("api", "/v1/dataset/covid19/caso/data/?state=SP"),
+        ]
+
+        statuses = warmer.fill_caches(urls)
+
+        assert {urls[0][1]: 200, urls[1][1]: 500, urls[2][1]: 200} == statuses
+        assert 2 == fill_table_page_cache.call_count
+        fill_api_cache.assert_called_once_with("/v1/dataset/covid19/caso/data/?state=SP")
+
+    @override_settings(DEBUG=False, ALLOWED_HOSTS=[settings.BRASILIO_API_HOST])
+    def test_api_request_is_sent_to_the_api_host(self):
+        warmer = CacheWarmer(self.table, max_urls=10, workers=1, log_filenames=[])
+
+        request = warmer.api_request("/v1/dataset/covid19/caso/data/?state=SP&page=2")
+
+        assert "SP" == request.GET["state"]
+        assert {"slug": "covid19", "tablename": "caso"} == request.resolver_match.kwargs
+        assert "v1" == request.resolver_match.namespace
+        expected = f"https://{settings.BRASILIO_API_HOST}/v1/dataset/covid19/caso/data/?state=SP&page=2"
+        assert expected == request.build_absolute_uri()
@@ -121,7 +121,7 @@ def brasilio_github_contributors():
 def create_table_documentation(table):
     dataset_slug = table.dataset.slug
     fields_text = []
-    for field in table.field_set.all().order_by("order"):
+    for field in table.fields:
         field_filtering = field.name in table.filtering
         field_str = f"- {'🔍 ' if field_filtering else ''}`{field.name}`: {field.description}"
         fields_text.append(field_str)
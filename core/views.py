@@ -1,30 +1,29 @@
-import csv
+import time
 import uuid
+from types import SimpleNamespace
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.mail import EmailMessage
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
 from django.db.models import Q
 from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 
+from core.caching import get_cached_table_page, set_cached_table_page, table_page_cache_key
+from core.conditional import conditional_dataset_files, conditional_table_page
+from core.export import CopyCSVExporter
 from core.filters import parse_querystring
 from core.forms import ContactForm, DatasetSearchForm, get_table_dynamic_form
 from core.middlewares import disable_non_logged_user_cache
-from core.models import Dataset, Table
-from core.templatetags.utils import obfuscate
+from core.models import Dataset, Table, search_terms
+from core.query_log import log_query_shape, query_shape, should_sample
 from core.util import cached_http_get_json
 from data_activities_log.activites import recent_activities
 from traffic_control.logging import log_blocked_request
 
 
-class Echo:
-    def write(self, value):
-        return value
-
-
 @disable_non_logged_user_cache
 def contact(request):
     sent = request.GET.get("sent", "").lower() == "true"
@@ -58,24 +57,6 @@ def contact(request):
     return render(request, "core/contact.html", {"form": form, "sent": sent})
 
 
-def queryset_to_csv(data, fields):
-    header = None
-    for row in data.iterator():
-        row_data = {}
-        for field in fields:
-            if not field.show_on_frontend or field.name == "search_data":
-                continue
-            else:
-                value = getattr(row, field.name)
-                if field.obfuscate:
-                    value = obfuscate(value)
-                row_data[field.name] = value
-        if header is None:
-            header = list(row_data.keys())
-            yield header
-        yield [row_data[field] for field in header]
-
-
 def index(request):
     return redirect(reverse("core:home"))
 
@@ -105,7 +86,39 @@ def dataset_list(request):
     return render(request, "core/dataset-list.html", context)
 
 
+def row_to_dict(row):
+    fields = [field for field in row._meta.concrete_fields if field.name != "search_data"]
+    return {field.attname: getattr(row, field.attname) for field in fields}
+
+
+def get_table_page(table, queryset, filters, search_query, order_by, page, items_per_page):
+    """Return a page of a dataset table query and its count info (`dict`)
+
+    Rows (as dicts), count and page number are cached for all users (table
+    data is public), so only the first request of a page runs the queries.
+    """
+    key = table_page_cache_key(table, filters, search_terms(search_query), order_by, page, items_per_page)
+    page_info = get_cached_table_page(key)
+    if page_info is None:
+        data = Paginator(queryset, items_per_page).get_page(page)
+        page_info = {
+            "rows": [row_to_dict(row) for row in data],
+            "number": data.number,
+            "count": data.paginator.count,
+            "count_is_approximate": queryset.count_is_approximate,
+            "search_limit_reached": queryset.search_limit_reached,
+        }
+        set_cached_table_page(key, page_info)
+
+    paginator = Paginator(queryset, items_per_page)
+    paginator.count = page_info["count"]  # `count` is a cached property, so `COUNT` is not executed
+    rows = [SimpleNamespace(**row) for row in page_info["rows"]]  # Templates get the values as attributes
+    return Page(rows, page_info["number"], paginator), page_info
+
+
+@conditional_table_page
 def dataset_detail(request, slug, tablename=""):
+    sample_start = time.monotonic() if should_sample() else None
     if len(request.GET) > 0 and not request.user.is_authenticated:
         return redirect(f"{settings.LOGIN_URL}?next={request.get_full_path()}")
 
@@ -176,23 +189,18 @@ def dataset_detail(request, slug, tablename=""):
             }
             return render(request, "4xx.html", context, status=400)
 
-        if all_data.count() > settings.CSV_EXPORT_MAX_ROWS:
+        if all_data.count() > settings.CSV_EXPORT_MAX_ROWS or all_data.search_limit_reached:
             context = {"message": "Max rows exceeded.", "title_4xx": "Oops! Ocorreu um erro:"}
             return render(request, "4xx.html", context, status=400)
 
         filename = "{}-{}.csv".format(slug, uuid.uuid4().hex)
-        pseudo_buffer = Echo()
-        writer = csv.writer(pseudo_buffer, dialect=csv.excel)
-        csv_rows = queryset_to_csv(all_data, table.fields)
-        response = StreamingHttpResponse(
-            (writer.writerow(row) for row in csv_rows), content_type="text/csv;charset=UTF-8",
-        )
+        exporter = CopyCSVExporter(all_data, table.fields)
+        response = StreamingHttpResponse(iter(exporter), content_type="text/csv;charset=UTF-8")
         response["Content-Disposition"] = 'attachment; filename="{}"'.format(filename)
         response.encoding = "UTF-8"
         return response
 
-    paginator = Paginator(all_data, items_per_page)
-    data = paginator.get_page(page)
+    data, page_info = get_table_page(table, all_data, query, search_query, order_by, page, items_per_page)
 
     for key, value in list(querystring.items()):
         if not value:
@@ -203,18 +211,25 @@ def dataset_detail(request, slug, tablename=""):
         "dataset": dataset,
         "filter_form": filter_form,
         "max_export_rows": settings.CSV_EXPORT_MAX_ROWS,
+        "search_limit": settings.SEARCH_CANDIDATES_LIMIT,
+        "search_limit_reached": page_info["search_limit_reached"],
         "search_term": querystring.get("search", ""),
         "querystring": querystring.urlencode(),
         "slug": slug,
         "table": table,
-        "total_count": all_data.count(),
+        "total_count": page_info["count"],
+        "total_count_is_approximate": page_info["count_is_approximate"],
         "version": version,
     }
 
     status = 200
     if filter_form.errors:
         status = 400
-    return render(request, "core/dataset-detail.html", context, status=status)
+    response = render(request, "core/dataset-detail.html", context, status=status)
+    if sample_start is not None and status == 200:
+        shape = query_shape(table, query, search_query, order_by, page=page, source="html")
+        log_query_shape(shape, time.monotonic() - sample_start)
+    return response
 
 
 def dataset_suggestion(request):
@@ -235,6 +250,7 @@ def contributors(request):
     return render(request, "core/contributors.html", {"contributors": data})
 
 
+@conditional_dataset_files
 def dataset_files_detail(request, slug):
     dataset = get_object_or_404(Dataset, slug=slug)
     try:
@@ -21,9 +21,9 @@ def _get_fields(table, remove=None, only=None):
     if only is not None and remove is not None:
         raise ValueError("Cannot have only and remove at the same time")
     elif remove:
-        return [field for field in table.field_set.all() if field.show_on_frontend and field.name not in remove]
+        return [field for field in table.fields if field.show_on_frontend and field.name not in remove]
     elif only:
-        return [field for field in table.field_set.all() if field.show_on_frontend and field.name in only]
+        return [field for field in table.fields if field.show_on_frontend and field.name in only]
 
 
 def unaccent(text):
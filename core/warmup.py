@@ -0,0 +1,213 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connection
+from django.http import HttpRequest, QueryDict
+from django.urls import resolve, reverse
+
+from core.filters import parse_querystring
+from core.forms import get_table_dynamic_form
+from core.query_log import read_query_log
+from core.views import get_table_page
+
+WARMUP_USER_AGENT = "brasil.io-cache-warmup"
+
+
+def pagination_params(source):
+    """Page and page size parameters, default and max. page size of the views for a query log `source`"""
+    if source == "api":  # Same as `api.paginators.LargeTablePageNumberPagination`
+        return "page", "page_size", 1000, 10000
+    return "page", "items", settings.ROWS_PER_PAGE, 1000
+
+
+def popular_shapes(records, dataset_slug, tablename, limit=None):
+    """Most requested query shapes of a table in the query log `records`, as `[(source, shape, requests)]`
+
+    `shape` is `(filters, conditions, ordering, page)`. The number of requests
+    is extrapolated using the sample rate. Searches and cursor pages are
+    skipped, since they can't be requested without the values they used.
+    """
+    requests = defaultdict(float)
+    for record in records:
+        if record["dataset"] != dataset_slug or record["table"] != tablename:
+            continue
+        elif record.get("search") or record.get("cursor"):
+            continue
+        conditions = tuple(sorted((record.get("conditions") or {}).items(), key=lambda item: item[0]))
+        shape = (tuple(record["filters"]), conditions, tuple(record["ordering"]), record.get("page") or 1)
+        requests[(record.get("source") or "html", shape)] += 1 / (record.get("sample_rate") or 1)
+    result = sorted(((source, shape, value) for (source, shape), value in requests.items()), key=lambda item: -item[2])
+    return result[:limit] if limit else result
+
+
+class CacheWarmer:
+    """
+    Warm the database and the caches up for a newly imported data table
+
+    Right after a table is reimported all its popular pages are cache misses
+    at the same time. URLs for the most requested query shapes of the table
+    (from the query log, see `shape_url`) are used in two steps:
+
+    - `prepare` runs their queries against the new (still inactive) data table
+      before the swap, so its pages are in Postgres' buffers and the counts are
+      cached (count keys use the physical table name, so they are valid after
+      activation);
+    - `fill_caches` fills the caches of the pages after the swap (in the
+      background, see `core.tasks.warm_view_cache_task`): the table page cache
+      (see `core.views.get_table_page`, used by HTML pages for all users) and
+      the API response cache (see `DatasetDataListView.fill_response_cache`).
+    """
+
+    def __init__(self, table, max_urls=None, workers=None, log_filenames=None):
+        self.table = table
+        self.max_urls = max_urls if max_urls is not None else settings.WARMUP_MAX_URLS
+        self.workers = max(1, workers or settings.WARMUP_WORKERS)
+        if log_filenames is None:
+            log_filenames = [settings.QUERY_LOG_FILENAME] if settings.QUERY_LOG_FILENAME else []
+        self.log_filenames = log_filenames
+
+    def table_url(self):
+        return reverse(
+            "core:dataset-table-detail", kwargs={"slug": self.table.dataset.slug, "tablename": self.table.name}
+        )
+
+    def api_url(self):
+        """Path of the table's data in the API host (`settings.BRASILIO_API_HOST`)"""
+        return reverse(
+            "v1:dataset-table-data",
+            kwargs={"slug": self.table.dataset.slug, "tablename": self.table.name},
+            urlconf=settings.API_ROOT_URLCONF,
+        )
+
+    def shape_url(self, source, filters, conditions, ordering, page):
+        """URL of a query shape (`None` if it can't be built)
+
+        The log only has the values of boolean/null filters, so the other ones
+        use the first of the field's choices (filters without choices can't be
+        requested).
+        """
+        conditions, schema, query = dict(conditions), self.table.get_schema(), []
+        for name in filters:
+            if name in conditions:
+                value = conditions[name]
+                query.append((name, "None" if value is None else str(value)))
+                continue
+            field = schema.get_field(name)
+            choices = (field.choices or {}).get("data") if field is not None and field.has_choices else None
+            if not choices:
+                return None
+            query.append((name, choices[0]))
+        if ordering:
+            query.append(("order-by", ",".join(ordering)))
+        if page and page != 1:
+            query.append((pagination_params(source)[0], page))
+        url = self.table_url() if source == "html" else self.api_url()
+        return f"{url}?{urlencode(query)}" if query else url
+
+    def urls(self):
+        """Table's first page plus URLs of its most requested query shapes, as `[(source, url)]`"""
+        try:
+            records = list(read_query_log(self.log_filenames))
+        except OSError:  # Log not created yet
+            records = []
+        result = [("html", self.table_url())]
+        for source, shape, _ in popular_shapes(records, self.table.dataset.slug, self.table.name):
+            url = self.shape_url(source, *shape)
+            if url is not None and (source, url) not in result:
+                result.append((source, url))
+        return result[: self.max_urls] if self.max_urls else result
+
+    def parse_url(self, source, url):
+        """Query of `url` as the views parse it: `(filters, search_query, order_by, page, page_size)`
+
+        Return `None` if the view would answer with an error.
+        """
+        page_param, size_param, default_size, max_size = pagination_params(source)
+        querystring = QueryDict(urlsplit(url).query, mutable=True)
+        page = querystring.pop(page_param, ["1"])[0].strip() or "1"
+        page_size = querystring.pop(size_param, [str(default_size)])[0].strip() or str(default_size)
+        for key in ("format", "cursor", "limit", "offset"):
+            querystring.pop(key, None)
+        try:
+            page, page_size = int(page), min(int(page_size), max_size)
+        except ValueError:
+            return None
+        query, search_query, order_by = parse_querystring(querystring)
+        filter_form = get_table_dynamic_form(self.table)(data=query)
+        if not filter_form.is_valid():
+            return None
+        query = {key: value for key, value in filter_form.cleaned_data.items() if value != ""}
+        return query, search_query, order_by, page, page_size
+
+    def run_query(self, Model, source, url):
+        """Execute the count and the page query of `url` against `Model`, return the number of rows fetched"""
+        try:
+            parsed = self.parse_url(source, url)
+            if parsed is None:
+                return 0
+            query, search_query, order_by, page, page_size = parsed
+            queryset = Model.objects.composed_query(query, search_query, order_by)
+            try:  # `.page` calls `count` (which is cached)
+                return len(Paginator(queryset, page_size).page(page).object_list)
+            except InvalidPage:
+                return 0
+        finally:
+            connection.close()
+
+    def prepare(self, Model, urls=None):
+        """Run the queries of the popular URLs against `Model` (before it's activated)"""
+        urls = self.urls() if urls is None else urls
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.run_query, Model, source, url) for source, url in urls]
+            return sum(future.result() for future in as_completed(futures))
+
+    def fill_table_page_cache(self, url):
+        """Cache the rows/count of an HTML page (as `dataset_detail` does), return the status of the page"""
+        parsed = self.parse_url("html", url)
+        if parsed is None:
+            return 400
+        query, search_query, order_by, page, page_size = parsed
+        queryset = self.table.get_model().objects.composed_query(query, search_query, order_by)
+        get_table_page(self.table, queryset, query, search_query, order_by, page, page_size)
+        return 200
+
+    def api_request(self, url):
+        """`HttpRequest` for an API `url` as sent by clients to the API host (the cache key depends on the URL)"""
+        parts = urlsplit(url)
+        request = HttpRequest()
+        request.method = "GET"
+        request.path = request.path_info = parts.path
+        request.GET = QueryDict(parts.query)
+        request.META.update({"HTTP_HOST": settings.BRASILIO_API_HOST, "QUERY_STRING": parts.query})
+        request.META["HTTP_USER_AGENT"] = WARMUP_USER_AGENT
+        if not settings.DEBUG and settings.SECURE_PROXY_SSL_HEADER:
+            header, value = settings.SECURE_PROXY_SSL_HEADER
+            request.META[header] = value
+        request.resolver_match = resolve(parts.path, urlconf=settings.API_ROOT_URLCONF)
+        return request
+
+    def fill_api_cache(self, url):
+        """Cache the API response of `url`, return its status code"""
+        from api.views import DatasetDataListView  # `api` depends on `core`
+
+        request = self.api_request(url)
+        return DatasetDataListView.fill_response_cache(request, **request.resolver_match.kwargs)
+
+    def fill_caches(self, urls=None):
+        """Fill the table page and API response caches with the popular URLs, return the statuses per URL"""
+        urls = self.urls() if urls is None else urls
+
+        def fill(source_url):
+            source, url = source_url
+            try:
+                return self.fill_table_page_cache(url) if source == "html" else self.fill_api_cache(url)
+            except Exception:  # Other pages are still warmed up
+                return 500
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return dict(zip([url for _, url in urls], executor.map(fill, urls)))
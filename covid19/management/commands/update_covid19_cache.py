@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from brazil_data.states import STATES
+from covid19.views import cities_data, dashboard_data, historical_period_data
+
+
+class Command(BaseCommand):
+    help = "Compute the cached covid19 aggregations (for Brazil and each state), so no request computes them"
+
+    def handle(self, *args, **kwargs):
+        for state in [None] + [state.acronym for state in STATES]:
+            print(f"Updating covid19 cache for {state or 'Brazil'}")
+            cities_data.refresh(state)
+            dashboard_data.refresh(state)
+            for period in ("daily", "weekly"):
+                historical_period_data.refresh(period, state)
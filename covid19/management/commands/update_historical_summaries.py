@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from covid19.models import HistoricalSummary
+from covid19.stats import update_historical_summaries
+
+
+class Command(BaseCommand):
+    help = "Build the covid19 historical series read by the dashboard (done automatically after imports)"
+
+    def add_arguments(self, parser):
+        sources = [source for source, _ in HistoricalSummary.SOURCE_CHOICES]
+        parser.add_argument("--source", action="append", choices=sources, help="Only update these series")
+
+    def handle(self, *args, **kwargs):
+        total = update_historical_summaries(kwargs["source"])
+        print(f"{total} historical series updated.")
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:00
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("covid19", "0016_auto_20201206_2044"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HistoricalSummary",
+            fields=[
+                ("id", models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "source",
+                    models.CharField(
+                        choices=[("cases", "cases"), ("registry", "registry"), ("registry_excess", "registry_excess")],
+                        max_length=16,
+                    ),
+                ),
+                ("period", models.CharField(choices=[("daily", "daily"), ("weekly", "weekly")], max_length=8)),
+                ("state", models.CharField(blank=True, default="", max_length=2)),
+                (
+                    "data",
+                    models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder),
+                ),
+            ],
+            options={"unique_together": {("source", "period", "state")}},
+        ),
+    ]
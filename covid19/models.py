@@ -5,6 +5,7 @@ from pathlib import Path
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields import ArrayField
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.urls import reverse
 from localflavor.br.br_states import STATE_CHOICES
@@ -385,3 +386,39 @@ class DailyBulletin(models.Model):
     @property
     def admin_url(self):
         return reverse("admin:covid19_dailybulletin_change", args=[self.pk])
+
+
+class HistoricalSummaryQuerySet(models.QuerySet):
+    def get_data(self, source, period, state=None):
+        """Rows of a series (`state=None` for Brazil) or `None` if it was not built"""
+        return self.filter(source=source, period=period, state=state or "").values_list("data", flat=True).first()
+
+
+class HistoricalSummary(models.Model):
+    """
+    Historical series of `Covid19Stats` precomputed after an import
+
+    Each row has a whole series (the list of rows for a source, period and
+    state, ordered by date/epidemiological week), so the views read it with one
+    indexed lookup instead of aggregating `caso_full`/`obito_cartorio`. See
+    `covid19.stats.update_historical_summaries`.
+    """
+
+    CASES, REGISTRY, REGISTRY_EXCESS = "cases", "registry", "registry_excess"
+    SOURCE_CHOICES = ((CASES, "cases"), (REGISTRY, "registry"), (REGISTRY_EXCESS, "registry_excess"))
+    DAILY, WEEKLY = "daily", "weekly"
+    PERIOD_CHOICES = ((DAILY, "daily"), (WEEKLY, "weekly"))
+
+    objects = HistoricalSummaryQuerySet.as_manager()
+
+    updated_at = models.DateTimeField(auto_now=True)
+    source = models.CharField(max_length=16, choices=SOURCE_CHOICES)
+    period = models.CharField(max_length=8, choices=PERIOD_CHOICES)
+    state = models.CharField(max_length=2, blank=True, default="")  # Empty for Brazil
+    data = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        unique_together = [("source", "period", "state")]
+
+    def __str__(self):
+        return f"{self.source} ({self.period}) - {self.state or 'BR'}"
@@ -1,7 +1,11 @@
+from django.db import transaction
+from django.db.models.signals import post_save
 from django.dispatch import Signal, receiver
 
-from covid19.models import StateSpreadsheet
-from covid19.tasks import process_new_spreadsheet_task
+from core.models import DataTable
+from core.signals import table_data_updated
+from covid19.models import HistoricalSummary, StateSpreadsheet
+from covid19.tasks import process_new_spreadsheet_task, update_historical_summaries_task
 
 new_spreadsheet_imported_signal = Signal(providing_args=["spreadsheet"])
 
@@ -10,3 +14,29 @@ new_spreadsheet_imported_signal = Signal(providing_args=["spreadsheet"])
 def process_new_spreadsheet_receiver(sender, spreadsheet, **kwargs):
     StateSpreadsheet.objects.cancel_older_versions(spreadsheet)
     process_new_spreadsheet_task.delay(spreadsheet_pk=spreadsheet.pk)
+
+
+# Historical summaries built from each table (see `covid19.stats.update_historical_summaries`)
+SUMMARY_SOURCES = {
+    "caso_full": [HistoricalSummary.CASES],
+    "obito_cartorio": [HistoricalSummary.REGISTRY, HistoricalSummary.REGISTRY_EXCESS],
+}
+
+
+def enqueue_historical_summaries_update(table):
+    if table.dataset.slug != "covid19" or table.name not in SUMMARY_SOURCES:
+        return
+    # Activation may be in a transaction with other tables: the job must see all of them
+    sources = SUMMARY_SOURCES[table.name]
+    transaction.on_commit(lambda: update_historical_summaries_task.delay(sources=sources))
+
+
+@receiver(post_save, sender=DataTable, dispatch_uid="update_historical_summaries")
+def update_historical_summaries_receiver(sender, instance, **kwargs):
+    if instance.active:
+        enqueue_historical_summaries_update(instance.table)
+
+
+@receiver(table_data_updated, dispatch_uid="update_historical_summaries_in_place")
+def update_historical_summaries_in_place_receiver(sender, table, **kwargs):
+    enqueue_historical_summaries_update(table)
@@ -1,13 +1,19 @@
-from collections import Counter
+from collections import Counter, defaultdict
 from datetime import timedelta
+from functools import wraps
 from itertools import groupby
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.db.models import Max, Sum
 from django.utils import timezone
 
 from brazil_data.cities import brazilian_cities_per_state
+from brazil_data.states import STATES
+from core.caching import dataset_tag, invalidate_tags
 from core.models import get_table_model
+from covid19.models import HistoricalSummary
 from covid19.serializers import CityCaseSerializer
 
 User = get_user_model()
@@ -49,6 +55,24 @@ def group_deaths(data):
     return result
 
 
+def summarized(source, period):
+    """Read the series from `HistoricalSummary` (if built) when `Covid19Stats.from_summaries` is set"""
+
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, state=None):
+            if self.from_summaries:
+                data = HistoricalSummary.objects.get_data(source, period, state)
+                if data is not None:
+                    return data
+            return method(self, state)
+
+        wrapper.summary = (source, period)
+        return wrapper
+
+    return decorator
+
+
 class Covid19Stats:
     graph_daily_cases_columns = {
         "confirmed": (Sum, "last_available_confirmed"),
@@ -131,6 +155,11 @@ class Covid19Stats:
         "new_deaths_total": (Sum, "new_deaths_total_2019"),
     }
 
+    def __init__(self, from_summaries=None):
+        if from_summaries is None:
+            from_summaries = settings.COVID19_STATS_FROM_SUMMARIES
+        self.from_summaries = from_summaries
+
     @property
     def Boletim(self):
         return get_table_model("covid19", "boletim")
@@ -330,11 +359,13 @@ class Covid19Stats:
             result.append({group_key: epiweek, **epidata})
         return result
 
+    @summarized(HistoricalSummary.CASES, HistoricalSummary.DAILY)
     def historical_case_data_for_state_per_day(self, state):
         return self.aggregate_state_data(
             groupby_columns=["date"], select_columns=self.graph_daily_cases_columns, state=state
         )
 
+    @summarized(HistoricalSummary.CASES, HistoricalSummary.WEEKLY)
     def historical_case_data_for_state_per_epiweek(self, state):
         return self.aggregate_epiweek(
             self.aggregate_state_data(
@@ -351,16 +382,19 @@ class Covid19Stats:
         annotate_dict = {alias: Function(column) for alias, (Function, column) in select_columns.items()}
         return list(qs.order_by(*groupby_columns).values(*groupby_columns).annotate(**annotate_dict))
 
+    @summarized(HistoricalSummary.REGISTRY, HistoricalSummary.DAILY)
     def historical_registry_data_for_state_per_day(self, state=None):
         # If state = None, return data for Brazil
         return self.aggregate_registry_data(
             groupby_columns=["date"], select_columns=self.graph_daily_registry_deaths_columns, state=state
         )
 
+    @summarized(HistoricalSummary.REGISTRY_EXCESS, HistoricalSummary.DAILY)
     def excess_deaths_registry_data_for_state_per_day(self, state=None):
         data = self.historical_registry_data_for_state_per_day(state=state)
         return group_deaths(data)
 
+    @summarized(HistoricalSummary.REGISTRY, HistoricalSummary.WEEKLY)
     def historical_registry_data_for_state_per_epiweek(self, state=None):
         # If state = None, return data for Brazil
         data_2020 = self.aggregate_epiweek(
@@ -396,11 +430,100 @@ class Covid19Stats:
             result.append(new)
         return result
 
+    @summarized(HistoricalSummary.REGISTRY_EXCESS, HistoricalSummary.WEEKLY)
     def excess_deaths_registry_data_for_state_per_epiweek(self, state=None):
         data = self.historical_registry_data_for_state_per_epiweek(state=state)
         return group_deaths(data)
 
 
+class AllStatesCovid19Stats(Covid19Stats):
+    """
+    `Covid19Stats` which runs each aggregation once for all states
+
+    Used to build the summaries: the rows are grouped by state in the database
+    and split here. Brazil's series are the rows of all states (if already
+    grouped by state) or the states' rows combined with the same aggregate
+    functions.
+    """
+
+    def __init__(self):
+        super().__init__(from_summaries=False)
+        self.rows_per_state = {}
+
+    def aggregate_state_data(self, select_columns, groupby_columns, state=None):
+        return self.split("cases", super().aggregate_state_data, select_columns, groupby_columns, state)
+
+    def aggregate_registry_data(self, select_columns, groupby_columns, state=None):
+        return self.split("registry", super().aggregate_registry_data, select_columns, groupby_columns, state)
+
+    def split(self, name, aggregate, select_columns, groupby_columns, state):
+        key = (name, tuple(select_columns.items()), tuple(groupby_columns))
+        if key not in self.rows_per_state:
+            columns = groupby_columns if "state" in groupby_columns else ["state"] + groupby_columns
+            rows_per_state = defaultdict(list)
+            for row in aggregate(select_columns=select_columns, groupby_columns=columns):
+                rows_per_state[row["state"]].append(row)
+            self.rows_per_state[key] = rows_per_state
+        rows_per_state = self.rows_per_state[key]
+
+        if "state" in groupby_columns:
+            if state is not None:
+                return list(rows_per_state.get(state, []))
+            rows = [row for state_rows in rows_per_state.values() for row in state_rows]
+            return sorted(rows, key=lambda row: [row[column] for column in groupby_columns])
+        elif state is not None:
+            state_rows = rows_per_state.get(state, [])
+            return [{column: value for column, value in row.items() if column != "state"} for row in state_rows]
+        return self.combine(rows_per_state, select_columns, groupby_columns)
+
+    @staticmethod
+    def combine(rows_per_state, select_columns, groupby_columns):
+        functions = {Max: max, Sum: sum}
+        groups = defaultdict(list)
+        for state_rows in rows_per_state.values():
+            for row in state_rows:
+                groups[tuple(row[column] for column in groupby_columns)].append(row)
+        result = []
+        for group in sorted(groups):
+            new = dict(zip(groupby_columns, group))
+            for alias, (Function, column) in select_columns.items():
+                values = [row.get(alias) for row in groups[group] if row.get(alias) is not None]
+                new[alias] = functions[Function](values) if values else None  # As SQL, ignoring NULLs
+            result.append(new)
+        return result
+
+
+def update_historical_summaries(sources=None):
+    """Build the `HistoricalSummary` series (for Brazil and each state) from the active data tables
+
+    `sources` limits the series to rebuild (like `[HistoricalSummary.CASES]`
+    after `caso_full` is imported). Cached pages/aggregations of the dataset
+    are invalidated after the new series are committed.
+    """
+    stats = AllStatesCovid19Stats()
+    methods = [
+        method
+        for method in vars(Covid19Stats).values()
+        if hasattr(method, "summary") and (sources is None or method.summary[0] in sources)
+    ]
+    states = [None] + [state.acronym for state in STATES]
+    summaries = [
+        HistoricalSummary(
+            source=method.summary[0],
+            period=method.summary[1],
+            state=state or "",
+            data=method.__wrapped__(stats, state),
+        )
+        for method in methods
+        for state in states
+    ]
+    with transaction.atomic():
+        HistoricalSummary.objects.filter(source__in={method.summary[0] for method in methods}).delete()
+        HistoricalSummary.objects.bulk_create(summaries)
+    invalidate_tags(dataset_tag("covid19"))
+    return len(summaries)
+
+
 def state_deployed_data(state):
     from covid19.models import StateSpreadsheet
 
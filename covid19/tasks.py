@@ -4,6 +4,7 @@ from django_rq import job
 from covid19.exceptions import OnlyOneSpreadsheetException
 from covid19.models import StateSpreadsheet
 from covid19.notifications import notify_import_success, notify_new_spreadsheet, notify_spreadsheet_mismatch
+from covid19.stats import update_historical_summaries
 
 
 @job
@@ -32,3 +33,9 @@ def process_new_spreadsheet_task(spreadsheet_pk):
         else:
             print(f"Spreadsheet {spreadsheet.id} for {state} on {date} didn't validate.")
             notify_spreadsheet_mismatch(spreadsheet, errors)
+
+
+@job
+def update_historical_summaries_task(sources=None):
+    total = update_historical_summaries(sources)
+    print(f"{total} covid19 historical series updated ({', '.join(sources or ['all sources'])}).")
@@ -0,0 +1,27 @@
+from unittest.mock import Mock, patch
+
+from django.test import SimpleTestCase
+
+from core.models import Table
+from core.signals import table_data_updated
+from covid19.models import HistoricalSummary
+
+
+def make_table(dataset_slug, name):
+    table = Mock(spec=Table)
+    table.dataset.slug, table.name = dataset_slug, name
+    return table
+
+
+@patch("covid19.signals.update_historical_summaries_task.delay")
+class UpdateHistoricalSummariesReceiverTests(SimpleTestCase):
+    def test_rebuild_summaries_after_incremental_import(self, mocked_delay):
+        table_data_updated.send(sender=Table, table=make_table("covid19", "caso_full"))
+
+        mocked_delay.assert_called_once_with(sources=[HistoricalSummary.CASES])
+
+    def test_ignore_other_tables(self, mocked_delay):
+        table_data_updated.send(sender=Table, table=make_table("covid19", "boletim"))
+        table_data_updated.send(sender=Table, table=make_table("other", "caso_full"))
+
+        mocked_delay.assert_not_called()
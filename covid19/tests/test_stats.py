@@ -1,4 +1,10 @@
-from covid19.stats import group_deaths
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from brazil_data.states import STATES
+from covid19.models import HistoricalSummary
+from covid19.stats import Covid19Stats, group_deaths, update_historical_summaries
 
 
 def test_group_deaths():
@@ -60,3 +66,55 @@ def test_group_deaths():
         "new_excess_deaths": -3,
     }
     assert row == expected_row
+
+
+class HistoricalSummaryStatsTests(TestCase):
+    def setUp(self):
+        self.rows = [{"date": "2020-03-01", "confirmed": 1}, {"date": "2020-03-02", "confirmed": 3}]
+        HistoricalSummary.objects.create(source="cases", period="daily", state="SP", data=self.rows)
+
+    @patch.object(Covid19Stats, "aggregate_state_data")
+    def test_read_series_from_summaries(self, mocked_aggregate):
+        stats = Covid19Stats(from_summaries=True)
+
+        assert self.rows == stats.historical_case_data_for_state_per_day("SP")
+        mocked_aggregate.assert_not_called()
+
+    @patch.object(Covid19Stats, "aggregate_state_data", return_value=[])
+    def test_aggregate_series_not_built_or_with_summaries_disabled(self, mocked_aggregate):
+        assert [] == Covid19Stats(from_summaries=True).historical_case_data_for_state_per_day("RJ")
+        assert [] == Covid19Stats(from_summaries=False).historical_case_data_for_state_per_day("SP")
+        assert 2 == mocked_aggregate.call_count
+
+    @patch.object(Covid19Stats, "aggregate_state_data")
+    def test_update_summaries_for_brazil_and_states(self, mocked_aggregate):
+        def aggregate(select_columns, groupby_columns, state=None):
+            values = {"date": "2020-03-01", "epidemiological_week": 10}
+            return [
+                {**{column: values.get(column, acronym) for column in groupby_columns}, "confirmed": confirmed}
+                for acronym, confirmed in (("RJ", 1), ("SP", 2))
+            ]
+
+        mocked_aggregate.side_effect = aggregate
+
+        total = update_historical_summaries([HistoricalSummary.CASES])
+
+        assert 2 * (len(STATES) + 1) == total == HistoricalSummary.objects.count()
+        assert 2 == mocked_aggregate.call_count  # Once per aggregation, for all states
+        brazil_data = HistoricalSummary.objects.get_data("cases", "daily")
+        expected = {"date": "2020-03-01", "confirmed": 3, "deaths": None, "new_confirmed": None, "new_deaths": None}
+        assert [expected] == brazil_data
+        assert [{"date": "2020-03-01", "confirmed": 2}] == HistoricalSummary.objects.get_data("cases", "daily", "SP")
+        assert [] == HistoricalSummary.objects.get_data("cases", "daily", "AC")
+        state_data = HistoricalSummary.objects.get_data("cases", "weekly", "SP")
+        assert [{"epidemiological_week": 10, "confirmed": 2}] == state_data
+        brazil_data = HistoricalSummary.objects.get_data("cases", "weekly")
+        assert [{"epidemiological_week": 10, "confirmed": 3}] == brazil_data
+        assert HistoricalSummary.objects.get_data("registry", "daily") is None
+
+    def test_rebuilt_series_replace_the_previous_ones(self):
+        with patch.object(Covid19Stats, "aggregate_state_data", return_value=[]):
+            update_historical_summaries([HistoricalSummary.CASES])
+
+        assert [] == HistoricalSummary.objects.get_data("cases", "daily", "SP")
+        assert 2 * (len(STATES) + 1) == HistoricalSummary.objects.count()
@@ -1,6 +1,7 @@
 import datetime
 import random
 
+from django.db.models import Count, Max
 from django.http import Http404, JsonResponse
 from django.shortcuts import render
 from django.urls import reverse
@@ -10,7 +11,11 @@ from django.utils.http import urlencode
 from brazil_data.cities import get_state_info
 from brazil_data.states import STATE_BY_ACRONYM, STATES
 from brazil_data.util import row_to_column
-from core.middlewares import disable_non_logged_user_cache
+from core.caching import dataset_tag
+from core.conditional import conditional_on_tables
+from core.middlewares import cache_tags, disable_non_logged_user_cache
+from core.models import get_table
+from core.stale_cache import stale_while_revalidate, uncacheable_if_stale
 from core.util import cached_http_get_json
 from covid19.epiweek import get_epiweek
 from covid19.exceptions import SpreadsheetValidationErrors
@@ -20,6 +25,21 @@ from covid19.spreadsheet import merge_state_data
 from covid19.stats import Covid19Stats, max_values, state_deployed_data
 
 stats = Covid19Stats()
+# Cached pages built from the dataset's tables (invalidated when one of them is imported)
+CACHE_TAG = dataset_tag("covid19")
+
+
+def covid19_tables(request, *args, **kwargs):
+    tablenames = ("boletim", "caso", "caso_full", "obito_cartorio")
+    return [get_table("covid19", tablename, allow_hidden=True) for tablename in tablenames]
+
+
+def deployed_spreadsheets(request, *args, **kwargs):
+    return StateSpreadsheet.objects.deployed().aggregate(Max("id"), Count("id"))
+
+
+# Data only changes when the dataset is imported or a spreadsheet is deployed
+conditional_covid19_data = conditional_on_tables(covid19_tables, get_extra=deployed_spreadsheets, vary_on_user=False)
 
 
 def volunteers(request):
@@ -29,11 +49,11 @@ def volunteers(request):
     return render(request, "covid19/volunteers.html", {"volunteers": volunteers})
 
 
-def cities(request):
-    state = request.GET.get("state", None)
-    if state is not None and not get_state_info(state):
-        raise Http404
-
+# The aggregations below are served from the cache and recomputed in the
+# background (after `settings.STALE_CACHE_SOFT_TTL` or an import), see the
+# `update_covid19_cache` command to prime it.
+@stale_while_revalidate(tags=[CACHE_TAG])
+def cities_data(state=None):
     brazil_city_data = stats.city_data()
     if state:
         city_data = stats.city_data(state)
@@ -47,7 +67,18 @@ def cities(request):
         "max": max_values(brazil_city_data),
         "total": total_row,
     }
-    return JsonResponse(result)
+    return result
+
+
+@cache_tags(CACHE_TAG)
+@uncacheable_if_stale
+@conditional_covid19_data
+def cities(request):
+    state = request.GET.get("state", None)
+    if state is not None and not get_state_info(state):
+        raise Http404
+
+    return JsonResponse(cities_data(state))
 
 
 def clean_daily_data(data, skip=0, diff=-1):
@@ -70,13 +101,8 @@ def clean_weekly_data(data, skip=0, diff_days=-14):
     return [row for index, row in enumerate(data) if index >= skip and row["epidemiological_week"] < until_epiweek]
 
 
-def historical_data(request, period):
-    state = request.GET.get("state", None)
-    if period not in ("daily", "weekly"):
-        raise Http404
-    elif state is not None and not get_state_info(state):
-        raise Http404
-
+@stale_while_revalidate(tags=[CACHE_TAG])
+def historical_period_data(period, state=None):
     if period == "daily":
         from_states = stats.historical_case_data_for_state_per_day(state)
         from_registries = stats.historical_registry_data_for_state_per_day(state)
@@ -106,22 +132,38 @@ def historical_data(request, period):
     state_data = row_to_column(from_states)
     registry_data = row_to_column(from_registries)
     registry_excess_data = row_to_column(from_registries_excess)
-    data = {
+    return {
         "from_states": state_data,
         "from_registries": registry_data,
         "from_registries_excess": registry_excess_data,
     }
-    return JsonResponse(data)
 
 
+def historical_data(request, period):
+    state = request.GET.get("state", None)
+    if period not in ("daily", "weekly"):
+        raise Http404
+    elif state is not None and not get_state_info(state):
+        raise Http404
+
+    return JsonResponse(historical_period_data(period, state))
+
+
+@cache_tags(CACHE_TAG)
+@uncacheable_if_stale
+@conditional_covid19_data
 def historical_daily(request):
     return historical_data(request, "daily")
 
 
+@cache_tags(CACHE_TAG)
+@uncacheable_if_stale
+@conditional_covid19_data
 def historical_weekly(request):
     return historical_data(request, "weekly")
 
 
+@conditional_covid19_data
 def states_geojson(request):
     state = request.GET.get("state", None)
     if state is not None and not get_state_info(state):
@@ -138,6 +180,8 @@ def states_geojson(request):
     return JsonResponse(data, content_type="application/geo+json")
 
 
+@cache_tags(CACHE_TAG)
+@conditional_covid19_data
 def cities_geojson(request):
     state = request.GET.get("state", None)
     if state is not None and not get_state_info(state):
@@ -209,12 +253,8 @@ def make_aggregate(
     return data
 
 
-def dashboard(request, state=None):
-    if state is not None and not get_state_info(state):
-        raise Http404
-    if state:
-        state = state.upper()
-
+@stale_while_revalidate(tags=[CACHE_TAG])
+def dashboard_data(state=None):
     country_aggregate = make_aggregate(
         reports=stats.total_reports,
         confirmed=stats.total_confirmed,
@@ -246,20 +286,30 @@ def dashboard(request, state=None):
         state_id = state_name = None
         state_aggregate = None
 
-    return render(
-        request,
-        "covid19/dashboard.html",
-        {
-            "country_aggregate": country_aggregate,
-            "state_aggregate": state_aggregate,
-            "city_data": city_data,
-            "state": state,
-            "state_id": state_id,
-            "city_slug": None,  # TODO: change
-            "state_name": state_name,
-            "states": STATES,
-        },
-    )
+    return {
+        "country_aggregate": country_aggregate,
+        "state_aggregate": state_aggregate,
+        "city_data": city_data,
+        "state_id": state_id,
+        "state_name": state_name,
+    }
+
+
+@cache_tags(CACHE_TAG)
+@uncacheable_if_stale
+def dashboard(request, state=None):
+    if state is not None and not get_state_info(state):
+        raise Http404
+    if state:
+        state = state.upper()
+
+    context = {
+        **dashboard_data(state),
+        "state": state,
+        "city_slug": None,  # TODO: change
+        "states": STATES,
+    }
+    return render(request, "covid19/dashboard.html", context)
 
 
 @disable_non_logged_user_cache
@@ -3,6 +3,7 @@ import argparse
 import csv
 import datetime
 from collections import OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from itertools import islice
 from pathlib import Path
 from textwrap import dedent
@@ -16,16 +17,23 @@ csv.field_size_limit(MAX_COLUMN_SIZE)
 
 
 class BrasilIOTypeDetector(fields.TypeDetector):
-    """Type detector which remembers min/max sizes and create choices"""
+    """Type detector which remembers min/max sizes and create choices
 
-    def __init__(self, field_names, max_choices=100, *args, **kwargs):
+    Detectors fed with different parts of a file can be combined with
+    `merge(other.state())`, giving the same result as one detector fed with
+    the whole file.
+    """
+
+    def __init__(self, field_names, max_choices=100, row_offset=0, *args, **kwargs):
         super().__init__(field_names, *args, **kwargs)
         self.min_sizes = defaultdict(lambda: MAX_COLUMN_SIZE)
         self.max_sizes = defaultdict(lambda: 0)
         self.max_choices = max_choices
-        self.choices = defaultdict(set)
+        self.choices = defaultdict(dict)  # {value: number of the row where it first appeared}
+        self.last_row = row_offset - 1
 
     def process_row(self, row):
+        self.last_row += 1
         for index, value in enumerate(row):
             if index in self._skip:
                 continue
@@ -39,7 +47,48 @@ class BrasilIOTypeDetector(fields.TypeDetector):
                 if len(self.choices[index]) > self.max_choices:
                     self.choices[index] = None
                 else:
-                    self.choices[index].add(value)
+                    self.choices[index].setdefault(value, self.last_row)
+
+    def state(self):
+        """Picklable detector state (to be merged into another detector)"""
+        return {
+            "possible_types": dict(self._possible_types),
+            "min_sizes": dict(self.min_sizes),
+            "max_sizes": dict(self.max_sizes),
+            "choices": dict(self.choices),
+            "last_row": self.last_row,
+        }
+
+    def merge(self, state):
+        # A type is possible only if it's possible for all the rows
+        for index, types in state["possible_types"].items():
+            self._possible_types[index] = [type_ for type_ in self._possible_types[index] if type_ in types]
+        for index, size in state["min_sizes"].items():
+            self.min_sizes[index] = min(self.min_sizes[index], size)
+        for index, size in state["max_sizes"].items():
+            self.max_sizes[index] = max(self.max_sizes[index], size)
+        self.last_row = max(self.last_row, state["last_row"])
+
+        for index, choices in state["choices"].items():
+            if self.choices[index] is None:
+                continue
+            elif choices is None:
+                self.choices[index] = None
+                continue
+            merged = self.choices[index]
+            for value, row in choices.items():
+                if row < merged.get(value, row + 1):
+                    merged[value] = row
+
+        # Same rule as `process_row`: choices are discarded if there's a row
+        # after the one with the (max_choices + 1)-th distinct value
+        for index, choices in self.choices.items():
+            if choices is None:
+                continue
+            too_many = len(choices) > self.max_choices + 1
+            last_value_too_early = len(choices) == self.max_choices + 1 and max(choices.values()) < self.last_row
+            if too_many or last_value_too_early:
+                self.choices[index] = None
 
 
 def make_title(field_name):
@@ -68,7 +117,34 @@ def make_title(field_name):
     return " ".join(new_title)
 
 
-def detect_schema(dataset_slug, tablename, version_name, filename, encoding, samples):
+def detect_chunk(header, rows, row_offset):
+    detector = BrasilIOTypeDetector(header, row_offset=row_offset)
+    detector.feed(rows)
+    return detector.state()
+
+
+def parallel_detect(header, iterator, workers, chunk_size):
+    """Feed chunks of rows to detectors in `workers` processes and merge their states"""
+    detector = BrasilIOTypeDetector(header)
+    pending = set()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        row_offset = 0
+        while True:
+            rows = list(islice(iterator, chunk_size))
+            if not rows:
+                break
+            pending.add(executor.submit(detect_chunk, header, rows, row_offset))
+            row_offset += len(rows)
+            if len(pending) >= workers * 2:  # Don't read the whole file into memory
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    detector.merge(future.result())
+        for future in pending:
+            detector.merge(future.result())
+    return detector
+
+
+def detect_schema(dataset_slug, tablename, version_name, filename, encoding, samples, workers=1, chunk_size=50_000):
 
     # TODO: max_length should not be filled if field type is `date`
     # TODO: should be able to force some fields (example: CPF as string)
@@ -88,8 +164,11 @@ def detect_schema(dataset_slug, tablename, version_name, filename, encoding, sam
     if samples:
         iterator = islice(iterator, samples)
 
-    detector = BrasilIOTypeDetector(header)
-    detector.feed(iterator)
+    if workers > 1:
+        detector = parallel_detect(header, iterator, workers, chunk_size)
+    else:
+        detector = BrasilIOTypeDetector(header)
+        detector.feed(iterator)
 
     result = Table(
         fields=OrderedDict(
@@ -175,6 +254,8 @@ if __name__ == "__main__":
     parser.add_argument("--encoding", default="utf-8")
     parser.add_argument("--samples", default=30000, type=int)
     parser.add_argument("--output_path", default="schema")
+    parser.add_argument("--workers", default=1, type=int, help="Number of processes detecting types")
+    parser.add_argument("--chunk-size", default=50_000, type=int, help="Rows sent to each process at a time")
     args = parser.parse_args()
     filename = Path(args.filename)
 
@@ -182,7 +263,16 @@ if __name__ == "__main__":
     table_name = filename.name.split(".")[0]
     today = datetime.datetime.now()
     version_name = "{}-{:02d}".format(today.year, today.month)
-    result = detect_schema(dataset_slug, table_name, version_name, filename, args.encoding, args.samples)
+    result = detect_schema(
+        dataset_slug,
+        table_name,
+        version_name,
+        filename,
+        args.encoding,
+        args.samples,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+    )
 
     output_path = Path(args.output_path)
     if not output_path.exists():